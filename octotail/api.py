@@ -0,0 +1,170 @@
+"""Minimal asyncio GitHub REST client covering the endpoints octotail polls."""
+
+import typing as t
+
+import httpx
+
+from octotail.budget import RateBudget
+from octotail.cache import CachingTransport
+from octotail.utils import RANDOM_UA
+
+API_URL = "https://api.github.com"
+API_VERSION = "2022-11-28"
+API_TIMEOUT = 30.0
+PER_PAGE = 100
+
+
+class Repo(t.NamedTuple):
+    """A GitHub repository."""
+
+    id: int
+    full_name: str
+
+    @classmethod
+    def from_json(cls, data: dict[str, t.Any]) -> "Repo":
+        return cls(id=data["id"], full_name=data["full_name"])
+
+
+class RunQuery(t.NamedTuple):
+    """Server-side filters for listing workflow runs."""
+
+    head_sha: str
+    branch: str | None = None
+    event: str | None = None
+    workflow_id: int | None = None
+
+    def params(self) -> dict[str, t.Any]:
+        params = {"head_sha": self.head_sha, "branch": self.branch, "event": self.event}
+        return {k: v for k, v in params.items() if v is not None}
+
+
+class WorkflowRun(t.NamedTuple):
+    """A GitHub Actions workflow run."""
+
+    id: int
+    repo: str
+    name: str
+    event: str
+    status: str
+    conclusion: str | None
+    head_branch: str
+    html_url: str
+
+    @classmethod
+    def from_json(cls, data: dict[str, t.Any]) -> "WorkflowRun":
+        return cls(
+            id=data["id"],
+            repo=data["repository"]["full_name"],
+            name=data["name"],
+            event=data["event"],
+            status=data["status"],
+            conclusion=data.get("conclusion"),
+            head_branch=data.get("head_branch") or "",
+            html_url=data["html_url"],
+        )
+
+
+class WorkflowJob(t.NamedTuple):
+    """A job of a GitHub Actions workflow run."""
+
+    id: int
+    name: str
+    status: str
+    conclusion: str | None
+    html_url: str
+    run_id: int
+    started_at: str | None
+
+    @classmethod
+    def from_json(cls, data: dict[str, t.Any]) -> "WorkflowJob":
+        return cls(
+            id=data["id"],
+            name=data["name"],
+            status=data["status"],
+            conclusion=data.get("conclusion"),
+            html_url=data["html_url"],
+            run_id=data["run_id"],
+            started_at=data.get("started_at"),
+        )
+
+
+class GitHubApi:
+    """Keeps one pooled, keep-alive (HTTP/2 where available) session for all API calls.
+
+    Every request goes through the ETag cache and the machine-wide rate budget,
+    unless a `transport` is passed in.
+    """
+
+    client: httpx.AsyncClient
+    last_headers: httpx.Headers
+
+    def __init__(
+        self,
+        token: str,
+        base_url: str = API_URL,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={
+                "Authorization": f"Bearer {token}",
+                "Accept": "application/vnd.github+json",
+                "X-GitHub-Api-Version": API_VERSION,
+                "User-Agent": RANDOM_UA,
+            },
+            timeout=API_TIMEOUT,
+            transport=transport or CachingTransport(budget=RateBudget()),
+        )
+        self.last_headers = httpx.Headers()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    async def get_repo(self, repo_id: str) -> Repo:
+        return Repo.from_json(await self._get(f"/repos/{repo_id}"))
+
+    async def get_workflow_id(self, repo: Repo, name: str) -> int | None:
+        async for workflow in self._paginate(
+            f"/repos/{repo.full_name}/actions/workflows", "workflows", {}
+        ):
+            if workflow["name"] == name:
+                return int(workflow["id"])
+        return None
+
+    def iter_workflow_runs(self, repo: Repo, query: RunQuery) -> t.AsyncIterator[WorkflowRun]:
+        """Lazily page through the matching runs, newest first."""
+        url = f"/repos/{repo.full_name}/actions/runs"
+        if query.workflow_id is not None:
+            url = f"/repos/{repo.full_name}/actions/workflows/{query.workflow_id}/runs"
+        runs = self._paginate(url, "workflow_runs", query.params())
+        return (WorkflowRun.from_json(run) async for run in runs)
+
+    async def get_workflow_run(self, wf_run: WorkflowRun) -> WorkflowRun:
+        url = f"/repos/{wf_run.repo}/actions/runs/{wf_run.id}"
+        return WorkflowRun.from_json(await self._get(url))
+
+    async def get_workflow_jobs(self, wf_run: WorkflowRun) -> list[WorkflowJob]:
+        jobs = self._paginate(
+            f"/repos/{wf_run.repo}/actions/runs/{wf_run.id}/jobs", "jobs", {"filter": "latest"}
+        )
+        return [WorkflowJob.from_json(job) async for job in jobs]
+
+    async def _get(self, url: str) -> t.Any:
+        return (await self._request(url)).json()
+
+    async def _paginate(
+        self, url: str, key: str, params: dict[str, t.Any]
+    ) -> t.AsyncIterator[dict[str, t.Any]]:
+        next_url: str | None = url
+        _params: dict[str, t.Any] | None = params | {"per_page": PER_PAGE}
+        while next_url is not None:
+            response = await self._request(next_url, _params)
+            for item in response.json()[key]:
+                yield item
+            # the next link carries all the query params already
+            next_url, _params = response.links.get("next", {}).get("url"), None
+
+    async def _request(self, url: str, params: dict[str, t.Any] | None = None) -> httpx.Response:
+        response = await self.client.get(url, params=params)
+        self.last_headers = response.headers
+        return response.raise_for_status()
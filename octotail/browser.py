@@ -1,27 +1,35 @@
 """Browser actor."""
 
 import asyncio as aio
+import heapq
 import json
 import multiprocessing as mp
+import shutil
 import time
 import typing as t
-from collections import deque
 from contextlib import suppress
 from multiprocessing.queues import Queue
 from pathlib import Path
 from queue import Empty
+from urllib.parse import urlsplit
 
 from pykka import ActorRef, ThreadingActor
 from pyppeteer import launch
 from pyppeteer.browser import Browser
+from pyppeteer.network_manager import Request
 from pyppeteer.page import Page
+from pyppeteer.target import Target
 from pyppeteer_stealth import stealth
 from xdg.BaseDirectory import xdg_cache_home
 
-from octotail.cli import Opts
+from octotail.cli import Extractor, LaunchProfile, Opts
 from octotail.manager import Manager
-from octotail.msg import BrowseRequest, CloseRequest, ExitRequest, ProxyLive, VisitRequest
-from octotail.utils import RANDOM_UA, debug, log
+from octotail.memory import RSS_SAMPLE_INTERVAL, RssWatchdog
+from octotail.mitm import MARKERS, extract_ws_subs
+from octotail.msg import BrowseRequest, CloseRequest, ExitRequest, ProxyLive, VisitRequest, WsSub
+from octotail.profile import PROFILE_DIR, TMPFS_PROFILE_DIR, Profile
+from octotail.scraper import Cookies
+from octotail.utils import DEBUG, RANDOM_UA, debug, log, queue_get
 
 COOKIE_JAR = Path(xdg_cache_home) / "octotail" / "gh-cookies.json"
 
@@ -56,9 +64,65 @@ CHROME_ARGS = [
     '--lang="en-US"',
     f'--user-agent="{RANDOM_UA}"',
 ]
+CHROMIUM = "/usr/bin/chromium"
+# the old headless mode, shipped on its own: no GPU, compositor or UI code to load
+HEADLESS_SHELL = "chrome-headless-shell"
+
+# fewer renderers sharing capped JS heaps, nothing drawn on a GPU that isn't there
+LOW_MEMORY_ARGS = [
+    "--renderer-process-limit=2",
+    "--process-per-site",
+    "--js-flags=--max-old-space-size=256",
+    "--disable-gpu",
+    "--disable-gpu-compositing",
+    "--disable-software-rasterizer",
+    "--disable-threaded-animation",
+    "--disable-threaded-scrolling",
+    "--disable-smooth-scrolling",
+    "--disable-component-update",
+    "--disable-breakpad",
+    "--aggressive-cache-discard",
+    "--mute-audio",
+]
+# chromium only honours the last --disable-features, so these go in together with ours
+LOW_MEMORY_DISABLED_FEATURES = [
+    "site-per-process",
+    "IsolateOrigins",
+    "BackForwardCache",
+    "MediaRouter",
+    "OptimizationHints",
+    "PaintHolding",
+    "Translate",
+]
+
+type Launcher = t.Callable[[], t.Awaitable[Browser]]
+
 
+# shared workers (which is where GitHub keeps its websocket) are reported as "other"
+CDP_TARGET_TYPES = ["page", "other"]
 
-type Cookies = list[dict[str, t.Any]]
+# earliest started jobs first; job ids break ties and keep requests from being compared
+type VisitQueue = list[tuple[str, int, VisitRequest]]
+
+# how long a run page gets to come up with a job's subscription before visiting the job page
+RUN_PAGE_GRACE = 10.0
+
+# all a job page needs is the JS opening GitHub's websocket
+BLOCKED_RESOURCE_TYPES = frozenset(
+    {
+        "cspviolationreport",
+        "font",
+        "image",
+        "manifest",
+        "media",
+        "ping",
+        "prefetch",
+        "stylesheet",
+        "texttrack",
+    }
+)
+ALLOWED_HOSTS = ("github.com", "githubassets.com")
+BLOCKED_HOSTS = frozenset({"collector.github.com"})
 
 
 class BrowserWatcher(ThreadingActor):
@@ -66,49 +130,143 @@ class BrowserWatcher(ThreadingActor):
 
     opts: Opts
     inbox: Queue[BrowseRequest]
+    outbox: Queue[WsSub]
     mgr: ActorRef[Manager]
 
     def __init__(self, mgr: ActorRef[Manager], opts: Opts, inbox: Queue[BrowseRequest]):
         super().__init__()
         self.opts = opts
         self.inbox = inbox
+        self.outbox = mp.Queue()
         self.mgr = mgr
 
-    def watch(self, target: t.Callable[[Opts, Queue[BrowseRequest]], None]) -> None:
-        browser = mp.Process(target=target, args=(self.opts, self.inbox))
+    def watch(self, target: t.Callable[[Opts, Queue[BrowseRequest], Queue[WsSub]], None]) -> None:
+        browser = mp.Process(target=target, args=(self.opts, self.inbox, self.outbox))
         browser.start()
+        # subscriptions only come through here when extracting them over CDP
+        while browser.is_alive():
+            with suppress(Empty):
+                self.mgr.tell(self.outbox.get(timeout=0.25))
         browser.join()
         self.mgr.stop()
         debug("exiting")
 
 
-def start_controller(opts: Opts, inbox: Queue[BrowseRequest]) -> None:  # pragma: no cover
+def start_controller(
+    opts: Opts, inbox: Queue[BrowseRequest], outbox: Queue[WsSub]
+) -> None:  # pragma: no cover
+    if opts.browserless and not _await_fallback(inbox):
+        return
     loop = aio.new_event_loop()
     aio.set_event_loop(loop)
+
+    async def _start_browser() -> Browser:
+        browser = await _launch_browser(opts)
+        if opts.extractor == Extractor.CDP:
+            _sniff_websockets(browser, outbox)
+        return browser
+
     try:
-        browser = loop.run_until_complete(_launch_browser(opts))
+        browser = loop.run_until_complete(_start_browser())
         loop.run_until_complete(
             _controller(
                 browser,
                 opts=opts,
                 inbox=inbox,
                 cookie_jar=CookieJar(opts.gh_user),
+                relaunch=_start_browser,
             )
         )
     except KeyboardInterrupt:
         loop.close()
 
 
+def _await_fallback(inbox: Queue[BrowseRequest]) -> bool:
+    """Hold off launching chromium until the scraper gives up on a page.
+
+    Returns False if asked to exit first. Anything held back is put back into the inbox.
+    """
+    held: list[BrowseRequest] = []
+    while True:
+        match inbox.get():
+            case VisitRequest() as visit_req:
+                for msg in [*held, visit_req]:
+                    inbox.put(msg)
+                return True
+            case ExitRequest():
+                return False
+            case ProxyLive() as proxy_live:
+                held.append(proxy_live)
+
+
 async def _launch_browser(opts: Opts) -> Browser:
-    return await launch(
-        headless=opts.headless,
-        executablePath="/usr/bin/chromium",
-        options={
-            "args": [*CHROME_ARGS, f"--proxy-server=127.0.0.1:{opts.port}"],
-            "autoClose": False,
-            "handleSIGINT": False,
-        },
-    )
+    executable, headless, args = _executable(opts)
+    args.extend(_chrome_args(opts))
+    if opts.extractor == Extractor.PROXY:
+        args.append(f"--proxy-server=127.0.0.1:{opts.port}")
+    options: dict[str, t.Any] = {"args": args, "autoClose": False, "handleSIGINT": False}
+
+    profile = _profile(opts)
+    if (user_data_dir := profile.prepare()) is not None:
+        args.extend(profile.chrome_args())
+        options["userDataDir"] = str(user_data_dir)
+
+    return await launch(headless=headless, executablePath=executable, options=options)
+
+
+def _chrome_args(opts: Opts) -> list[str]:
+    if opts.launch_profile != LaunchProfile.LOW_MEMORY:
+        return [*CHROME_ARGS]
+    disabled_features = f"--disable-features={','.join(LOW_MEMORY_DISABLED_FEATURES)}"
+    args = [arg for arg in CHROME_ARGS if not arg.startswith("--disable-features=")]
+    return [*args, disabled_features, *LOW_MEMORY_ARGS]
+
+
+def _executable(opts: Opts) -> tuple[str, bool, list[str]]:
+    """The browser to launch, whether pyppeteer should make it headless and any extra args."""
+    if opts.launch_profile != LaunchProfile.LOW_MEMORY or not opts.headless:
+        return CHROMIUM, opts.headless, []
+    if (headless_shell := shutil.which(HEADLESS_SHELL)) is not None:
+        return headless_shell, True, []
+    # pyppeteer only knows about the old `--headless`, which newer chromiums dropped
+    return CHROMIUM, False, ["--headless=new", "--hide-scrollbars"]
+
+
+def _profile(opts: Opts) -> Profile:
+    path = opts.profile_dir or (TMPFS_PROFILE_DIR if opts.profile_on_tmpfs else PROFILE_DIR)
+    return Profile(path, opts.profile_cache_mb * 1024 * 1024)
+
+
+def _sniff_websockets(browser: Browser, outbox: Queue[WsSub]) -> None:
+    """Extract subscriptions from the websocket frames of every page and (shared) worker."""
+    tasks: set[aio.Task[None]] = set()
+
+    def _on_target(target: Target) -> None:
+        if target.type not in CDP_TARGET_TYPES:
+            return
+        task = aio.create_task(_sniff_target(target, outbox))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    browser.on("targetcreated", _on_target)
+
+
+async def _sniff_target(target: Target, outbox: Queue[WsSub]) -> None:
+    session = await target.createCDPSession()
+    ws_urls: dict[str, str] = {}
+
+    def _on_created(event: dict[str, t.Any]) -> None:
+        ws_urls[event["requestId"]] = event["url"]
+
+    def _on_frame_sent(event: dict[str, t.Any]) -> None:
+        url = ws_urls.get(event["requestId"], "").removeprefix("wss://")
+        if url.startswith(MARKERS.ws_host):
+            for ws_sub in extract_ws_subs(url, event["response"]["payloadData"]):
+                outbox.put(ws_sub)
+
+    session.on("Network.webSocketCreated", _on_created)
+    session.on("Network.webSocketFrameSent", _on_frame_sent)
+    await session.send("Network.enable")
 
 
 class CookieJar(t.NamedTuple):
@@ -128,42 +286,190 @@ class CookieJar(t.NamedTuple):
         return t.cast(Cookies, json.loads(self.path.read_text()).get(self.user))
 
 
+class _Tabs:
+    """Keeps up to `opts.max_tabs` job pages loading, earliest started jobs first.
+
+    With `opts.run_pages`, job visits go to their run's page instead; a job only gets its
+    own page if the run page hasn't come up with its subscription in `RUN_PAGE_GRACE`.
+    """
+
+    browser: Browser
+    opts: Opts
+    inbox: Queue[BrowseRequest]
+
+    visit_queue: VisitQueue
+    # jobs being visited until their CloseRequest, with or without a page yet
+    visiting: set[int]
+    open_pages: dict[int, Page]
+    # runs whose page is open, jobs waiting on it and jobs it didn't show
+    run_urls: set[str]
+    pending: set[int]
+    fell_back: set[int]
+
+    _tasks: set[aio.Task[None]]
+
+    def __init__(self, browser: Browser, opts: Opts, inbox: Queue[BrowseRequest]):
+        self.browser = browser
+        self.opts = opts
+        self.inbox = inbox
+        self.visit_queue = []
+        self.visiting = set()
+        self.open_pages = {}
+        self.run_urls = set()
+        self.pending = set()
+        self.fell_back = set()
+        self._tasks = set()
+
+    def request(self, visit_req: VisitRequest) -> None:
+        if self.opts.run_pages and visit_req.job_id not in self.fell_back:
+            self._visit_run(visit_req)
+        else:
+            _enqueue(self.visit_queue, visit_req)
+
+    def fill(self) -> None:
+        while self.visit_queue and len(self.visiting) < self.opts.max_tabs:
+            visit_req = heapq.heappop(self.visit_queue)[-1]
+            self.visiting.add(visit_req.job_id)
+            self._spawn(self._visit(visit_req))
+
+    async def close(self, job_id: int) -> None:
+        self.pending.discard(job_id)
+        self.visiting.discard(job_id)
+        if (page := self.open_pages.pop(job_id, None)) is not None:
+            await page.close()
+
+    def idle(self) -> bool:
+        return not (self.visiting or self.pending or self.visit_queue)
+
+    def reset(self, browser: Browser) -> None:
+        """Carry on with a fresh browser: run pages have to be opened again."""
+        self.browser = browser
+        self.open_pages.clear()
+        self.run_urls.clear()
+
+    def _spawn(self, coro: t.Coroutine[t.Any, t.Any, None]) -> None:
+        task = aio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _new_page(self) -> Page:
+        page = await self.browser.newPage()
+        if self.opts.block_resources:
+            allowed_hosts = (*ALLOWED_HOSTS, *(self.opts.allow_hosts or []))
+            await page.setRequestInterception(True)
+            # pyppeteer turns off the cache along with interception, keep the bundles cached
+            await page.setCacheEnabled(True)
+            page.on("request", lambda request: self._filter(request, allowed_hosts))
+        return page
+
+    def _filter(self, request: Request, allowed_hosts: t.Sequence[str]) -> None:
+        if is_essential(request.resourceType, request.url, allowed_hosts):
+            self._spawn(request.continue_())
+        else:
+            self._spawn(request.abort())
+
+    async def _visit(self, visit_req: VisitRequest) -> None:
+        page = await self._new_page()
+        if visit_req.job_id not in self.visiting:
+            # closed before the page even opened
+            await page.close()
+            return
+        self.open_pages[visit_req.job_id] = page
+        await page.goto(visit_req.url, timeout=0)
+
+    def _visit_run(self, visit_req: VisitRequest) -> None:
+        if (run_url := visit_req.url.partition("/job/")[0]) not in self.run_urls:
+            # run pages don't take up tabs meant for jobs and stay open for good
+            self.run_urls.add(run_url)
+            self._spawn(self._open(run_url))
+        self.pending.add(visit_req.job_id)
+        self._spawn(self._fall_back(visit_req))
+
+    async def _open(self, url: str) -> None:
+        await (await self._new_page()).goto(url, timeout=0)
+
+    async def _fall_back(self, visit_req: VisitRequest) -> None:
+        await aio.sleep(RUN_PAGE_GRACE)
+        if visit_req.job_id in self.pending:
+            debug(f"no subscription for job {visit_req.job_id} on its run page")
+            self.fell_back.add(visit_req.job_id)
+            # the controller is most likely waiting on the inbox
+            self.inbox.put(visit_req)
+
+
+class _Recycler:
+    """Samples the browser's memory and restarts it between visits once over `rss_budget_mb`."""
+
+    tabs: _Tabs
+    relaunch: Launcher
+    cookie_jar: CookieJar
+    watchdog: RssWatchdog
+
+    _sampler: aio.Task[None] | None
+
+    def __init__(self, tabs: _Tabs, relaunch: Launcher, cookie_jar: CookieJar):
+        self.tabs = tabs
+        self.relaunch = relaunch
+        self.cookie_jar = cookie_jar
+        self.watchdog = RssWatchdog(tabs.opts.rss_budget_mb)
+        self._sampler = None
+
+    def start(self) -> None:
+        self._sampler = aio.create_task(self._sample_forever())
+
+    def stop(self) -> None:
+        if self._sampler is not None:
+            self._sampler.cancel()
+        if (report := self.watchdog.report()) is None:
+            return
+        if _watches_memory(self.tabs.opts):
+            log(report)
+        else:
+            debug(report)
+
+    async def maybe_recycle(self) -> None:
+        if not (self.tabs.idle() and self.watchdog.over_budget()):
+            return
+        log("browser went over its memory budget, restarting it")
+        await self.tabs.browser.close()
+        browser = await self.relaunch()
+        start_page = (await browser.pages())[0]
+        await stealth(start_page)
+        await _nom_cookies(self.cookie_jar.read(), start_page)
+        self.tabs.reset(browser)
+        # so the old browser's last sample doesn't count against the new one
+        await self._sample()
+
+    async def _sample_forever(self) -> None:
+        while True:
+            await self._sample()
+            await aio.sleep(RSS_SAMPLE_INTERVAL)
+
+    async def _sample(self) -> None:
+        if (process := self.tabs.browser.process) is not None:
+            await aio.to_thread(self.watchdog.sample, process.pid)
+
+
 async def _controller(
     browser: Browser,
     opts: Opts,
     inbox: Queue[BrowseRequest],
     cookie_jar: CookieJar,
-    sleep_time: float = 0.5,
+    relaunch: Launcher | None = None,
 ) -> None:
-    tasks = set()
-    open_pages: dict[int, Page] = {}
-    ready = aio.Event()
-    visit_queue: deque[VisitRequest] = deque()
-
-    def _schedule_visit(_visit_req: VisitRequest) -> None:
-        ready.clear()
-        _task = aio.create_task(_visit(_visit_req))
-        tasks.add(_task)
-        _task.add_done_callback(tasks.discard)
-
-    async def _visit(_visit_req: VisitRequest) -> None:
-        _page = await browser.newPage()
-        open_pages[_visit_req.job_id] = _page
-        await _page.goto(_visit_req.url, timeout=0)
+    tabs = _Tabs(browser, opts, inbox)
+    recycler = None
+    if relaunch is not None and (DEBUG or _watches_memory(opts)):
+        recycler = _Recycler(tabs, relaunch, cookie_jar)
 
     start_page = (await browser.pages())[0]
     await stealth(start_page)
 
-    # buffer visit requests until the proxy goes live
-    while True:
-        with suppress(Empty):
-            match inbox.get_nowait():
-                case VisitRequest() as visit_req:
-                    visit_queue.appendleft(visit_req)
-                case ProxyLive():
-                    ready.set()
-                    break
-        await aio.sleep(sleep_time)
+    buffered: VisitQueue = []
+    if opts.extractor == Extractor.PROXY and not await _await_proxy(inbox, buffered):
+        # no active run was found while we were warming up
+        await browser.close()
+        return
 
     if not await _nom_cookies(cookie_jar.read(), start_page):
         log("logging in to GitHub")
@@ -174,28 +480,61 @@ async def _controller(
             return
         cookie_jar.save(cookies)
 
+    for *_, visit_req in buffered:
+        tabs.request(visit_req)
+
+    if recycler is not None:
+        recycler.start()
+
+    while True:
+        tabs.fill()
+
+        match await queue_get(inbox):
+            case ExitRequest():
+                if recycler is not None:
+                    recycler.stop()
+                await tabs.browser.close()
+                return
+
+            case CloseRequest() as close_req:
+                await tabs.close(close_req.job_id)
+                if recycler is not None:
+                    await recycler.maybe_recycle()
+
+            case VisitRequest() as visit_req:
+                tabs.request(visit_req)
+
+
+def _watches_memory(opts: Opts) -> bool:
+    """Sampling the browser's memory takes a walk through /proc, only do it when asked to."""
+    return opts.rss_budget_mb is not None or opts.launch_profile == LaunchProfile.LOW_MEMORY
+
+
+def is_essential(resource_type: str, url: str, allowed_hosts: t.Sequence[str]) -> bool:
+    """Whether a page request may go through when blocking heavy subresources."""
+    parts = urlsplit(url)
+    if parts.scheme in ("data", "blob"):
+        return True
+    host = parts.hostname or ""
+    if resource_type in BLOCKED_RESOURCE_TYPES or host in BLOCKED_HOSTS:
+        return False
+    return any(host == allowed or host.endswith(f".{allowed}") for allowed in allowed_hosts)
+
+
+def _enqueue(visit_queue: VisitQueue, visit_req: VisitRequest) -> None:
+    heapq.heappush(visit_queue, (visit_req.started_at, visit_req.job_id, visit_req))
+
+
+async def _await_proxy(inbox: Queue[BrowseRequest], visit_queue: VisitQueue) -> bool:
+    """Buffer visit requests until the proxy goes live. Returns False if asked to exit instead."""
     while True:
-        with suppress(Empty):
-            if ready.is_set() and visit_queue:
-                _schedule_visit(visit_queue.pop())
-                continue
-
-            match inbox.get_nowait():
-                case ExitRequest():
-                    await browser.close()
-                    return
-
-                case CloseRequest() as close_req:
-                    if close_req.job_id in open_pages:
-                        await open_pages[close_req.job_id].close()
-                    ready.set()
-
-                case VisitRequest() as visit_req:
-                    if ready.is_set():
-                        _schedule_visit(visit_req)
-                    else:
-                        visit_queue.appendleft(visit_req)
-        await aio.sleep(sleep_time)
+        match await queue_get(inbox):
+            case VisitRequest() as visit_req:
+                _enqueue(visit_queue, visit_req)
+            case ProxyLive():
+                return True
+            case ExitRequest():
+                return False
 
 
 async def _login_flow(page: Page, opts: Opts) -> Cookies | RuntimeError:
@@ -0,0 +1,81 @@
+"""Machine-wide GitHub API budget, shared by every octotail process using the same token."""
+
+import fcntl
+import json
+import time
+import typing as t
+from pathlib import Path
+
+from xdg.BaseDirectory import xdg_cache_home
+
+BUDGET_DIR = Path(xdg_cache_home) / "octotail" / "budget"
+BURST = 20.0
+HOURLY_QUOTA = 5000.0
+MAX_WAIT = 60.0
+
+
+class _State(t.NamedTuple):
+    tokens: float
+    rate: float
+    updated: float
+
+
+class RateBudget(t.NamedTuple):
+    """File-locked token bucket per API token.
+
+    Requests reserve tokens before going out, running the bucket into debt if need be:
+    whoever reserves next waits for the debt to refill first, so concurrent processes
+    get served in turn. The refill rate tracks GitHub's own rate limit headers, spreading
+    the remaining quota evenly until its reset, so polling stretches as headroom runs out.
+    """
+
+    path: Path = BUDGET_DIR
+    clock: t.Callable[[], float] = time.time
+
+    def reserve(self, key: str, tokens: float = 1.0) -> float:
+        """Take `tokens` from the bucket and return how long to wait before spending them."""
+
+        def _reserve(state: _State, now: float) -> tuple[_State, float]:
+            left = _refill(state, now) - tokens
+            return _State(left, state.rate, now), max(-left / state.rate, 0.0)
+
+        return self._update(key, _reserve)
+
+    def refund(self, key: str, tokens: float = 1.0) -> None:
+        """Give back tokens for requests that didn't count against the rate limit."""
+        self._update(key, lambda state, now: (_State(state.tokens + tokens, state.rate, now), 0))
+
+    def observe(self, key: str, remaining: int, reset: float) -> None:
+        """Sync the bucket with the rate limit GitHub reports."""
+
+        def _observe(state: _State, now: float) -> tuple[_State, float]:
+            rate = max(remaining, 1) / max(reset - now, 1.0)
+            return _State(min(_refill(state, now), float(remaining)), rate, now), 0
+
+        self._update(key, _observe)
+
+    def _update(self, key: str, fn: t.Callable[[_State, float], tuple[_State, float]]) -> float:
+        self.path.mkdir(parents=True, exist_ok=True)
+        with (self.path / key).open("a+", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            now = self.clock()
+            state, ret = fn(_load(f.read(), now), now)
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps(state._asdict()))
+        return ret
+
+
+def _refill(state: _State, now: float) -> float:
+    return min(state.tokens + max(now - state.updated, 0.0) * state.rate, BURST)
+
+
+def _load(raw: str, now: float) -> _State:
+    try:
+        state = _State(**json.loads(raw))
+        if state.rate > 0:
+            return state
+    except (ValueError, TypeError):
+        pass
+    return _State(BURST, HOURLY_QUOTA / 3600, now)
@@ -0,0 +1,146 @@
+"""On-disk ETag cache for GitHub API responses."""
+
+import asyncio as aio
+import hashlib
+import json
+import os
+import time
+import typing as t
+from contextlib import suppress
+from http import HTTPStatus
+from pathlib import Path
+
+import httpx
+from xdg.BaseDirectory import xdg_cache_home
+
+from octotail.budget import MAX_WAIT, RateBudget
+from octotail.utils import debug
+
+CACHE_DIR = Path(xdg_cache_home) / "octotail" / "gh-api"
+CACHE_TTL = 7 * 24 * 3600
+
+# the cached body is stored decoded, so these no longer describe it
+_HOP_HEADERS = {"content-length", "content-encoding", "transfer-encoding"}
+_CONDITIONAL_HEADERS = {"if-none-match", "if-modified-since"}
+
+
+class Entry(t.NamedTuple):
+    """A cached 200 response."""
+
+    etag: str
+    headers: dict[str, str]
+    body: str
+
+
+class ResponseCache(t.NamedTuple):
+    """ETag-keyed responses, one file per request, shared by every octotail process."""
+
+    path: Path = CACHE_DIR
+
+    def get(self, key: str) -> Entry | None:
+        with suppress(OSError, ValueError, TypeError):
+            return Entry(**json.loads((self.path / key).read_text()))
+        return None
+
+    def put(self, key: str, entry: Entry) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp = self.path / f".{key}.{os.getpid()}"
+        tmp.write_text(json.dumps(entry._asdict()))
+        tmp.replace(self.path / key)
+
+    def prune(self, ttl: float = CACHE_TTL) -> None:
+        cutoff = time.time() - ttl
+        with suppress(OSError):
+            for entry in self.path.iterdir():
+                if entry.stat().st_mtime < cutoff:
+                    entry.unlink(missing_ok=True)
+
+
+class CachingTransport(httpx.AsyncBaseTransport):
+    """Revalidates GETs with `If-None-Match` and answers 304s from the cache.
+
+    GitHub doesn't count 304s against the rate limit, so unchanged polls become free.
+    With a `budget`, requests also wait for their turn in the machine-wide rate budget.
+    """
+
+    cache: ResponseCache
+    budget: RateBudget | None
+    transport: httpx.AsyncBaseTransport
+
+    def __init__(
+        self,
+        cache: ResponseCache | None = None,
+        budget: RateBudget | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.cache = cache or ResponseCache()
+        self.cache.prune()
+        self.budget = budget
+        self.transport = transport or httpx.AsyncHTTPTransport(http2=True)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "GET" or _CONDITIONAL_HEADERS & set(request.headers.keys()):
+            # conditional requests made by the caller expect to see their own 304s
+            return await self._send(request)
+
+        key = _cache_key(request)
+        if (entry := self.cache.get(key)) is not None:
+            request.headers["If-None-Match"] = entry.etag
+
+        response = await self._send(request)
+
+        if response.status_code == HTTPStatus.NOT_MODIFIED and entry is not None:
+            debug(f"cache hit: {request.url}")
+            await response.aclose()
+            return _from_cache(request, entry, response)
+        if response.status_code == HTTPStatus.OK and (etag := response.headers.get("ETag")):
+            await response.aread()
+            headers = {k: v for k, v in response.headers.items() if k.lower() not in _HOP_HEADERS}
+            self.cache.put(key, Entry(etag=etag, headers=headers, body=response.text))
+        return response
+
+    async def _send(self, request: httpx.Request) -> httpx.Response:
+        if self.budget is None:
+            return await self.transport.handle_async_request(request)
+
+        key = _budget_key(request)
+        if (wait := min(self.budget.reserve(key), MAX_WAIT)) > 0:
+            debug(f"waiting {wait:.2f}s for the rate budget")
+            await aio.sleep(wait)
+
+        response = await self.transport.handle_async_request(request)
+
+        if response.status_code == HTTPStatus.NOT_MODIFIED:
+            self.budget.refund(key)
+        if response.headers.get("X-RateLimit-Resource", "core") == "core":
+            with suppress(KeyError, ValueError):
+                remaining = int(response.headers["X-RateLimit-Remaining"])
+                self.budget.observe(key, remaining, float(response.headers["X-RateLimit-Reset"]))
+        return response
+
+
+def _budget_key(request: httpx.Request) -> str:
+    # GitHub rate limits per token
+    return hashlib.sha256(request.headers.get("Authorization", "").encode()).hexdigest()[:32]
+
+
+def _cache_key(request: httpx.Request) -> str:
+    # responses depend on who's asking (and how), so the credentials are part of the key
+    parts = [str(request.url), *(request.headers.get(h, "") for h in ("Authorization", "Accept"))]
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
+def _from_cache(
+    request: httpx.Request, entry: Entry, not_modified: httpx.Response
+) -> httpx.Response:
+    # fresh rate limit headers & co. from the 304 take precedence
+    fresh = {k: v for k, v in not_modified.headers.items() if k.lower() not in _HOP_HEADERS}
+    return httpx.Response(
+        HTTPStatus.OK,
+        headers={**entry.headers, **fresh},
+        content=entry.body.encode(),
+        request=request,
+    )
@@ -5,7 +5,9 @@ import re
 import typing as t
 from contextvars import ContextVar
 from dataclasses import dataclass
+from enum import StrEnum
 from functools import wraps
+from pathlib import Path
 from unittest.mock import patch
 
 from rich.box import Box
@@ -43,6 +45,20 @@ def _repo_callback(value: str | None) -> str | None:
     return value
 
 
+class Extractor(StrEnum):
+    """Where websocket subscriptions get extracted from."""
+
+    PROXY = "proxy"
+    CDP = "cdp"
+
+
+class LaunchProfile(StrEnum):
+    """Which set of flags chromium gets launched with."""
+
+    DEFAULT = "default"
+    LOW_MEMORY = "low-memory"
+
+
 def version_callback(value: bool) -> None:
     if value:
         print(f"octotail version: {__version__}")
@@ -121,6 +137,16 @@ class Opts:
             rich_help_panel="Workflow filters",
         ),
     ] = None
+    event: t.Annotated[
+        str | None,
+        Option(
+            "-e",
+            "--event",
+            help="Only consider workflows triggered by this event. Example: `push`",
+            show_default=False,
+            rich_help_panel="Workflow filters",
+        ),
+    ] = None
     repo: t.Annotated[
         str | None,
         Option(
@@ -133,6 +159,18 @@ class Opts:
             metavar="USER/REPO",
         ),
     ] = None
+    all_runs: t.Annotated[
+        bool,
+        Option(
+            "-a",
+            "--all",
+            help=(
+                "Tail every matching active run at once instead of insisting on a single one."
+                " Output is prefixed by workflow and job."
+            ),
+            rich_help_panel="Workflow filters",
+        ),
+    ] = False
     headless: t.Annotated[
         bool,
         Option(
@@ -150,6 +188,201 @@ class Opts:
             rich_help_panel="Others",
         ),
     ] = None
+    extractor: t.Annotated[
+        Extractor,
+        Option(
+            envvar="OCTOTAIL_EXTRACTOR",
+            help=(
+                "Capture websocket subscriptions through mitmproxy (`proxy`)"
+                " or straight from the browser's DevTools protocol (`cdp`)."
+            ),
+            rich_help_panel="Others",
+        ),
+    ] = Extractor.PROXY
+    max_tabs: t.Annotated[
+        int,
+        Option(
+            envvar="OCTOTAIL_MAX_TABS",
+            help="How many job pages the browser may load at once.",
+            min=1,
+            rich_help_panel="Others",
+        ),
+    ] = 4
+    run_pages: t.Annotated[
+        bool,
+        Option(
+            "--run-page/--no-run-page",
+            envvar="OCTOTAIL_RUN_PAGE",
+            help=(
+                "[Experimental] Open each run's page once and take every job's subscription from"
+                " it, visiting job pages only for jobs it doesn't show."
+            ),
+            rich_help_panel="Others",
+        ),
+    ] = False
+    block_resources: t.Annotated[
+        bool,
+        Option(
+            envvar="OCTOTAIL_BLOCK_RESOURCES",
+            help=(
+                "Keep the browser from loading images, fonts, stylesheets, beacons and anything"
+                " served off GitHub's own hosts while visiting job pages."
+            ),
+            rich_help_panel="Others",
+        ),
+    ] = True
+    allow_hosts: t.Annotated[
+        list[str] | None,
+        Option(
+            "--allow-host",
+            envvar="OCTOTAIL_ALLOW_HOSTS",
+            help="Let job pages load resources from this host (and its subdomains) too.",
+            show_default=False,
+            rich_help_panel="Others",
+        ),
+    ] = None
+    profile_dir: t.Annotated[
+        Path | None,
+        Option(
+            envvar="OCTOTAIL_PROFILE_DIR",
+            help=(
+                "Chromium profile to keep the session and the HTTP cache in across runs."
+                " Ignored while another chromium is using it."
+            ),
+            show_default="$XDG_CACHE_HOME/octotail/chromium",
+            rich_help_panel="Others",
+        ),
+    ] = None
+    profile_on_tmpfs: t.Annotated[
+        bool,
+        Option(
+            envvar="OCTOTAIL_PROFILE_ON_TMPFS",
+            help=(
+                "Keep the default chromium profile under $XDG_RUNTIME_DIR instead, which is"
+                " usually a tmpfs that gets cleared on logout."
+            ),
+            rich_help_panel="Others",
+        ),
+    ] = False
+    profile_cache_mb: t.Annotated[
+        int,
+        Option(
+            envvar="OCTOTAIL_PROFILE_CACHE_MB",
+            help=(
+                "Cap on chromium's disk cache, in MB. The profile's caches get cleared"
+                " once it grows past twice that."
+            ),
+            min=1,
+            rich_help_panel="Others",
+        ),
+    ] = 256
+    launch_profile: t.Annotated[
+        LaunchProfile,
+        Option(
+            envvar="OCTOTAIL_LAUNCH_PROFILE",
+            help=(
+                "Launch chromium with its `default` flags or trade some speed for a smaller"
+                " footprint with `low-memory`."
+            ),
+            rich_help_panel="Others",
+        ),
+    ] = LaunchProfile.DEFAULT
+    rss_budget_mb: t.Annotated[
+        int | None,
+        Option(
+            envvar="OCTOTAIL_RSS_BUDGET_MB",
+            help=(
+                "Restart the browser between job visits once it uses more than this much"
+                " memory, in MB."
+            ),
+            min=1,
+            show_default=False,
+            rich_help_panel="Others",
+        ),
+    ] = None
+    batch_window: t.Annotated[
+        float,
+        Option(
+            envvar="OCTOTAIL_BATCH_WINDOW",
+            help="Milliseconds to coalesce a job's output for before printing it. 0 disables.",
+            rich_help_panel="Others",
+        ),
+    ] = 5.0
+    output_latency: t.Annotated[
+        float,
+        Option(
+            envvar="OCTOTAIL_OUTPUT_LATENCY",
+            help="Upper bound, in milliseconds, on buffering output before writing it out.",
+            rich_help_panel="Others",
+        ),
+    ] = 50.0
+    discovery_timeout: t.Annotated[
+        float,
+        Option(
+            envvar="OCTOTAIL_DISCOVERY_TIMEOUT",
+            help="Seconds to keep looking for an active run before giving up.",
+            rich_help_panel="Others",
+        ),
+    ] = 60.0
+    webhook_port: t.Annotated[
+        int | None,
+        Option(
+            envvar="OCTOTAIL_WEBHOOK_PORT",
+            help=(
+                "Listen on this local port for `workflow_job` / `workflow_run` webhook deliveries"
+                " forwarded by a relay. Polling becomes a slow safety net."
+            ),
+            show_default=False,
+            rich_help_panel="Others",
+        ),
+    ] = None
+    webhook_secret: t.Annotated[
+        str | None,
+        Option(
+            envvar="OCTOTAIL_WEBHOOK_SECRET",
+            help="Secret to verify the webhook deliveries' signatures with.",
+            show_default=False,
+            rich_help_panel="Others",
+        ),
+    ] = None
+    api_url: t.Annotated[
+        str,
+        Option(
+            envvar="OCTOTAIL_API_URL",
+            help="Base URL of the GitHub REST API.",
+            rich_help_panel="Others",
+        ),
+    ] = "https://api.github.com"
+    daemon: t.Annotated[
+        bool,
+        Option(
+            envvar="OCTOTAIL_DAEMON",
+            help="Attach to a running `octotailx daemon` instead of starting a browser + proxy.",
+            rich_help_panel="Others",
+        ),
+    ] = True
+    browserless: t.Annotated[
+        bool,
+        Option(
+            envvar="OCTOTAIL_BROWSERLESS",
+            help=(
+                "[Experimental] Scrape job pages using the saved GitHub session cookies;"
+                " chromium only gets launched if that fails."
+            ),
+            rich_help_panel="Others",
+        ),
+    ] = False
+    live_discovery: t.Annotated[
+        bool,
+        Option(
+            envvar="OCTOTAIL_LIVE_DISCOVERY",
+            help=(
+                "[Experimental] Subscribe to the run page's live updates using the saved GitHub"
+                " session cookies and poll only to confirm what they announce."
+            ),
+            rich_help_panel="Others",
+        ),
+    ] = False
     version: t.Annotated[
         bool | None,
         Option(
@@ -0,0 +1,234 @@
+"""Long-lived browser + proxy stack, shared by octotail invocations over a Unix socket."""
+
+import json
+import multiprocessing as mp
+import socket
+import socketserver
+import threading
+import typing as t
+from contextlib import suppress
+from multiprocessing.queues import Queue
+from pathlib import Path
+from queue import Empty
+from threading import Event
+
+from pykka import ActorRef, ThreadingActor
+from xdg.BaseDirectory import get_runtime_dir
+
+from octotail.cli import Extractor, Opts
+from octotail.manager import Manager
+from octotail.msg import BrowseRequest, CloseRequest, ExitRequest, ProxyLive, VisitRequest, WsSub
+from octotail.utils import debug, log
+
+SOCKET_PATH = Path(get_runtime_dir(strict=False)) / "octotail" / "daemon.sock"
+
+type WireMsg = VisitRequest | WsSub | CloseRequest
+
+
+def encode(msg: WireMsg) -> bytes:
+    match msg:
+        case VisitRequest():
+            payload: dict[str, t.Any] = {"visit": msg._asdict()}
+        case WsSub():
+            payload = {"sub": {"url": msg.url, "subs": msg.subs, "job_id": msg.job_id}}
+        case CloseRequest():
+            payload = {"close": msg._asdict()}
+    return json.dumps(payload).encode() + b"\n"
+
+
+def decode(line: bytes) -> WireMsg | None:
+    try:
+        payload = json.loads(line)
+        if "visit" in payload:
+            return VisitRequest(**payload["visit"])
+        if "sub" in payload:
+            return WsSub(**payload["sub"])
+        if "close" in payload:
+            return CloseRequest(**payload["close"])
+    except (ValueError, TypeError) as e:
+        debug(f"dropping malformed message: {e}")
+    return None
+
+
+def connect(path: Path = SOCKET_PATH) -> socket.socket | None:
+    """Returns a connection to a running daemon, if there is one."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(path))
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+class Router(ThreadingActor):
+    """Stands in for the Manager on the daemon side: routes subscriptions back to clients."""
+
+    browse_queue: Queue[BrowseRequest]
+    stop_event: Event
+
+    routes: dict[int, list[socket.socket]]
+
+    def __init__(self, browse_queue: Queue[BrowseRequest], stop: Event):
+        super().__init__()
+        self.browse_queue = browse_queue
+        self.stop_event = stop
+        self.routes = {}
+
+    def on_receive(self, message: t.Any) -> None:
+        debug(f"{message!r}")
+
+        match message:
+            case ProxyLive() as proxy_live:
+                self.browse_queue.put_nowait(proxy_live)
+
+            case WsSub() as ws_sub:
+                self.browse_queue.put_nowait(CloseRequest(ws_sub.job_id))
+                for conn in self.routes.pop(ws_sub.job_id, []):
+                    with suppress(OSError):
+                        conn.sendall(encode(ws_sub))
+
+            case str() as fatal:
+                log(fatal)
+
+    def on_stop(self) -> None:
+        self.stop_event.set()
+        self.browse_queue.put_nowait(ExitRequest())
+        debug("router exiting")
+
+    def visit(self, visit_req: VisitRequest, conn: socket.socket) -> None:
+        self.routes.setdefault(visit_req.job_id, []).append(conn)
+        self.browse_queue.put_nowait(visit_req)
+
+    def close(self, job_id: int, conn: socket.socket) -> None:
+        """The client is done with the job; its page goes once no other client waits on it."""
+        if (conns := self.routes.get(job_id)) is None:
+            return
+        if conn in conns:
+            conns.remove(conn)
+        if not conns:
+            del self.routes[job_id]
+            self.browse_queue.put_nowait(CloseRequest(job_id))
+
+    def disconnect(self, conn: socket.socket) -> None:
+        for job_id, conns in list(self.routes.items()):
+            if conn in conns:
+                conns.remove(conn)
+            if not conns:
+                del self.routes[job_id]
+                self.browse_queue.put_nowait(CloseRequest(job_id))
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "_Server"
+
+    def handle(self) -> None:
+        router = self.server.router.proxy()
+        debug("client attached")
+        for line in self.rfile:
+            match decode(line):
+                case VisitRequest() as visit_req:
+                    router.visit(visit_req, self.request)
+                case CloseRequest(job_id):
+                    router.close(job_id, self.request)
+        router.disconnect(self.request).get()
+        debug("client detached")
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    router: ActorRef[Router]
+
+
+def serve(
+    opts: Opts,
+    target: t.Callable[[Opts, Queue[BrowseRequest], Queue[WsSub]], None],
+    path: Path = SOCKET_PATH,
+) -> int:  # pragma: no cover
+    """Run the browser and the proxy, then serve tail clients until interrupted."""
+    from octotail.browser import BrowserWatcher
+    from octotail.mitm import ProxyWatcher
+
+    if (sock := connect(path)) is not None:
+        sock.close()
+        log(f"fatal: a daemon is already listening on {path}")
+        return 1
+    path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+    path.unlink(missing_ok=True)
+
+    _stop = Event()
+    browse_queue: Queue[BrowseRequest] = mp.Queue()
+    router = Router.start(browse_queue, _stop)
+    # the router speaks the subset of the manager protocol the watchers rely on
+    mgr = t.cast(ActorRef[Manager], router)
+
+    browser_watcher = BrowserWatcher.start(mgr, opts, browse_queue)
+    watchers = [browser_watcher.proxy().watch(target=target)]
+    if opts.extractor == Extractor.PROXY:
+        proxy_watcher = ProxyWatcher.start(mgr, opts.port)
+        watchers.append(proxy_watcher.proxy().watch())
+
+    with _Server(str(path), _Handler) as server:
+        server.router = router
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        log(f"listening on {path}")
+        try:
+            _stop.wait()
+        except KeyboardInterrupt:
+            router.stop()
+        server.shutdown()
+
+    for watcher in watchers:
+        watcher.get()
+    path.unlink(missing_ok=True)
+    return 0
+
+
+class DaemonLink(ThreadingActor):
+    """Client side: forwards visit & close requests to the daemon, subscriptions to the manager."""
+
+    mgr: ActorRef[Manager]
+    inbox: Queue[BrowseRequest]
+    sock: socket.socket
+    stop_event: Event
+
+    _detached: Event
+
+    def __init__(self, mgr: ActorRef[Manager], inbox: Queue[BrowseRequest], sock: socket.socket):
+        super().__init__()
+        self.mgr = mgr
+        self.inbox = inbox
+        self.sock = sock
+        self.stop_event = mgr.proxy().stop_event.get()
+        self._detached = Event()
+
+    def on_stop(self) -> None:
+        with suppress(OSError):
+            self.sock.close()
+
+    def watch(self) -> None:
+        reader = threading.Thread(target=self._read, daemon=True)
+        reader.start()
+
+        while not self.stop_event.is_set():
+            with suppress(Empty):
+                match self.inbox.get(timeout=0.25):
+                    case VisitRequest() | CloseRequest() as wire_msg:
+                        with suppress(OSError):
+                            self.sock.sendall(encode(wire_msg))
+                    case ExitRequest():
+                        break
+        self._detached.set()
+        with suppress(OSError):
+            self.sock.shutdown(socket.SHUT_RDWR)
+        reader.join()
+        debug("exiting")
+
+    def _read(self) -> None:
+        with suppress(OSError), self.sock.makefile("rb") as lines:
+            for line in lines:
+                if isinstance(msg := decode(line), WsSub) and self.mgr.is_alive():
+                    self.mgr.tell(msg)
+        if not (self.stop_event.is_set() or self._detached.is_set()):
+            log("fatal: lost the connection to the daemon")
+            self.mgr.stop()
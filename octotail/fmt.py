@@ -3,20 +3,22 @@ Routines for pretty formatting the output.
 """
 
 import sys
+import time
 import typing as t
 from contextlib import suppress
-from functools import partial
 from multiprocessing.queues import JoinableQueue
 from queue import Empty
 
 from pykka import ActorRef, ThreadingActor
-from termcolor import colored
+from termcolor import ATTRIBUTES, COLORS, RESET
 from termcolor._types import Color
 
 from octotail.manager import Manager
 from octotail.msg import OutputItem, StreamerMsg, WebsocketClosed
-from octotail.utils import debug, flatmap, remove_consecutive_falsy
+from octotail.utils import debug
 
+MAX_LATENCY = 0.05
+MAX_CHUNKS = 2048
 WHEEL: list[Color] = [
     "light_green",
     "light_yellow",
@@ -31,15 +33,24 @@ class Formatter(ThreadingActor):
 
     mgr: ActorRef[Manager]
     queue: JoinableQueue[StreamerMsg]
+    max_latency: float
     _wheel_idx: int
     _color_map: dict[str, int]
-
-    def __init__(self, mgr: ActorRef[Manager], queue: JoinableQueue[StreamerMsg]):
+    _styles: dict[str, "_Style"]
+
+    def __init__(
+        self,
+        mgr: ActorRef[Manager],
+        queue: JoinableQueue[StreamerMsg],
+        max_latency: float = MAX_LATENCY,
+    ):
         super().__init__()
         self.mgr = mgr
         self.queue = queue
+        self.max_latency = max_latency
         self._wheel_idx = 0
         self._color_map = {}
+        self._styles = {}
         self.file = sys.stdout
 
     def _get_color(self, group: str) -> Color:
@@ -55,53 +66,129 @@ class Formatter(ThreadingActor):
         while True:
             # gives us a chance to check the stop event
             with suppress(Empty):
-                item = self.queue.get(timeout=2)
-                self.queue.task_done()
-                match item:
-                    case None:
-                        break
-                    case OutputItem():
-                        print("\n".join(self._handle_item(item)), file=self.file)
-                    case _ as obj:
-                        if obj == WebsocketClosed():
-                            self.mgr.stop()
-                            break
+                chunks, taken, last = self._drain(self.queue.get(timeout=2))
+                if chunks:
+                    self.file.write("".join(chunks))
+                    self.file.flush()
+                for _ in range(taken):
+                    self.queue.task_done()
+                if last is None:
+                    break
+                if last == WebsocketClosed():
+                    self.mgr.stop()
+                    break
         debug("exiting")
 
-    def _handle_item(self, item: OutputItem) -> t.Generator[str, None, None]:
-        _colored = partial(colored, color=self._get_color(item.job_name), force_color=True)
-        _decorate = partial(_decorate_line, job_name=item.job_name, _colored=_colored)
+    def _drain(self, item: StreamerMsg) -> tuple[list[str], int, StreamerMsg]:
+        """Render whatever is already queued after `item`, for at most `max_latency` seconds.
 
-        prefix = _colored(f"[{item.job_name}]:")
-        return (
-            f"{prefix} {line}" for line in remove_consecutive_falsy(flatmap(_decorate, item.lines))
+        Returns the rendered chunks, how many queue items were taken and the last one of them.
+        """
+        chunks: list[str] = []
+        taken, deadline = 1, time.monotonic() + self.max_latency
+        while True:
+            match item:
+                case None:
+                    return chunks, taken, item
+                case OutputItem():
+                    chunks.append(self._render(item))
+                    chunks.append("\n")
+                case _ if item == WebsocketClosed():
+                    return chunks, taken, item
+            if len(chunks) >= MAX_CHUNKS or time.monotonic() >= deadline:
+                return chunks, taken, item
+            try:
+                item = self.queue.get_nowait()
+            except Empty:
+                return chunks, taken, item
+            taken += 1
+
+    def _get_style(self, job_name: str) -> "_Style":
+        if (style := self._styles.get(job_name)) is None:
+            style = self._styles[job_name] = _Style.for_job(job_name, self._get_color(job_name))
+        return style
+
+    def _render(self, item: OutputItem) -> str:
+        style = self._get_style(item.job_name)
+        color, prefix = style.color, style.prefix
+        out: list[str] = []
+        last_empty = False
+
+        for line in item.lines:
+            if line[:1] in _MARKER_STARTS and (
+                render := _MARKERS.get(marker := line[: line.find("]") + 1])
+            ):
+                for decorated in render(line[len(marker) :], style):
+                    # collapse the blank lines the markers pad themselves with
+                    if decorated or not last_empty:
+                        out.append(prefix + decorated)
+                    last_empty = not decorated
+            else:
+                out.append(prefix + color + line + RESET)
+                last_empty = False
+
+        return "\n".join(out)
+
+
+def _esc(code: int) -> str:
+    return f"\033[{code}m"
+
+
+BOLD = _esc(ATTRIBUTES["bold"])
+WHITE, RED = _esc(COLORS["white"]), _esc(COLORS["red"])
+CONCLUSION_COLORS = {"success": _esc(COLORS["green"]), "failure": RED}
+YELLOW = _esc(COLORS["yellow"])
+
+
+class _Style(t.NamedTuple):
+    """Escape sequences and decorations of a job, rendered once and reused for every line."""
+
+    color: str
+    prefix: str
+    width: int
+    endgroup: str
+
+    @classmethod
+    def for_job(cls, job_name: str, color: Color) -> "_Style":
+        esc = _esc(COLORS[color])
+        width = 80 - len(f"remote: [{job_name}]: ")
+        return cls(
+            color=esc,
+            prefix=f"{esc}[{job_name}]:{RESET} ",
+            width=width,
+            endgroup=f"{esc}{'-' * width}{RESET}",
         )
 
 
-def _decorate_line(line: str, job_name: str, _colored: t.Callable[..., str]) -> list[str]:
-    if line.startswith("[command]"):
-        return [colored("$ " + line.removeprefix("[command]"), "white", force_color=True)]
+def _command(rest: str, _: _Style) -> tuple[str, ...]:
+    return (f"{WHITE}$ {rest}{RESET}",)
 
-    if line.startswith("##[group]"):
-        unprefixed = line.removeprefix("##[group]")
-        rem = _colored(unprefixed, attrs=["bold"])
-        sep = _colored("-" * (80 - len(f"remote: [{job_name}]: ") - len(unprefixed) - 6))
-        return ["", f"{_colored('--')}  {rem}  {sep}"]
 
-    if line.startswith("##[error]"):
-        unprefixed = line.removeprefix("##[error]")
-        return ["", colored(f"Error: {unprefixed}", "red", attrs=["bold"], force_color=True), ""]
+def _group(rest: str, style: _Style) -> tuple[str, ...]:
+    color = style.color
+    sep = "-" * (style.width - len(rest) - 6)
+    return "", f"{color}--{RESET}  {BOLD}{color}{rest}{RESET}  {color}{sep}{RESET}"
 
-    if line.startswith("##[endgroup]"):
-        sep = _colored("-" * (80 - len(f"remote: [{job_name}]: ")))
-        return [sep, ""]
 
-    if line.startswith("##[conclusion]"):
-        unprefixed = line.removeprefix("##[conclusion]").lower()
-        color: Color = (
-            "green" if unprefixed == "success" else "red" if unprefixed == "failure" else "yellow"
-        )
-        _conc_colored = partial(colored, color=color, attrs=["bold"], force_color=True)
-        return ["", _conc_colored(f"Conclusion: {unprefixed.upper()}"), ""]
+def _error(rest: str, _: _Style) -> tuple[str, ...]:
+    return "", f"{BOLD}{RED}Error: {rest}{RESET}", ""
+
+
+def _endgroup(_: str, style: _Style) -> tuple[str, ...]:
+    return style.endgroup, ""
+
+
+def _conclusion(rest: str, _: _Style) -> tuple[str, ...]:
+    conclusion = rest.lower()
+    color = CONCLUSION_COLORS.get(conclusion, YELLOW)
+    return "", f"{BOLD}{color}Conclusion: {conclusion.upper()}{RESET}", ""
+
 
-    return [_colored(line)]
+_MARKERS: dict[str, t.Callable[[str, _Style], tuple[str, ...]]] = {
+    "[command]": _command,
+    "##[group]": _group,
+    "##[error]": _error,
+    "##[endgroup]": _endgroup,
+    "##[conclusion]": _conclusion,
+}
+_MARKER_STARTS = frozenset(marker[0] for marker in _MARKERS)
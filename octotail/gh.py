@@ -1,63 +1,120 @@
 """GitHub actor."""
 
+import asyncio as aio
+import time
 import typing as t
-from threading import Event
+from threading import Event, Lock, Thread
 
-from github import Auth, Github
-from github.Repository import Repository
-from github.WorkflowJob import WorkflowJob
-from github.WorkflowRun import WorkflowRun
+import httpx
 from pykka import ActorRef, ThreadingActor
-from returns.io import IOResultE, impure_safe
+from returns.io import IOResultE, IOSuccess, impure_safe
 from returns.pipeline import is_successful
 from returns.result import Failure, ResultE, Success
 
+from octotail.api import API_URL, PER_PAGE, GitHubApi, Repo, RunQuery, WorkflowJob, WorkflowRun
 from octotail.cli import Opts
 from octotail.manager import Manager
 from octotail.msg import JobDone, WorkflowDone
-from octotail.utils import Retry, debug, log, perform_io, retries
+from octotail.utils import Backoff, Retry, debug, log, perform_io, retries
 
 VALID_STATI = ["queued", "in_progress", "requested", "waiting", "action_required"]
-DEFAULT_POLL_INTERVAL = 2
+BUSY_STATI = {"queued", "requested", "waiting", "pending"}
+MIN_POLL_INTERVAL = 1.0
+MAX_POLL_INTERVAL = 15.0
+POLL_BACKOFF = 1.5
+# runs usually show up within seconds of a push, busy orgs can take a lot longer
+DISCOVERY_BACKOFF = Backoff(delay=1.0, max_delay=8.0, fast_tries=4, fast_delay=0.5)
 
 
 class Client:  # pragma: no cover
-    """Side-effects galore."""
+    """Side-effects galore.
+
+    All calls run on one background event loop, sharing the API client's connection pool
+    between the run lookup and every poll after it.
+    """
+
+    base_url: str
+
+    _api: GitHubApi | None
+    _loop: aio.AbstractEventLoop | None
+
+    def __init__(self, base_url: str = API_URL):
+        self.base_url = base_url
+        self._api = None
+        self._loop = None
 
-    @staticmethod
     @impure_safe
-    def get_workflow_jobs(wf_run: WorkflowRun) -> list[WorkflowJob]:
-        wf_run.update()
-        return list(wf_run.jobs())
+    def get_repo(self, repo_id: str, pat: str) -> Repo:
+        self._api = GitHubApi(pat, self.base_url)
+        return self._run(self._api.get_repo(repo_id))
 
-    @staticmethod
     @impure_safe
-    def get_workflow_runs(repo: Repository, head_sha: str) -> list[WorkflowRun]:
-        return list(repo.get_workflow_runs(head_sha=head_sha))
+    def get_workflow_id(self, repo: Repo, name: str) -> int | None:
+        return self._run(self._get_api().get_workflow_id(repo, name))
 
-    @staticmethod
     @impure_safe
-    def get_repo(repo_id: str, pat: str) -> Repository:
-        gh_client = Github(auth=Auth.Token(pat))
-        return gh_client.get_repo(repo_id)
+    def get_workflow_runs(
+        self,
+        repo: Repo,
+        query: RunQuery,
+        accept: t.Callable[[WorkflowRun], bool],
+        limit: int | None,
+    ) -> list[WorkflowRun]:
+        runs = self._get_api().iter_workflow_runs(repo, query)
+        return self._run(_take(runs, accept, limit))
 
-    @staticmethod
-    def poll_interval() -> float:
-        return DEFAULT_POLL_INTERVAL
+    @impure_safe
+    def get_workflow_run(self, wf_run: WorkflowRun) -> WorkflowRun:
+        return self._run(self._get_api().get_workflow_run(wf_run))
+
+    @impure_safe
+    def get_workflow_jobs(self, wf_run: WorkflowRun) -> list[WorkflowJob]:
+        return self._run(self._get_api().get_workflow_jobs(wf_run))
+
+    def response_headers(self) -> t.Mapping[str, t.Any]:
+        return self._get_api().last_headers
+
+    def _get_api(self) -> GitHubApi:
+        if self._api is None:
+            raise RuntimeError("get_repo has to be called first")
+        return self._api
+
+    def _run[R](self, coro: t.Coroutine[t.Any, t.Any, R]) -> R:
+        if self._loop is None:
+            self._loop = aio.new_event_loop()
+            Thread(target=self._loop.run_forever, daemon=True).start()
+        return aio.run_coroutine_threadsafe(coro, self._loop).result()
 
 
 DEFAULT_CLIENT: Client = Client()
 
 
+async def _take[
+    T
+](items: t.AsyncIterator[T], accept: t.Callable[[T], bool], limit: int | None) -> list[T]:
+    taken: list[T] = []
+    async for item in items:
+        if accept(item):
+            taken.append(item)
+            if len(taken) == limit:
+                break
+    return taken
+
+
 class JobState(t.NamedTuple):
-    """Holds job state (seen or concluded)."""
+    """Holds job state (seen or concluded).
+
+    Shared by everything that reports jobs to the manager; hold `lock` across
+    diffing and reporting so each job gets reported once, in order.
+    """
 
     seen_jobs: set[int]
     concluded_jobs: set[int]
+    lock: Lock
 
     @classmethod
     def default(cls) -> "JobState":
-        return cls(seen_jobs=set(), concluded_jobs=set())
+        return cls(seen_jobs=set(), concluded_jobs=set(), lock=Lock())
 
     def diff(self, new_jobs: list[WorkflowJob]) -> list[JobDone | WorkflowJob]:
         _diff: list[JobDone | WorkflowJob] = []
@@ -72,49 +129,190 @@ class JobState(t.NamedTuple):
         return _diff
 
 
+class PollSchedule:
+    """Polls fast while jobs come and go, backs off while nothing changes.
+
+    Never polls faster than the remaining rate limit allows until its reset.
+    """
+
+    min_interval: float
+    max_interval: float
+    interval: float
+
+    def __init__(
+        self, min_interval: float = MIN_POLL_INTERVAL, max_interval: float = MAX_POLL_INTERVAL
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+
+    def next(
+        self,
+        *,
+        busy: bool,
+        headers: t.Mapping[str, t.Any],
+        now: float | None = None,
+        requests: int = 1,
+    ) -> float:
+        """The next poll's delay, given that the last one took `requests` API requests."""
+        if busy:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * POLL_BACKOFF, self.max_interval)
+        floor = rate_limit_floor(headers, time.time() if now is None else now, requests)
+        interval = max(self.interval, floor)
+        debug(f"next poll in {interval:.2f}s (busy: {busy}, rate limit floor: {floor:.2f}s)")
+        return interval
+
+
+class LiveSchedule(PollSchedule):
+    """Polls like the default schedule until `live` is set, then between `live_min_interval`
+    and `live_max_interval`: with live updates confirmed to come through, polling only confirms.
+    """
+
+    live: Event
+    live_min_interval: float
+    live_max_interval: float
+
+    def __init__(self, live: Event, live_min_interval: float, live_max_interval: float):
+        super().__init__()
+        self.live = live
+        self.live_min_interval = live_min_interval
+        self.live_max_interval = live_max_interval
+
+    def next(
+        self,
+        *,
+        busy: bool,
+        headers: t.Mapping[str, t.Any],
+        now: float | None = None,
+        requests: int = 1,
+    ) -> float:
+        if self.live.is_set():
+            self.min_interval, self.max_interval = self.live_min_interval, self.live_max_interval
+        else:
+            self.min_interval, self.max_interval = MIN_POLL_INTERVAL, MAX_POLL_INTERVAL
+        return super().next(busy=busy, headers=headers, now=now, requests=requests)
+
+
+def rate_limit_floor(headers: t.Mapping[str, t.Any], now: float, requests: int = 1) -> float:
+    """The shortest interval the rate limit headers allow for polls costing `requests` each."""
+    _headers = {k.lower(): v for k, v in headers.items()}
+    try:
+        if (retry_after := _headers.get("retry-after")) is not None:
+            return max(float(retry_after), 0.0)
+        remaining = int(_headers["x-ratelimit-remaining"])
+        until_reset = max(float(_headers["x-ratelimit-reset"]) - now, 0.0)
+    except (KeyError, ValueError, TypeError):
+        return 0.0
+    if remaining <= 0:
+        return until_reset
+    return requests * until_reset / remaining
+
+
+def _may_be_done(jobs: list[WorkflowJob]) -> bool:
+    # no jobs yet is how runs start out, not how they end
+    return bool(jobs) and all(job.conclusion for job in jobs)
+
+
+def _num_pages(jobs: list[WorkflowJob]) -> int:
+    return max(-(-len(jobs) // PER_PAGE), 1)
+
+
+def _is_busy(jobs: list[WorkflowJob]) -> bool:
+    return not jobs or any(job.status in BUSY_STATI for job in jobs if not job.conclusion)
+
+
+def _rate_limit_headers(exc: Exception) -> t.Mapping[str, t.Any] | None:
+    if not isinstance(exc, httpx.HTTPStatusError) or exc.response.status_code not in (403, 429):
+        return None
+    headers = {k.lower(): v for k, v in exc.response.headers.items()}
+    if "retry-after" in headers or headers.get("x-ratelimit-remaining") == "0":
+        return headers
+    return None
+
+
 class RunWatcher(ThreadingActor):
     """Watches for changes in a GitHub Actions run."""
 
     mgr: ActorRef[Manager]
     wf_run: WorkflowRun
     client: Client
+    schedule: PollSchedule
     stop_event: Event
+    wake: Event
 
-    _state: JobState
+    state: JobState
 
     def __init__(
         self,
         mgr: ActorRef[Manager],
         wf_run: WorkflowRun,
         client: Client = DEFAULT_CLIENT,
+        schedule: PollSchedule | None = None,
     ):
         super().__init__()
         self.mgr = mgr
         self.wf_run = wf_run
         self.client = client
+        self.schedule = schedule or PollSchedule()
         self.stop_event = mgr.proxy().stop_event.get()
+        self.wake = Event()
+        mgr.proxy().wake_on_stop(self.wake).get()
 
-        self._state = JobState.default()
+        self.state = JobState.default()
 
     def watch(self) -> None:
         while not self.stop_event.is_set():
             jobs_res = perform_io(self.client.get_workflow_jobs)(self.wf_run)
+            # the job set tells when the run may be over, only the run knows its conclusion
+            refresh = is_successful(jobs_res) and _may_be_done(jobs_res.unwrap())
+            if refresh:
+                jobs_res = self._refresh(jobs_res.unwrap())
+
             if not is_successful(jobs_res):
+                if (headers := _rate_limit_headers(jobs_res.failure())) is not None:
+                    log("rate limited, backing off")
+                    self._sleep(self.schedule.next(busy=False, headers=headers))
+                    continue
                 log(f"fatal error during workflow run update: {jobs_res.failure()}")
                 self.mgr.stop()
                 break
 
-            for job in self._state.diff(jobs_res.unwrap()):
-                if not self._tell(job):
-                    break
-
-            if wf_conclusion := self.wf_run.conclusion:
-                self._tell(WorkflowDone(wf_conclusion))
+            jobs = jobs_res.unwrap()
+            requests = _num_pages(jobs) + refresh
+            debug(f"{len(jobs)} jobs in {requests} requests")
+            with self.state.lock:
+                changes = self.state.diff(jobs)
+                for job in changes:
+                    if not self._tell(job):
+                        break
+
+            if refresh and (wf_conclusion := self.wf_run.conclusion):
+                self._tell(WorkflowDone(wf_conclusion, self.wf_run.id))
                 break
 
-            self.stop_event.wait(self.client.poll_interval())
+            busy = bool(changes) or _is_busy(jobs)
+            headers = self.client.response_headers()
+            self._sleep(self.schedule.next(busy=busy, headers=headers, requests=requests))
         debug("exiting")
 
+    def _sleep(self, interval: float) -> None:
+        """Wait until the next poll is due, or until someone sets `wake` in the meantime.
+
+        The manager sets it too when stopping, so the loop gets to see `stop_event` right away.
+        """
+        if self.wake.wait(interval):
+            debug("woken up early")
+        self.wake.clear()
+
+    def _refresh(self, jobs: list[WorkflowJob]) -> ResultE[list[WorkflowJob]]:
+        def _update(wf_run: WorkflowRun) -> list[WorkflowJob]:
+            self.wf_run = wf_run
+            return jobs
+
+        return perform_io(self.client.get_workflow_run)(self.wf_run).map(_update)
+
     def _tell(self, what: JobDone | WorkflowDone | WorkflowJob) -> bool:
         if self.mgr.is_alive():
             self.mgr.tell(what)
@@ -122,9 +320,9 @@ class RunWatcher(ThreadingActor):
         return False
 
 
-def _get_active_run(
+def _get_active_runs(
     opts: Opts, run_lister: t.Callable[..., ResultE[list[WorkflowRun]]]
-) -> ResultE[WorkflowRun] | Retry:
+) -> ResultE[list[WorkflowRun]] | Retry:
     runs_res = run_lister()
     if not is_successful(runs_res):
         return Failure(runs_res.failure())
@@ -132,39 +330,66 @@ def _get_active_run(
     if not (filtered := _filter_runs(opts, runs_res.unwrap())):
         return Retry()
 
-    if len(filtered) > 1:
+    if len(filtered) > 1 and not opts.all_runs:
         log(f"found multiple active runs for commit '{opts.commit_sha}'")
         for run in filtered:
             log(f"\n\t{run.html_url}", skip_prefix=True)
         log("", skip_prefix=True)
-        log("try narrowing down by workflow name (--workflow) or ref name (--ref-name)")
+        log(
+            "try narrowing down by workflow name (--workflow), ref name (--ref-name)"
+            " or event (--event), or tail them all (--all)"
+        )
         return Failure(RuntimeError("cannot disambiguate"))
 
-    return Success(filtered[0])
+    return Success(filtered)
 
 
 def _filter_runs(opts: Opts, runs: list[WorkflowRun]) -> list[WorkflowRun]:
+    return [run for run in runs if _accepts(opts)(run)]
+
+
+def _accepts(opts: Opts) -> t.Callable[[WorkflowRun], bool]:
     predicates: list[t.Callable[[WorkflowRun], bool]] = [lambda run: run.status in VALID_STATI]
     if opts.workflow_name:
         predicates.append(lambda run: run.name == t.cast(str, opts.workflow_name))
     if opts.ref_name:
         predicates.append(lambda run: t.cast(str, opts.ref_name).endswith(run.head_branch))
-    return [run for run in runs if all(predicate(run) for predicate in predicates)]
+    if opts.event:
+        predicates.append(lambda run: run.event == opts.event)
+    return lambda run: all(predicate(run) for predicate in predicates)
 
 
-def get_active_run(
+def _run_query(client: Client, repo: Repo, opts: Opts) -> IOResultE[RunQuery]:
+    """Push whatever filters the API supports into the query.
+
+    `status` is left out: it only takes one value and an active run can be in any of
+    `VALID_STATI`.
+    """
+    branch = None
+    if opts.ref_name:
+        branch = opts.ref_name.removeprefix("refs/heads/").removeprefix("refs/tags/")
+    if not opts.workflow_name:
+        return IOSuccess(RunQuery(opts.commit_sha, branch, opts.event))
+    return client.get_workflow_id(repo, opts.workflow_name).map(
+        lambda workflow_id: RunQuery(opts.commit_sha, branch, opts.event, workflow_id)
+    )
+
+
+def get_active_runs(
     repo_id: str,
     opts: Opts,
     *,
     client: Client = DEFAULT_CLIENT,
-    retry_delay: float = 0.5,
-) -> ResultE[WorkflowRun]:
+    backoff: Backoff = DISCOVERY_BACKOFF,
+) -> ResultE[list[WorkflowRun]]:
+    """Every active run matching `opts` with `--all`, otherwise the only one."""
     repo = client.get_repo(repo_id, opts.gh_pat)
+    repo_query = repo.bind(lambda _repo: _run_query(client, _repo, opts).map(lambda q: (_repo, q)))
+    # a second match is all it takes to know the run is ambiguous
+    limit = None if opts.all_runs else 2
 
-    def _curried_workflow_runs(_repo: IOResultE[Repository]) -> IOResultE[list[WorkflowRun]]:
-        return _repo.bind(lambda __repo: client.get_workflow_runs(__repo, opts.commit_sha))
+    def _list_runs() -> IOResultE[list[WorkflowRun]]:
+        return repo_query.bind(lambda rq: client.get_workflow_runs(*rq, _accepts(opts), limit))
 
-    return retries(10, retry_delay)(_get_active_run)(
-        opts,
-        lambda: perform_io(_curried_workflow_runs)(repo),
-    )
+    discover = retries(None, backoff, deadline=opts.discovery_timeout)
+    return discover(_get_active_runs)(opts, perform_io(_list_runs))
@@ -4,16 +4,37 @@
 import dataclasses
 import multiprocessing as mp
 import sys
+import typing as t
 from multiprocessing.queues import JoinableQueue, Queue
 from threading import Event
 
-from pykka import ActorRegistry
+from pykka import ActorRef, ActorRegistry, Future, get_all
 from returns.pipeline import is_successful
 
-from octotail.cli import Opts, entrypoint
+from octotail.cli import Extractor, Opts, entrypoint
 from octotail.git import guess_github_repo
 from octotail.utils import debug, find_free_port, log, perform_io
 
+if t.TYPE_CHECKING:  # pragma: no cover
+    from socket import socket
+
+    from octotail.api import WorkflowRun
+    from octotail.gh import Client, PollSchedule
+    from octotail.msg import BrowseRequest, StreamerMsg
+
+# options of the browser, which lives in the daemon when attached to one
+DAEMON_OPTS = {
+    "max_tabs": "--max-tabs",
+    "run_pages": "--run-page",
+    "block_resources": "--block-resources",
+    "allow_hosts": "--allow-host",
+    "profile_dir": "--profile-dir",
+    "profile_on_tmpfs": "--profile-on-tmpfs",
+    "profile_cache_mb": "--profile-cache-mb",
+    "launch_profile": "--launch-profile",
+    "rss_budget_mb": "--rss-budget-mb",
+}
+
 
 def _repo_id(repo: str | None) -> str | None:
     if repo is not None:
@@ -25,51 +46,159 @@ def _repo_id(repo: str | None) -> str | None:
     return None
 
 
+def _scraper(opts: Opts) -> ActorRef[t.Any] | None:
+    from octotail.browser import CookieJar
+    from octotail.scraper import Scraper
+
+    if not (opts.browserless or opts.live_discovery):
+        return None
+    if not (cookies := CookieJar(opts.gh_user).read()):
+        debug("no saved session cookies yet, the browser will have to log in first")
+        return None
+    return Scraper.start(cookies)
+
+
+def _attach(opts: Opts) -> "socket | None":
+    """Connect to a running daemon, if asked to; its browser comes with its own options."""
+    from octotail.daemon import connect
+
+    if not opts.daemon or (sock := connect()) is None:
+        return None
+    defaults = {field.name: field.default for field in dataclasses.fields(Opts)}
+    ignored = [flag for name, flag in DAEMON_OPTS.items() if getattr(opts, name) != defaults[name]]
+    if ignored:
+        log(
+            f"attached to the daemon, ignoring {', '.join(ignored)}:"
+            " pass them to `octotailx daemon` instead"
+        )
+    return sock
+
+
+def _start_manager(
+    opts: Opts,
+    browse_queue: "Queue[BrowseRequest]",
+    output_queue: "JoinableQueue[StreamerMsg]",
+    stop: Event,
+    scraper: ActorRef[t.Any] | None,
+) -> ActorRef[t.Any]:
+    from octotail.manager import Manager
+    from octotail.streamer import StreamerWorker
+
+    streamer = StreamerWorker(output_queue, batch_window=opts.batch_window / 1000)
+    return Manager.start(browse_queue, streamer, stop, scraper if opts.browserless else None)
+
+
+def _start_run_watchers(
+    opts: Opts,
+    manager: ActorRef[t.Any],
+    wf_runs: list["WorkflowRun"],
+    client: "Client",
+    scraper: ActorRef[t.Any] | None,
+) -> list[ActorRef[t.Any]]:
+    """Start a watcher per run; they all share the client's connection and rate budget."""
+    from octotail.gh import RunWatcher
+    from octotail.msg import WatchRun
+    from octotail.webhook import WebhookListener
+
+    live_scraper = scraper if opts.live_discovery and opts.webhook_port is None else None
+    run_watchers = []
+    for wf_run in wf_runs:
+        if opts.all_runs:
+            manager.tell(WatchRun(wf_run.id, wf_run.name))
+        live = Event() if live_scraper is not None else None
+        run_watcher = RunWatcher.start(manager, wf_run, client, _poll_schedule(opts, live=live))
+        if live_scraper is not None:
+            wake = run_watcher.proxy().wake.get()
+            live_scraper.proxy().watch_run(wf_run.html_url, wake, live)
+        run_watchers.append(run_watcher)
+
+    if opts.webhook_port is not None:
+        WebhookListener.start(manager, run_watchers, opts)
+    return run_watchers
+
+
+def _poll_schedule(opts: Opts, *, live: Event | None) -> "PollSchedule | None":
+    from octotail.gh import LiveSchedule, PollSchedule
+    from octotail.scraper import CONFIRM_MAX_INTERVAL, CONFIRM_MIN_INTERVAL
+    from octotail.webhook import SAFETY_NET_INTERVAL
+
+    if opts.webhook_port is not None:
+        return PollSchedule(min_interval=SAFETY_NET_INTERVAL, max_interval=SAFETY_NET_INTERVAL)
+    if live is not None:
+        # polls as usual until the run page's subscription goes through
+        return LiveSchedule(live, CONFIRM_MIN_INTERVAL, CONFIRM_MAX_INTERVAL)
+    return None
+
+
 @entrypoint
 def _main(opts: Opts) -> int:
     from octotail.browser import BrowserWatcher, start_controller
+    from octotail.daemon import DaemonLink
     from octotail.fmt import Formatter
-    from octotail.gh import RunWatcher, get_active_run
-    from octotail.manager import Manager
+    from octotail.gh import Client, get_active_runs
     from octotail.mitm import ProxyWatcher
-    from octotail.msg import BrowseRequest, StreamerMsg
 
     if (repo_id := _repo_id(opts.repo)) is None:
         log("fatal: could not guess repo from remotes and no --repo/-R was passed")
         return 1
 
-    wf_run = get_active_run(repo_id, opts)
-    if not is_successful(wf_run):
-        log(f"fatal: could not find an active run: {wf_run.failure()}")
-        return 1
-
-    # find a free port
-    if opts.port is None:
-        if (port := find_free_port()) is not None:
-            opts = dataclasses.replace(opts, port=port)
-        else:
-            log("fatal: giving up finding a free port in the 8100 - 8500 range")
-            return 1
-
-    debug(f"starting on port {opts.port}")
     _stop = Event()
+    scraper = _scraper(opts)
+    # browserless, chromium is only a fallback: not worth keeping mitmdump warm for
+    opts = dataclasses.replace(opts, extractor=Extractor.CDP) if opts.browserless else opts
 
     browse_queue: Queue[BrowseRequest] = mp.Queue()
     output_queue: JoinableQueue[StreamerMsg] = mp.JoinableQueue()
 
-    manager = Manager.start(browse_queue, output_queue, _stop)
+    if (daemon_sock := _attach(opts)) is not None:
+        debug("attaching to the daemon")
+        manager = _start_manager(opts, browse_queue, output_queue, _stop, scraper)
+        daemon_link = DaemonLink.start(manager, browse_queue, daemon_sock)
+        watchers = [daemon_link.proxy().watch()]
+    elif opts.extractor == Extractor.CDP:
+        debug("extracting subscriptions over CDP")
+        manager = _start_manager(opts, browse_queue, output_queue, _stop, scraper)
+        browser_watcher = BrowserWatcher.start(manager, opts, browse_queue)
+        watchers = [browser_watcher.proxy().watch(target=start_controller)]
+    else:
+        # find a free port
+        if opts.port is None:
+            if (port := find_free_port()) is not None:
+                opts = dataclasses.replace(opts, port=port)
+            else:
+                log("fatal: giving up finding a free port in the 8100 - 8500 range")
+                return 1
+
+        debug(f"starting on port {opts.port}")
+        manager = _start_manager(opts, browse_queue, output_queue, _stop, scraper)
+
+        # mitmdump, chromium and the GitHub login warm up while we look for the run;
+        # the browser buffers visit requests until the proxy is live anyway
+        browser_watcher = BrowserWatcher.start(manager, opts, browse_queue)
+        proxy_watcher = ProxyWatcher.start(manager, opts.port)
+        watchers = [
+            browser_watcher.proxy().watch(target=start_controller),
+            proxy_watcher.proxy().watch(),
+        ]
 
-    run_watcher = RunWatcher.start(manager, wf_run.unwrap())
-    browser_watcher = BrowserWatcher.start(manager, opts, browse_queue)
-    proxy_watcher = ProxyWatcher.start(manager, opts.port)
-    formatter = Formatter.start(manager, output_queue)
+    formatter = Formatter.start(manager, output_queue, opts.output_latency / 1000)
+    watchers.append(formatter.proxy().print_lines())
 
     try:
-        run_watcher.proxy().watch().join(
-            browser_watcher.proxy().watch(target=start_controller),
-            proxy_watcher.proxy().watch(),
-            formatter.proxy().print_lines(),
-        ).get()
+        client = Client(opts.api_url)
+        wf_runs = get_active_runs(repo_id, opts, client=client)
+        if not is_successful(wf_runs):
+            log(f"fatal: could not find an active run: {wf_runs.failure()}")
+            _teardown(manager, watchers)
+            return 1
+        if _stop.is_set():
+            # the browser or the proxy gave up while we were looking for the run
+            _teardown(manager, watchers)
+            return 1
+
+        run_watchers = _start_run_watchers(opts, manager, wf_runs.unwrap(), client, scraper)
+        watches = [run_watcher.proxy().watch() for run_watcher in run_watchers]
+        watches[0].join(*watches[1:], *watchers).get()
     except KeyboardInterrupt:
         _stop.set()
 
@@ -77,5 +206,12 @@ def _main(opts: Opts) -> int:
     return 0
 
 
+def _teardown(manager: ActorRef[t.Any], watchers: list[Future[t.Any]]) -> None:
+    """Stop the manager and wait for the already started watchers to wind down."""
+    manager.stop()
+    get_all(watchers)
+    ActorRegistry.stop_all()
+
+
 if __name__ == "__main__":
     sys.exit(_main())
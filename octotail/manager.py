@@ -1,13 +1,13 @@
 """I'm the Baahwss."""
 
 import dataclasses
-import multiprocessing as mp
-from multiprocessing.queues import JoinableQueue, Queue
+import typing as t
+from multiprocessing.queues import Queue
 from threading import Event
 
-from github.WorkflowJob import WorkflowJob
-from pykka import ThreadingActor
+from pykka import ActorRef, ThreadingActor
 
+from octotail.api import WorkflowJob
 from octotail.msg import (
     BrowseRequest,
     CloseRequest,
@@ -17,38 +17,61 @@ from octotail.msg import (
     ProxyLive,
     StreamerMsg,
     VisitRequest,
+    WatchRun,
     WorkflowDone,
     WsSub,
 )
-from octotail.streamer import run_streamer
+from octotail.streamer import StreamerWorker
 from octotail.utils import debug
 
-type MgrMessage = WorkflowJob | WsSub | JobDone | WorkflowDone | ProxyLive
+if t.TYPE_CHECKING:  # pragma: no cover
+    from octotail.scraper import Scraper
+
+type MgrMessage = (
+    WorkflowJob | WsSub | VisitRequest | JobDone | WorkflowDone | WatchRun | ProxyLive
+)
 
 
 class Manager(ThreadingActor):
     """I'm the Baahwss."""
 
     browse_queue: Queue[BrowseRequest]
-    output_queue: JoinableQueue[StreamerMsg]
+    output_queue: Queue[StreamerMsg]
     stop_event: Event
+    scraper: ActorRef["Scraper"] | None
 
-    streamers: dict[int, mp.Process]
+    scraping: set[int]
+    streamer: StreamerWorker
     job_map: dict[int, str]
+    runs: dict[int, str]
+    job_runs: dict[int, str]
+    streaming: set[int]
+    harvested: dict[int, WsSub]
+    concluded: set[int]
+    wakes: list[Event]
 
     def __init__(
         self,
         browse_queue: Queue[BrowseRequest],
-        output_queue: JoinableQueue[StreamerMsg],
+        streamer: StreamerWorker,
         stop: Event,
+        scraper: ActorRef["Scraper"] | None = None,
     ):
         super().__init__()
         self.browse_queue = browse_queue
-        self.output_queue = output_queue
+        self.output_queue = streamer.output_queue
         self.stop_event = stop
+        self.scraper = scraper
 
-        self.streamers = {}
+        self.scraping = set()
+        self.streamer = streamer
         self.job_map = {}
+        self.runs = {}
+        self.job_runs = {}
+        self.streaming = set()
+        self.harvested = {}
+        self.concluded = set()
+        self.wakes = []
 
     def on_receive(self, message: MgrMessage) -> None:
         debug(f"{message!r}")
@@ -57,39 +80,104 @@ class Manager(ThreadingActor):
             case ProxyLive() as proxy_live:
                 self.browse_queue.put_nowait(proxy_live)
 
+            case WatchRun(run_id, name):
+                self.runs[run_id] = name
+
             case WorkflowJob() as job:
-                self.browse_queue.put_nowait(VisitRequest(job.html_url, job.id))
-                self.job_map[job.id] = job.name
+                self._add_job(job)
+
+            case VisitRequest() as visit_req if visit_req.job_id not in self.concluded:
+                # the scraper couldn't make sense of the page
+                self.scraping.discard(visit_req.job_id)
+                self.browse_queue.put_nowait(visit_req)
 
             case WsSub() as ws_sub:
-                self.browse_queue.put_nowait(CloseRequest(ws_sub.job_id))
-                if ws_sub.job_id in self.job_map:
-                    ws_sub = dataclasses.replace(ws_sub, job_name=self.job_map[ws_sub.job_id])
-                self._replace_streamer(ws_sub.job_id, run_streamer(ws_sub, self.output_queue))
+                self._subscribe(ws_sub)
 
             case JobDone() as job:
-                self.output_queue.put(OutputItem(job.job_name, [f"##[conclusion]{job.conclusion}"]))
-                self._terminate_streamer(job.job_id)
+                job_name = self._job_name(job.job_id, job.job_name)
+                # the conclusion goes out after the job's last lines
+                conclusion = OutputItem(job_name, [f"##[conclusion]{job.conclusion}"])
+                self.streamer.cancel(job.job_id, conclusion)
+                self._drop(job.job_id)
 
             case WorkflowDone() as wf_done:
-                self.output_queue.put(
-                    OutputItem("workflow", [f"##[conclusion]{wf_done.conclusion}"])
-                )
-                self.stop()
+                self._conclude(wf_done)
+
+    def wake_on_stop(self, wake: Event) -> None:
+        """Have a sleeping run watcher notice right away that it's time to go."""
+        self.wakes.append(wake)
 
     def on_stop(self) -> None:
         self.stop_event.set()
+        for wake in self.wakes:
+            wake.set()
         self.browse_queue.put_nowait(ExitRequest())
         self.output_queue.put_nowait(None)
-        for streamer in self.streamers.values():
-            streamer.terminate()
+        self.streamer.stop()
+        if self.scraper is not None:
+            self.scraper.stop(block=False)
         debug("manager exiting")
 
-    def _terminate_streamer(self, job_id: int) -> None:
-        if job_id in self.streamers:
-            self.streamers[job_id].terminate()
-            del self.streamers[job_id]
-
-    def _replace_streamer(self, job_id: int, streamer: mp.Process) -> None:
-        self._terminate_streamer(job_id)
-        self.streamers[job_id] = streamer
+    def _add_job(self, job: WorkflowJob) -> None:
+        if job.run_id in self.runs:
+            self.job_runs[job.id] = self.runs[job.run_id]
+        self.job_map[job.id] = self._job_name(job.id, job.name)
+
+        if (ws_sub := self.harvested.pop(job.id, None)) is not None:
+            self._stream(ws_sub)
+        else:
+            self._visit(VisitRequest(job.html_url, job.id, job.started_at or ""))
+
+    def _subscribe(self, ws_sub: WsSub) -> None:
+        if ws_sub.job_id in self.concluded:
+            return
+        if ws_sub.job_id in self.scraping:
+            self.scraping.discard(ws_sub.job_id)
+        else:
+            self.browse_queue.put_nowait(CloseRequest(ws_sub.job_id))
+
+        if ws_sub.job_id not in self.job_map:
+            # taken off a page showing jobs the run watcher hasn't reported yet
+            self.harvested[ws_sub.job_id] = ws_sub
+        elif ws_sub.job_id not in self.streaming:
+            self._stream(ws_sub)
+
+    def _drop(self, job_id: int) -> None:
+        """Jobs may well conclude before their page comes up with a subscription: free its tab."""
+        if job_id in self.streaming or job_id in self.concluded:
+            return
+        self.concluded.add(job_id)
+        if job_id in self.scraping:
+            # whatever the scraper comes back with gets ignored
+            self.scraping.discard(job_id)
+        else:
+            self.browse_queue.put_nowait(CloseRequest(job_id))
+
+    def _conclude(self, wf_done: WorkflowDone) -> None:
+        if self.runs and wf_done.run_id not in self.runs:
+            # already reported done, by both a watcher and a webhook delivery say
+            return
+        name = self.runs.pop(wf_done.run_id, "workflow")
+        self.output_queue.put(OutputItem(name, [f"##[conclusion]{wf_done.conclusion}"]))
+        # with several runs tailed at once, the last one to conclude ends it all
+        if not self.runs:
+            self.stop()
+
+    def _stream(self, ws_sub: WsSub) -> None:
+        # pages showing several jobs keep subscribing to all of them, once is enough
+        self.streaming.add(ws_sub.job_id)
+        self.streamer.add(dataclasses.replace(ws_sub, job_name=self.job_map[ws_sub.job_id]))
+
+    def _job_name(self, job_id: int, name: str) -> str:
+        # jobs from different runs may well share names
+        if (run_name := self.job_runs.get(job_id)) is None:
+            return name
+        return f"{run_name} / {name}"
+
+    def _visit(self, visit_req: VisitRequest) -> None:
+        if self.scraper is None:
+            self.browse_queue.put_nowait(visit_req)
+            return
+        self.scraping.add(visit_req.job_id)
+        self.scraper.proxy().scrape(visit_req, self.actor_ref)
@@ -0,0 +1,60 @@
+"""Keeping an eye on how much memory the browser takes."""
+
+import os
+import statistics
+import typing as t
+from contextlib import suppress
+from pathlib import Path
+
+PROC = Path("/proc")
+MB = 1024 * 1024
+RSS_SAMPLE_INTERVAL = 2.0
+
+
+def tree_rss(pid: int, proc: Path = PROC) -> int:
+    """Resident memory, in bytes, of a process and all of its descendants (renderers & co.)."""
+    children: dict[int, list[int]] = {}
+    for stat in proc.glob("[0-9]*/stat"):
+        with suppress(OSError, ValueError, IndexError):
+            # the command name may contain spaces and parens of its own
+            ppid = int(stat.read_text().rpartition(")")[2].split()[1])
+            children.setdefault(ppid, []).append(int(stat.parent.name))
+
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total, todo = 0, [pid]
+    while todo:
+        current = todo.pop()
+        with suppress(OSError, ValueError, IndexError):
+            total += int((proc / str(current) / "statm").read_text().split()[1]) * page_size
+        todo.extend(children.get(current, []))
+    return total
+
+
+class RssWatchdog:
+    """Samples the browser's memory, tells when it's gone over budget and sums it all up."""
+
+    budget: int | None
+    samples: list[int]
+
+    def __init__(self, budget_mb: int | None = None):
+        self.budget = None if budget_mb is None else budget_mb * MB
+        self.samples = []
+
+    def sample(self, pid: int, sampler: t.Callable[[int], int] = tree_rss) -> int:
+        if rss := sampler(pid):
+            # nothing left to measure while the browser restarts
+            self.samples.append(rss)
+        return rss
+
+    def over_budget(self) -> bool:
+        return self.budget is not None and bool(self.samples) and self.samples[-1] > self.budget
+
+    def report(self) -> str | None:
+        if not self.samples:
+            return None
+        # leave out the warm-up
+        steady = statistics.median(self.samples[len(self.samples) // 2 :])
+        return (
+            f"browser memory: peak {max(self.samples) / MB:.0f}MB,"
+            f" steady {steady / MB:.0f}MB over {len(self.samples)} samples"
+        )
@@ -1,14 +1,12 @@
 """Mitmproxy actor."""
 
+import asyncio as aio
 import base64
-import copy
 import json
 import multiprocessing as mp
-import sys
 import typing as t
 from argparse import Namespace
 from contextlib import suppress
-from dataclasses import dataclass, field
 from multiprocessing.queues import Queue
 from pathlib import Path
 from queue import Empty
@@ -16,7 +14,7 @@ from threading import Event
 
 from pykka import ActorRef, ThreadingActor, traversable
 from returns.converters import result_to_maybe
-from returns.maybe import Maybe, Nothing, Some
+from returns.maybe import Maybe, Nothing
 from returns.pipeline import flow
 from returns.pointfree import map_
 from returns.result import ResultE, Success, safe
@@ -26,34 +24,34 @@ from octotail.manager import Manager
 from octotail.msg import ProxyLive, WsSub
 from octotail.utils import Retry, debug, is_port_open, retries
 
+if t.TYPE_CHECKING:  # pragma: no cover
+    from mitmproxy.http import HTTPFlow
+
 MITM_CONFIG_DIR = Path(xdg_data_home) / "octotail" / "mitmproxy"
 MARKERS = Namespace(
-    ws_header="WebSocket text message",
     ws_host="alive.github.com",
     ws_action='"subscribe":',
 )
 
 
-@dataclass
-class BufferState:
-    """Holds output buffer state."""
+class WsSubAddon:
+    """Mitmproxy addon: extracts websocket subscriptions right where the traffic flows."""
 
-    buffer: list[str] = field(default_factory=list)
-    old_buffer: list[str] = field(default_factory=list)
-    old_line: str = "-"
+    queue: Queue[WsSub]
 
-    def process_line(self, line: str) -> Maybe[WsSub]:
-        ret: Maybe[WsSub] = Maybe.from_optional(None)
-        if line:
-            self.buffer.append(line)
-        elif self.old_line == "" and self.buffer:
-            ret = _extract_ws_sub("".join(self.buffer), "".join(self.old_buffer))
-            self.old_buffer = copy.deepcopy(self.buffer)
-            self.buffer = []
-        else:
-            self.buffer.append(line)
-        self.old_line = line
-        return ret
+    def __init__(self, queue: Queue[WsSub]):
+        self.queue = queue
+
+    def websocket_message(self, http_flow: "HTTPFlow") -> None:
+        request, websocket = http_flow.request, http_flow.websocket
+        if websocket is None or request.host != MARKERS.ws_host:
+            return
+        message = websocket.messages[-1]
+        if not (message.from_client and message.is_text):
+            return
+        url = f"{request.host}:{request.port}{request.path}"
+        for ws_sub in extract_ws_subs(url, message.text):
+            self.queue.put(ws_sub)
 
 
 class ProxyWatcher(ThreadingActor):
@@ -63,9 +61,8 @@ class ProxyWatcher(ThreadingActor):
     port: int
     stop_event: Event
 
-    queue: Queue[str] = traversable(mp.Queue())
+    queue: Queue[WsSub] = traversable(mp.Queue())
 
-    _state: BufferState
     _proxy_ps: mp.Process
 
     def __init__(self, mgr: ActorRef[Manager] | None, port: int):
@@ -74,7 +71,6 @@ class ProxyWatcher(ThreadingActor):
             self.mgr = mgr
             self.stop_event = mgr.proxy().stop_event.get()
         self.port = port
-        self._state = BufferState()
 
     def on_start(self) -> None:
         MITM_CONFIG_DIR.mkdir(exist_ok=True, parents=True)
@@ -94,58 +90,81 @@ class ProxyWatcher(ThreadingActor):
 
         while not self.stop_event.is_set():
             with suppress(Empty):
-                line = self.queue.get(timeout=0.25).strip()
-                self._state.process_line(line).apply(Some(self.mgr.tell))
+                self.mgr.tell(self.queue.get(timeout=0.25))
         debug("exiting")
 
 
-def _extract_ws_sub(buffer: str, old_buffer: str) -> Maybe[WsSub]:
-    if not (
-        MARKERS.ws_header in old_buffer
-        and MARKERS.ws_host in old_buffer
-        and MARKERS.ws_action in buffer
-    ):
+def extract_ws_sub(url: str, message: str) -> Maybe[WsSub]:
+    if MARKERS.ws_action not in message:
         return Nothing
 
     return flow(
-        _extract_job_id(buffer),
-        map_(
-            lambda job_id: WsSub(
-                url=old_buffer[old_buffer.index(MARKERS.ws_host) :],
-                subs=buffer,
-                job_id=t.cast(int, job_id),
-            )
-        ),
+        _extract_job_id(message),
+        map_(lambda job_id: WsSub(url=url, subs=message, job_id=t.cast(int, job_id))),
         result_to_maybe,
     )
 
 
+def extract_ws_subs(url: str, message: str) -> list[WsSub]:
+    """Fan a subscription out into one per job whose check run channel it covers.
+
+    Pages showing several jobs (run pages, mostly) subscribe to all of them at once.
+    Each job gets its own channel, along with whatever wasn't about a check run.
+    """
+    if MARKERS.ws_action not in message:
+        return []
+    with suppress(ValueError, LookupError, TypeError):
+        subscribe: dict[str, t.Any] = json.loads(message)["subscribe"]
+        channels = dict(_check_run_channels(subscribe))
+        if len(channels) == 1:
+            return [WsSub(url=url, subs=message, job_id=next(iter(channels)))]
+        shared = {k: v for k, v in subscribe.items() if k not in channels.values()}
+        return [
+            WsSub(url=url, subs=_subscription({**shared, key: subscribe[key]}), job_id=job_id)
+            for job_id, key in channels.items()
+        ]
+    return []
+
+
+def channel_name(key: str) -> str:
+    """Decode the channel name out of a signed `<base64 json>--<signature>` channel key."""
+    payload = base64.b64decode(key.partition("--")[0] + "==")
+    return str(json.loads(payload[: payload.index(b"}") + 1].decode())["c"])
+
+
 @safe
 def _extract_job_id(buffer: str) -> int:
-    dec = (base64.b64decode(k) for k in json.loads(buffer)["subscribe"])
-    items = (str(json.loads(d[: d.index(b"}") + 1].decode())["c"]) for d in dec)
+    items = (channel_name(k) for k in json.loads(buffer)["subscribe"])
     good = next(item for item in items if item.startswith("check_runs"))
     return int(good.split(":")[1])
 
 
-def run_mitmdump(queue: Queue[str], port: int) -> mp.Process:  # pragma: no cover
-    def _inner(_queue: Queue[str], _port: int) -> None:
-        from mitmproxy.tools.main import mitmdump
+def _check_run_channels(subscribe: dict[str, t.Any]) -> t.Iterator[tuple[int, str]]:
+    for key in subscribe:
+        with suppress(ValueError, LookupError, TypeError):
+            if (name := channel_name(key)).startswith("check_runs"):
+                yield int(name.split(":")[1]), key
 
-        sys.argv = [
-            "mitmdump",
-            "--flow-detail=4",
-            "--no-rawtcp",
-            "-p",
-            str(_port),
-            "--set",
-            f"confdir={MITM_CONFIG_DIR}",
-        ]
-        # hijack .isatty and always return False to disable colors & shenanigans
-        setattr(sys.stdout, "isatty", lambda: False)
-        # hijack .write so lines go to our queue instead
-        setattr(sys.stdout, "write", _queue.put)
-        mitmdump()
+
+def _subscription(channels: dict[str, t.Any]) -> str:
+    return json.dumps({"subscribe": channels}, separators=(",", ":"))
+
+
+def run_mitmdump(queue: Queue[WsSub], port: int) -> mp.Process:  # pragma: no cover
+    def _inner(_queue: Queue[WsSub], _port: int) -> None:
+        from mitmproxy.options import Options
+        from mitmproxy.tools.dump import DumpMaster
+
+        async def _run() -> None:
+            master = DumpMaster(
+                Options(listen_port=_port, confdir=str(MITM_CONFIG_DIR), rawtcp=False),
+                with_termlog=False,
+                with_dumper=False,
+            )
+            master.addons.add(WsSubAddon(_queue))  # type: ignore[no-untyped-call]
+            await master.run()
+
+        aio.run(_run())
 
     return mp.Process(target=_inner, args=(queue, port))
 
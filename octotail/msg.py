@@ -21,6 +21,8 @@ class VisitRequest(t.NamedTuple):
 
     url: str
     job_id: int
+    # ISO 8601, so it sorts chronologically
+    started_at: str = ""
 
 
 class CloseRequest(t.NamedTuple):
@@ -60,10 +62,31 @@ class WsSub:
     job_name: str | None = None
 
 
+class CancelStream(t.NamedTuple):
+    """Sent to the streamer worker to stop tailing a job.
+
+    `then` gets printed once whatever the job's stream had buffered is out.
+    """
+
+    job_id: int
+    then: OutputItem | None = None
+
+
+type StreamerCmd = WsSub | CancelStream | None
+
+
 class WorkflowDone(t.NamedTuple):
     """Sent by gh.RunWatcher to indicate a workflow concluded."""
 
     conclusion: str
+    run_id: int = 0
+
+
+class WatchRun(t.NamedTuple):
+    """Sent to the manager for each of the runs tailed at once, before watching them."""
+
+    run_id: int
+    name: str
 
 
 class JobDone(t.NamedTuple):
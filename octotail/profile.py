@@ -0,0 +1,73 @@
+"""Persistent chromium profile, so cookies and the HTTP cache outlive a single run."""
+
+import os
+import shutil
+import typing as t
+from contextlib import suppress
+from pathlib import Path
+
+from xdg.BaseDirectory import get_runtime_dir, xdg_cache_home
+
+from octotail.utils import debug
+
+PROFILE_DIR = Path(xdg_cache_home) / "octotail" / "chromium"
+# usually a tmpfs, cleared on logout
+TMPFS_PROFILE_DIR = Path(get_runtime_dir(strict=False)) / "octotail" / "chromium"
+CACHE_MB = 256
+
+# what gets cleared once the profile outgrows its budget; cookies & co. stay put
+CACHE_DIRS = [
+    "Default/Cache",
+    "Default/Code Cache",
+    "Default/GPUCache",
+    "Default/Service Worker/CacheStorage",
+    "GrShaderCache",
+    "ShaderCache",
+]
+LOCK_FILE = "SingletonLock"
+
+
+class Profile(t.NamedTuple):
+    """A chromium user data dir, with its disk cache capped at `cache_bytes`.
+
+    Once the whole profile grows past twice the cap, its caches get cleared before launching.
+    """
+
+    path: Path = PROFILE_DIR
+    cache_bytes: int = CACHE_MB * 1024 * 1024
+
+    def prepare(self) -> Path | None:
+        """Returns the directory to launch chromium with, or None to use a throwaway one."""
+        if _is_locked(self.path):
+            debug(f"profile {self.path} is in use, falling back to a fresh one")
+            return None
+        self.path.mkdir(parents=True, exist_ok=True)
+        if (size := _du(self.path)) > 2 * self.cache_bytes:
+            debug(f"profile grew to {size / 1024 / 1024:.0f}MB, clearing its caches")
+            for cache_dir in CACHE_DIRS:
+                shutil.rmtree(self.path / cache_dir, ignore_errors=True)
+        return self.path
+
+    def chrome_args(self) -> list[str]:
+        return [f"--disk-cache-size={self.cache_bytes}"]
+
+
+def _du(path: Path) -> int:
+    total = 0
+    for entry in path.rglob("*"):
+        with suppress(OSError):
+            if entry.is_file() and not entry.is_symlink():
+                total += entry.stat().st_size
+    return total
+
+
+def _is_locked(path: Path) -> bool:
+    """Whether a live chromium holds the profile: its lock links to `<hostname>-<pid>`."""
+    try:
+        pid = int(str((path / LOCK_FILE).readlink()).rpartition("-")[2])
+        os.kill(pid, 0)
+    except PermissionError:
+        return True
+    except (OSError, ValueError):
+        return False
+    return True
@@ -0,0 +1,195 @@
+"""Browserless extraction of websocket subscriptions from job and run pages."""
+
+import asyncio as aio
+import json
+import threading
+import typing as t
+from concurrent.futures import Future
+from html.parser import HTMLParser
+
+import httpx
+import websockets.client
+from pykka import ActorRef, ThreadingActor
+from returns.maybe import Maybe, Nothing, Some
+from websockets.exceptions import ConnectionClosed
+
+from octotail.mitm import channel_name, extract_ws_sub
+from octotail.msg import VisitRequest, WsSub
+from octotail.streamer import WS_HEADERS
+from octotail.utils import RANDOM_UA, debug
+
+type Cookies = list[dict[str, t.Any]]
+
+FETCH_TIMEOUT = 10.0
+# channels announcing a run's jobs getting created, started and completed
+RUN_CHANNELS = ("check_suites:", "workflow_runs:")
+# with live pushes waking the run watcher, polling only confirms
+CONFIRM_MIN_INTERVAL = 5.0
+CONFIRM_MAX_INTERVAL = 30.0
+
+
+class LiveSub(t.NamedTuple):
+    """A page's live update channels, and the websocket they're served on."""
+
+    url: str
+    subs: str
+
+
+class Scraper(ThreadingActor):
+    """Fetches job pages with the saved session cookies, no chromium involved.
+
+    Replies with the extracted `WsSub`, or with the `VisitRequest` itself if the page didn't
+    give one up (stale cookies, markup changes), so it can be routed to the browser instead.
+    """
+
+    cookies: Cookies
+    transport: httpx.AsyncBaseTransport | None
+
+    _loop: aio.AbstractEventLoop
+    _client: httpx.AsyncClient
+    _watches: list[Future[None]]
+
+    def __init__(self, cookies: Cookies, transport: httpx.AsyncBaseTransport | None = None):
+        super().__init__()
+        self.cookies = cookies
+        self.transport = transport
+
+    def on_start(self) -> None:
+        self._loop = aio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        self._client = httpx.AsyncClient(
+            http2=True,
+            cookies=_jar(self.cookies),
+            headers={"User-Agent": RANDOM_UA},
+            follow_redirects=True,
+            timeout=FETCH_TIMEOUT,
+            transport=self.transport,
+        )
+        self._watches = []
+
+    def on_stop(self) -> None:
+        for watch in self._watches:
+            watch.cancel()
+        aio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        debug("scraper exiting")
+
+    def scrape(self, visit_req: VisitRequest, reply_to: ActorRef[t.Any]) -> None:
+        aio.run_coroutine_threadsafe(self._scrape(visit_req, reply_to), self._loop)
+
+    def watch_run(self, run_url: str, wake: threading.Event, live: threading.Event) -> None:
+        """Set `wake` whenever the run page gets a live update, until stopped.
+
+        `live` stays set for as long as the subscription to the run's channels holds.
+        """
+        self._watches.append(
+            aio.run_coroutine_threadsafe(watch_run(self._client, run_url, wake, live), self._loop)
+        )
+
+    async def _scrape(self, visit_req: VisitRequest, reply_to: ActorRef[t.Any]) -> None:
+        ws_sub = await fetch_ws_sub(self._client, visit_req)
+        if ws_sub == Nothing:
+            debug(f"falling back to the browser for job {visit_req.job_id}")
+        if reply_to.is_alive():
+            reply_to.tell(ws_sub.value_or(visit_req))
+
+
+async def fetch_ws_sub(client: httpx.AsyncClient, visit_req: VisitRequest) -> Maybe[WsSub]:
+    try:
+        response = await client.get(visit_req.url)
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        debug(f"failed to fetch {visit_req.url}: {e!r}")
+        return Nothing
+    return parse_job_page(response.text, visit_req.job_id)
+
+
+async def watch_run(
+    client: httpx.AsyncClient, run_url: str, wake: threading.Event, live: threading.Event
+) -> None:
+    try:
+        response = await client.get(run_url)
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        debug(f"failed to fetch {run_url}: {e!r}")
+        return
+    if (live_sub := parse_run_page(response.text).value_or(None)) is None:
+        debug(f"no live channels on {run_url}, sticking to polling")
+        return
+
+    async for websocket in websockets.client.connect(live_sub.url, extra_headers=WS_HEADERS):
+        try:
+            await websocket.send(live_sub.subs)
+            async for message in websocket:
+                # any answer means the subscription went through
+                live.set()
+                if _is_push(message):
+                    wake.set()
+        except ConnectionClosed as e:
+            live.clear()
+            debug(f"run channels disconnected: {e!r}")
+
+
+def _is_push(message: str | bytes) -> bool:
+    """Channel pushes carry data, subscription acks and pings don't."""
+    try:
+        payload = json.loads(message)
+    except ValueError:
+        return False
+    return isinstance(payload, dict) and "data" in payload and payload.get("e", "msg") == "msg"
+
+
+def parse_job_page(html: str, job_id: int) -> Maybe[WsSub]:
+    """Build the subscription the page would send over its shared websocket."""
+    return (
+        _parse_page(html, ("check_runs:",))
+        .bind(lambda live_sub: extract_ws_sub(live_sub.url.removeprefix("wss://"), live_sub.subs))
+        .bind(lambda ws_sub: Some(ws_sub) if ws_sub.job_id == job_id else Nothing)
+    )
+
+
+def parse_run_page(html: str) -> Maybe[LiveSub]:
+    """Build the subscription to the run's job announcements."""
+    return _parse_page(html, RUN_CHANNELS)
+
+
+def _parse_page(html: str, prefixes: tuple[str, ...]) -> Maybe[LiveSub]:
+    parser = _LivePageParser()
+    parser.feed(html)
+    parser.close()
+
+    channels = {c: "" for c in parser.channels if _has_prefix(c, prefixes)}
+    if parser.ws_url is None or not channels:
+        return Nothing
+    return Some(LiveSub(parser.ws_url, json.dumps({"subscribe": channels}, separators=(",", ":"))))
+
+
+class _LivePageParser(HTMLParser):
+    ws_url: str | None
+    channels: list[str]
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.ws_url = None
+        self.channels = []
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        _attrs = dict(attrs)
+        if tag == "link" and _attrs.get("rel") == "shared-web-socket":
+            self.ws_url = _attrs.get("href")
+        if (channel := _attrs.get("data-channel")) and channel not in self.channels:
+            self.channels.append(channel)
+
+
+def _has_prefix(channel: str, prefixes: tuple[str, ...]) -> bool:
+    try:
+        return channel_name(channel).startswith(prefixes)
+    except (ValueError, LookupError, TypeError):
+        return False
+
+
+def _jar(cookies: Cookies) -> httpx.Cookies:
+    jar = httpx.Cookies()
+    for cookie in cookies:
+        jar.set(cookie["name"], cookie["value"], cookie["domain"], cookie.get("path", "/"))
+    return jar
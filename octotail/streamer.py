@@ -9,8 +9,8 @@ import websockets.client
 from returns.result import Success, safe
 from websockets.exceptions import ConnectionClosedError
 
-from octotail.msg import OutputItem, StreamerMsg, WebsocketClosed, WsSub
-from octotail.utils import RANDOM_UA, log
+from octotail.msg import CancelStream, OutputItem, StreamerCmd, StreamerMsg, WebsocketClosed, WsSub
+from octotail.utils import RANDOM_UA, log, queue_get
 
 WS_HEADERS = {
     "User-Agent": RANDOM_UA,
@@ -21,37 +21,140 @@ WS_HEADERS = {
     "Pragma": "no-cache",
     "Cache-Control": "no-cache",
 }
+BATCH_WINDOW = 0.005
+BATCH_MAX_LINES = 256
 
 
-def run_streamer(ws_sub: WsSub, queue: Queue[StreamerMsg]) -> mp.Process:  # pragma: no cover
-    process = mp.Process(target=_streamer, args=(ws_sub, queue))
-    process.start()
-    return process
+class StreamerWorker:
+    """One process tailing every job's websocket as a task on a shared event loop."""
 
+    output_queue: Queue[StreamerMsg]
+    batch_window: float
+    commands: Queue[StreamerCmd]
 
-def _streamer(ws_sub: WsSub, queue: Queue[StreamerMsg]) -> None:
+    _process: mp.Process | None
+
+    def __init__(self, output_queue: Queue[StreamerMsg], batch_window: float = BATCH_WINDOW):
+        self.output_queue = output_queue
+        self.batch_window = batch_window
+        self.commands = mp.Queue()
+        self._process = None
+
+    def add(self, ws_sub: WsSub) -> None:
+        """Start tailing a job, replacing its previous websocket if there is one."""
+        if self._process is None:
+            self._process = mp.Process(
+                target=_worker, args=(self.commands, self.output_queue, self.batch_window)
+            )
+            self._process.start()
+        self.commands.put(ws_sub)
+
+    def cancel(self, job_id: int, then: OutputItem | None = None) -> None:
+        """Stop tailing a job, printing `then` after its last lines."""
+        if self._process is not None:
+            self.commands.put(CancelStream(job_id, then))
+        elif then is not None:
+            # nothing streamed, nothing to wait for
+            self.output_queue.put(then)
+
+    def stop(self) -> None:
+        if self._process is None:
+            return
+        self.commands.put(None)
+        self._process.join(timeout=1)
+        if self._process.is_alive():  # pragma: no cover
+            self._process.terminate()
+
+
+def _worker(commands: Queue[StreamerCmd], queue: Queue[StreamerMsg], batch_window: float) -> None:
     loop = aio.new_event_loop()
     aio.set_event_loop(loop)
     try:
-        loop.run_until_complete(_stream_it(ws_sub, queue))
+        loop.run_until_complete(_serve(commands, queue, batch_window))
     except KeyboardInterrupt:  # pragma: no cover
         loop.close()
 
 
-async def _stream_it(ws_sub: WsSub, queue: Queue[StreamerMsg]) -> None:
+async def _serve(
+    commands: Queue[StreamerCmd], queue: Queue[StreamerMsg], batch_window: float
+) -> None:
+    tasks: dict[int, aio.Task[None]] = {}
+
+    async def _cancel(job_id: int) -> None:
+        if (task := tasks.pop(job_id, None)) is not None:
+            task.cancel()
+            # lets the stream flush its batch
+            await aio.gather(task, return_exceptions=True)
+
+    while True:
+        match await queue_get(commands):
+            case WsSub() as ws_sub:
+                await _cancel(ws_sub.job_id)
+                tasks[ws_sub.job_id] = aio.create_task(_stream_it(ws_sub, queue, batch_window))
+            case CancelStream(job_id, then):
+                await _cancel(job_id)
+                if then is not None:
+                    queue.put(then)
+            case None:
+                break
+
+    for task in tasks.values():
+        task.cancel()
+    await aio.gather(*tasks.values(), return_exceptions=True)
+
+
+async def _stream_it(ws_sub: WsSub, queue: Queue[StreamerMsg], batch_window: float) -> None:
     ws_url = "wss://" + ws_sub.url.removeprefix("https://")
-    job_name = ws_sub.job_name or "unknown"
-
-    async for websocket in websockets.client.connect(ws_url, extra_headers=WS_HEADERS):
-        try:
-            await websocket.send(ws_sub.subs)
-            async for msg in websocket:
-                _extract_lines(msg).apply(
-                    Success(lambda _lines: queue.put(OutputItem(job_name, _lines)))
-                )
-        except ConnectionClosedError as e:
-            log(f"fatal error during websockets connection: {e}")
-            queue.put(WebsocketClosed())
+    batch = _Batch(ws_sub.job_name or "unknown", queue, batch_window)
+
+    try:
+        async for websocket in websockets.client.connect(ws_url, extra_headers=WS_HEADERS):
+            try:
+                await websocket.send(ws_sub.subs)
+                async for msg in websocket:
+                    _extract_lines(msg).apply(Success(batch.add))
+            except ConnectionClosedError as e:
+                batch.flush()
+                log(f"fatal error during websockets connection: {e}")
+                queue.put(WebsocketClosed())
+    finally:
+        batch.flush()
+
+
+class _Batch:
+    """Coalesces a job's lines so they cross the output queue as fewer, bigger items.
+
+    Flushes once `BATCH_MAX_LINES` are pending or `window` seconds after the first of them.
+    """
+
+    job_name: str
+    queue: Queue[StreamerMsg]
+    window: float
+    lines: list[str]
+
+    _timer: aio.TimerHandle | None
+
+    def __init__(self, job_name: str, queue: Queue[StreamerMsg], window: float):
+        self.job_name = job_name
+        self.queue = queue
+        self.window = window
+        self.lines = []
+        self._timer = None
+
+    def add(self, lines: list[str]) -> None:
+        self.lines.extend(lines)
+        if self.window <= 0 or len(self.lines) >= BATCH_MAX_LINES:
+            self.flush()
+        elif self._timer is None:
+            self._timer = aio.get_running_loop().call_later(self.window, self.flush)
+
+    def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self.lines:
+            self.queue.put(OutputItem(self.job_name, self.lines))
+            self.lines = []
 
 
 @safe
@@ -1,12 +1,15 @@
 """Bits and pieces."""
 
+import asyncio as aio
 import inspect
+import itertools
 import os
 import random
 import socket
 import sys
 import time
 import typing as t
+from multiprocessing.queues import Queue
 from pathlib import Path
 
 from fake_useragent import UserAgent
@@ -18,8 +21,6 @@ RANDOM_UA: str = UserAgent().random
 DEBUG = os.getenv("DEBUG") not in ["0", "false", "False", None]
 FIND_FREE_PORT_TRIES = 100
 
-A = t.TypeVar("A")
-B = t.TypeVar("B")
 T = t.TypeVar("T")
 
 
@@ -30,11 +31,6 @@ class Retry:
         return isinstance(other, Retry)
 
 
-def flatmap(f: t.Callable[[A], t.Iterable[B]], xs: t.Iterable[A]) -> t.Iterable[B]:
-    """Map f over an iterable and flatten the result set."""
-    return (y for x in xs for y in f(x))
-
-
 def log(
     msg: str, *, stack_offset: int = 1, file: t.Any = sys.stdout, skip_prefix: bool = False
 ) -> None:
@@ -64,31 +60,76 @@ def perform_io[**P, R](fn: t.Callable[P, IOResultE[R]]) -> t.Callable[P, ResultE
     return inner
 
 
+class Backoff(t.NamedTuple):
+    """Retry delays: `fast_tries` quick ones first, then exponentially growing, jittered ones."""
+
+    delay: float
+    factor: float = 2.0
+    max_delay: float = 10.0
+    jitter: float = 0.2
+    fast_tries: int = 0
+    fast_delay: float = 0.0
+
+    def delays(self) -> t.Iterator[float]:
+        yield from itertools.repeat(self.fast_delay, self.fast_tries)
+        for step in itertools.count():
+            delay = min(self.delay * self.factor**step, self.max_delay)
+            yield delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
 def retries[
     **P, R
-](num_retries: int, retry_delay: float) -> t.Callable[
-    [t.Callable[P, ResultE[R] | Retry]], t.Callable[P, ResultE[R]]
-]:
-    """ "just put a retry loop around it" """
+](
+    num_retries: int | None,
+    retry_delay: float | Backoff,
+    *,
+    deadline: float | None = None,
+    clock: t.Callable[[], float] = time.monotonic,
+    sleep: t.Callable[[float], None] = time.sleep,
+) -> t.Callable[[t.Callable[P, ResultE[R] | Retry]], t.Callable[P, ResultE[R]]]:
+    """ "just put a retry loop around it"
+
+    Gives up after `num_retries` tries (if not None) or once `deadline` seconds have passed
+    (if not None), whichever comes first.
+    """
 
     def wrapper(fn: t.Callable[P, ResultE[R] | Retry]) -> t.Callable[P, ResultE[R]]:
         def wrapped(*args: P.args, **kwargs: P.kwargs) -> ResultE[R]:
-            for _ in range(num_retries):
+            start = clock()
+            delays = (
+                retry_delay.delays()
+                if isinstance(retry_delay, Backoff)
+                else itertools.repeat(retry_delay)
+            )
+            for _ in itertools.count() if num_retries is None else range(num_retries):
                 match fn(*args, **kwargs):
                     case Success() as s:
                         return s
                     case Failure() as f:
                         return f
                     case _ as obj if obj == Retry():
-                        time.sleep(retry_delay)
+                        delay = next(delays)
+                        if deadline is not None:
+                            if (left := start + deadline - clock()) <= 0:
+                                break
+                            delay = min(delay, left)
+                        sleep(delay)
                         continue
-            return Failure(RuntimeError(f"retries exceeded in '{fn.__name__}'"))
+            elapsed = clock() - start
+            return Failure(
+                RuntimeError(f"retries exceeded in '{fn.__name__}' after {elapsed:.1f}s")
+            )
 
         return wrapped
 
     return wrapper
 
 
+async def queue_get(queue: Queue[T]) -> T:
+    """Wait for the next item of a multiprocessing queue without polling the event loop."""
+    return await aio.get_running_loop().run_in_executor(None, queue.get)
+
+
 def find_free_port(min_port: int = 8100, max_port: int = 8500) -> int | None:
     num_tries = 0
     random_port = random.randint(min_port, max_port)
@@ -105,11 +146,3 @@ def is_port_open(port: int) -> bool:
     res = sock.connect_ex(("127.0.0.1", port))
     sock.close()
     return res != 0
-
-
-def remove_consecutive_falsy(items: t.Iterable[T]) -> t.Generator[T, None, None]:
-    yielded_empty = False
-    for item in items:
-        if item or not yielded_empty:
-            yield item
-        yielded_empty = not item
@@ -0,0 +1,139 @@
+"""Webhook-driven job discovery."""
+
+import hashlib
+import hmac
+import json
+import typing as t
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Thread
+
+from pykka import ActorRef, ThreadingActor
+
+from octotail.api import WorkflowJob
+from octotail.cli import Opts
+from octotail.gh import JobState, RunWatcher
+from octotail.manager import Manager
+from octotail.utils import debug
+
+WEBHOOK_HOST = "127.0.0.1"
+# with deliveries pushing job changes, polling is just a safety net
+SAFETY_NET_INTERVAL = 30.0
+
+
+class WebhookListener(ThreadingActor):
+    """Turns `workflow_job` / `workflow_run` webhook deliveries into manager messages.
+
+    Deliveries are expected to be forwarded by a relay to a local port. Jobs go through
+    their run watcher's `JobState`, so whichever of the two sees a change first reports it.
+    Deliveries come in no particular order, so a completed run only wakes its run watcher
+    up to confirm through the API, once its jobs are all in.
+    """
+
+    mgr: ActorRef[Manager]
+    port: int
+    secret: str | None
+
+    states: dict[int, JobState]
+    wakes: dict[int, Event]
+
+    _server: ThreadingHTTPServer
+
+    def __init__(
+        self, mgr: ActorRef[Manager], run_watchers: list[ActorRef[RunWatcher]], opts: Opts
+    ):
+        super().__init__()
+        self.mgr = mgr
+        self.port = opts.webhook_port or 0
+        self.secret = opts.webhook_secret
+
+        watchers = [run_watcher.proxy() for run_watcher in run_watchers]
+        self.states = {watcher.wf_run.get().id: watcher.state.get() for watcher in watchers}
+        self.wakes = {watcher.wf_run.get().id: watcher.wake.get() for watcher in watchers}
+
+    def on_start(self) -> None:
+        self._server = _Server((WEBHOOK_HOST, self.port), self.deliver, self.secret)
+        self.port = self._server.server_address[1]
+        Thread(target=self._server.serve_forever, daemon=True).start()
+        debug(f"listening for webhook deliveries on {WEBHOOK_HOST}:{self.port}")
+
+    def on_stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        debug("exiting")
+
+    def deliver(self, event: str, payload: dict[str, t.Any]) -> None:
+        """Raises `ValueError` on a job that doesn't parse, before anything gets reported."""
+        debug(f"{event}: {payload.get('action')}")
+        match event, payload:
+            case "workflow_job", {"workflow_job": {"run_id": int(run_id)} as job} if (
+                state := self.states.get(run_id)
+            ) is not None:
+                try:
+                    wf_job = WorkflowJob.from_json(job)
+                except KeyError as e:
+                    raise ValueError(f"workflow_job is missing {e}") from e
+                with state.lock:
+                    for change in state.diff([wf_job]):
+                        self._tell(change)
+            case "workflow_run", {"workflow_run": {"id": int(run_id), "conclusion": str()}} if (
+                wake := self.wakes.get(run_id)
+            ) is not None:
+                wake.set()
+
+    def _tell(self, what: t.Any) -> None:
+        if self.mgr.is_alive():
+            self.mgr.tell(what)
+
+
+class _Server(ThreadingHTTPServer):
+    deliver: t.Callable[[str, dict[str, t.Any]], None]
+    secret: str | None
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        deliver: t.Callable[[str, dict[str, t.Any]], None],
+        secret: str | None,
+    ):
+        super().__init__(address, _Handler)
+        self.deliver = deliver
+        self.secret = secret
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: _Server
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not _verify(self.server.secret, body, self.headers.get("X-Hub-Signature-256", "")):
+            self.send_response(HTTPStatus.UNAUTHORIZED)
+            self.end_headers()
+            return
+        event = self.headers.get("X-GitHub-Event", "")
+        try:
+            self.server.deliver(event, _parse(body))
+        except (TypeError, ValueError) as e:
+            debug(f"bad {event} delivery: {e}")
+            self.send_response(HTTPStatus.BAD_REQUEST)
+            self.end_headers()
+            return
+        self.send_response(HTTPStatus.NO_CONTENT)
+        self.end_headers()
+
+    def log_message(self, *args: t.Any) -> None:
+        debug(args[0] % args[1:])
+
+
+def _parse(body: bytes) -> dict[str, t.Any]:
+    payload = json.loads(body)
+    if not isinstance(payload, dict):
+        raise TypeError(f"expected an object, got {type(payload).__name__}")
+    return payload
+
+
+def _verify(secret: str | None, body: bytes, signature: str) -> bool:
+    if secret is None:
+        return True
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(f"sha256={expected}", signature)
@@ -17,7 +17,7 @@ from rich.prompt import InvalidResponse, Prompt
 from typer import Option, Typer
 from xdg.BaseDirectory import xdg_data_home
 
-from octotail.cli import NO_FRILLS, NO_RICH, version_callback
+from octotail.cli import NO_FRILLS, NO_RICH, Extractor, LaunchProfile, version_callback
 from octotail.git import check_git, get_remotes, get_repo_dir
 from octotail.utils import debug, find_free_port, perform_io
 
@@ -91,6 +91,118 @@ def generate_cert() -> None:
     mitm.stop()
 
 
+@app.command()
+def daemon(  # noqa: PLR0913 # pylint: disable=too-many-arguments,too-many-positional-arguments
+    gh_user: t.Annotated[
+        str, Option(envvar="OCTOTAIL_GH_USER", help="GitHub username.", show_default=False)
+    ],
+    gh_pass: t.Annotated[
+        str, Option(envvar="OCTOTAIL_GH_PASS", help="GitHub password.", show_default=False)
+    ],
+    gh_otp: t.Annotated[
+        str | None, Option(envvar="OCTOTAIL_GH_OTP", help="GitHub OTP, if 2FA is on.")
+    ] = None,
+    headless: t.Annotated[
+        bool, Option(envvar="OCTOTAIL_HEADLESS", help="Run browser in headless mode.")
+    ] = True,
+    port: t.Annotated[
+        int | None, Option(envvar="OCTOTAIL_PROXY_PORT", help="Port the proxy will listen on.")
+    ] = None,
+    extractor: t.Annotated[
+        Extractor,
+        Option(envvar="OCTOTAIL_EXTRACTOR", help="Where to extract websocket subscriptions from."),
+    ] = Extractor.PROXY,
+    launch_profile: t.Annotated[
+        LaunchProfile,
+        Option(envvar="OCTOTAIL_LAUNCH_PROFILE", help="Which flags to launch chromium with."),
+    ] = LaunchProfile.DEFAULT,
+    rss_budget_mb: t.Annotated[
+        int | None,
+        Option(
+            envvar="OCTOTAIL_RSS_BUDGET_MB",
+            help="Restart the browser between job visits once it uses more than this, in MB.",
+            min=1,
+        ),
+    ] = None,
+    max_tabs: t.Annotated[
+        int,
+        Option(envvar="OCTOTAIL_MAX_TABS", help="How many job pages to load at once.", min=1),
+    ] = 4,
+    run_pages: t.Annotated[
+        bool,
+        Option(
+            "--run-page/--no-run-page",
+            envvar="OCTOTAIL_RUN_PAGE",
+            help="Take subscriptions off run pages, visiting job pages only as a fallback.",
+        ),
+    ] = False,
+    block_resources: t.Annotated[
+        bool,
+        Option(envvar="OCTOTAIL_BLOCK_RESOURCES", help="Block heavy subresources on job pages."),
+    ] = True,
+    allow_hosts: t.Annotated[
+        list[str] | None,
+        Option(
+            "--allow-host",
+            envvar="OCTOTAIL_ALLOW_HOSTS",
+            help="Let job pages load resources from this host too.",
+            show_default=False,
+        ),
+    ] = None,
+    profile_dir: t.Annotated[
+        Path | None,
+        Option(
+            envvar="OCTOTAIL_PROFILE_DIR",
+            help="Chromium profile to keep the session and the HTTP cache in.",
+            show_default="$XDG_CACHE_HOME/octotail/chromium",
+        ),
+    ] = None,
+    profile_on_tmpfs: t.Annotated[
+        bool,
+        Option(
+            envvar="OCTOTAIL_PROFILE_ON_TMPFS",
+            help="Keep the default chromium profile under $XDG_RUNTIME_DIR instead.",
+        ),
+    ] = False,
+    profile_cache_mb: t.Annotated[
+        int,
+        Option(
+            envvar="OCTOTAIL_PROFILE_CACHE_MB", help="Cap on chromium's disk cache, in MB.", min=1
+        ),
+    ] = 256,
+) -> None:
+    """Keep a browser and a proxy warm so that octotail invocations can attach to them."""
+    from octotail.browser import start_controller
+    from octotail.cli import Opts
+    from octotail.daemon import serve
+
+    if port is None and (port := find_free_port()) is None:
+        rprint("fatal: giving up finding a free port in the 8100 - 8500 range")
+        sys.exit(1)
+
+    # the daemon never looks up runs itself, clients do
+    opts = Opts(
+        commit_sha="",
+        gh_pat="",
+        gh_user=gh_user,
+        gh_pass=gh_pass,
+        gh_otp=gh_otp,
+        headless=headless,
+        port=port,
+        extractor=extractor,
+        launch_profile=launch_profile,
+        rss_budget_mb=rss_budget_mb,
+        max_tabs=max_tabs,
+        run_pages=run_pages,
+        block_resources=block_resources,
+        allow_hosts=allow_hosts,
+        profile_dir=profile_dir,
+        profile_on_tmpfs=profile_on_tmpfs,
+        profile_cache_mb=profile_cache_mb,
+    )
+    sys.exit(serve(opts, start_controller))
+
+
 @app.command()
 def install_proxy_remote() -> None:  # noqa: PLR0915
     """Install an octotail proxy remote for the current git repository."""
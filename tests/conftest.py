@@ -1,4 +1,5 @@
 import socket
+import time
 from collections import deque
 from contextlib import contextmanager
 from copy import deepcopy
@@ -42,8 +43,15 @@ class MockQueue:
         except IndexError:
             raise Empty from None
 
-    def get(self):
-        return self.get_nowait()
+    def get(self, timeout: float | None = None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                return self.get_nowait()
+            except Empty:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.001)
 
     def report(self):
         return deepcopy(list(self.inner))
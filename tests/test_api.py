@@ -0,0 +1,124 @@
+import httpx
+import pytest
+
+from octotail.api import GitHubApi, Repo, RunQuery, WorkflowJob, WorkflowRun
+
+BASE_URL = "http://github.stub/api/v3"
+SHA = "f" * 40
+RUN = {
+    "id": 7,
+    "name": "test",
+    "event": "push",
+    "status": "in_progress",
+    "conclusion": None,
+    "head_branch": "main",
+    "html_url": "https://github.com/foo/bar/actions/runs/7",
+    "repository": {"id": 1, "full_name": "foo/bar"},
+}
+
+
+def _job(job_id: int) -> dict:
+    return {
+        "id": job_id,
+        "name": f"job-{job_id}",
+        "status": "completed",
+        "conclusion": "success",
+        "html_url": f"https://github.com/foo/bar/actions/runs/7/job/{job_id}",
+        "run_id": 7,
+    }
+
+
+def _stub(request: httpx.Request) -> httpx.Response:
+    headers = {"X-RateLimit-Remaining": "4999"}
+    match request.url.path.removeprefix("/api/v3"):
+        case "/repos/foo/bar":
+            return httpx.Response(200, headers=headers, json={"id": 1, "full_name": "foo/bar"})
+        case "/repos/foo/bar/actions/runs" | "/repos/foo/bar/actions/workflows/3/runs":
+            assert request.url.params["head_sha"] == SHA
+            return httpx.Response(200, headers=headers, json={"workflow_runs": [RUN]})
+        case "/repos/foo/bar/actions/workflows":
+            workflows = [{"id": 2, "name": "lint"}, {"id": 3, "name": "test"}]
+            return httpx.Response(200, headers=headers, json={"workflows": workflows})
+        case "/repos/foo/bar/actions/runs/7":
+            return httpx.Response(200, headers=headers, json=RUN | {"conclusion": "success"})
+        case "/repos/foo/bar/actions/runs/7/jobs":
+            page = int(request.url.params.get("page", 1))
+            if page == 1:
+                assert dict(request.url.params) == {"filter": "latest", "per_page": "100"}
+                headers["Link"] = (
+                    f'<{BASE_URL}/repos/foo/bar/actions/runs/7/jobs?page=2>; rel="next"'
+                )
+            jobs = [_job(i) for i in range((page - 1) * 100, min(page * 100, 150))]
+            return httpx.Response(200, headers=headers, json={"total_count": 150, "jobs": jobs})
+    return httpx.Response(404, json={"message": "Not Found"})
+
+
+@pytest.fixture
+def api():
+    return GitHubApi("s3cr3t", BASE_URL, transport=httpx.MockTransport(_stub))
+
+
+@pytest.mark.asyncio
+async def test_endpoints(api):
+    repo = await api.get_repo("foo/bar")
+    runs = [run async for run in api.iter_workflow_runs(repo, RunQuery(head_sha=SHA))]
+    jobs = await api.get_workflow_jobs(runs[0])
+
+    assert repo == Repo(id=1, full_name="foo/bar")
+    assert runs == [WorkflowRun.from_json(RUN)]
+    assert runs[0].repo == "foo/bar"
+    assert (await api.get_workflow_run(runs[0])).conclusion == "success"
+    assert [job.id for job in jobs] == list(range(150))
+    assert jobs[0] == WorkflowJob.from_json(_job(0))
+    assert api.last_headers["X-RateLimit-Remaining"] == "4999"
+
+
+@pytest.mark.asyncio
+async def test_run_filters():
+    seen: list[httpx.Request] = []
+
+    def _handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request)
+        return _stub(request)
+
+    api = GitHubApi("s3cr3t", BASE_URL, transport=httpx.MockTransport(_handler))
+    repo = Repo(id=1, full_name="foo/bar")
+    workflow_id = await api.get_workflow_id(repo, "test")
+    query = RunQuery(head_sha=SHA, branch="main", event="push", workflow_id=workflow_id)
+    runs = [run async for run in api.iter_workflow_runs(repo, query)]
+
+    assert workflow_id == 3
+    assert await api.get_workflow_id(repo, "nope") is None
+    assert runs == [WorkflowRun.from_json(RUN)]
+    assert seen[1].url.path == "/api/v3/repos/foo/bar/actions/workflows/3/runs"
+    assert dict(seen[1].url.params) == {
+        "head_sha": SHA,
+        "branch": "main",
+        "event": "push",
+        "per_page": "100",
+    }
+
+
+@pytest.mark.asyncio
+async def test_errors(api):
+    with pytest.raises(httpx.HTTPStatusError) as exc_info:
+        await api.get_repo("foo/nope")
+
+    assert exc_info.value.response.status_code == 404
+    assert api.last_headers.get("X-RateLimit-Remaining") is None
+
+
+@pytest.mark.asyncio
+async def test_authenticates():
+    seen: list[httpx.Request] = []
+
+    def _handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request)
+        return _stub(request)
+
+    api = GitHubApi("s3cr3t", BASE_URL, transport=httpx.MockTransport(_handler))
+    await api.get_repo("foo/bar")
+    await api.aclose()
+
+    assert seen[0].headers["Authorization"] == "Bearer s3cr3t"
+    assert seen[0].headers["Accept"] == "application/vnd.github+json"
@@ -2,25 +2,31 @@ import asyncio
 import asyncio as aio
 import json
 import multiprocessing.dummy
+import os
 import threading
 import time
 import typing as t
 from argparse import Namespace
-from unittest.mock import AsyncMock, MagicMock, call
+from unittest.mock import ANY, AsyncMock, MagicMock, call
 
 import pytest
+from pyee import EventEmitter
 
 import octotail.browser
 from octotail.browser import (
+    ALLOWED_HOSTS,
     BrowserWatcher,
     CookieJar,
+    _await_fallback,
     _controller,
     _launch_browser,
     _login_flow,
     _nom_cookies,
+    _sniff_target,
+    is_essential,
 )
-from octotail.cli import Opts
-from octotail.msg import CloseRequest, ExitRequest, ProxyLive, VisitRequest
+from octotail.cli import Extractor, LaunchProfile, Opts
+from octotail.msg import CloseRequest, ExitRequest, ProxyLive, VisitRequest, WsSub
 
 
 @pytest.mark.asyncio
@@ -47,17 +53,101 @@ def test_calls_mgr_stop_on_early_exit(monkeypatch):
         sut.stop()
 
     mgr.stop.assert_called_once()
-    mock_target.assert_called_once_with("mock_opts", "mock_inbox")
+    mock_target.assert_called_once_with("mock_opts", "mock_inbox", ANY)
 
 
+@pytest.mark.parametrize(
+    ("extractor", "has_proxy"), [(Extractor.PROXY, True), (Extractor.CDP, False)]
+)
 @pytest.mark.asyncio
-async def test_launch_gets_a_proxy_argument(monkeypatch):
+async def test_launch_gets_a_proxy_argument(monkeypatch, tmp_path, extractor, has_proxy):
     mock_launch = AsyncMock()
     monkeypatch.setattr(octotail.browser, "launch", mock_launch)
-    await _launch_browser(t.cast(Opts, Namespace(headless="a_bogus_value", port=12345)))
+    opts = Namespace(
+        headless="a_bogus_value",
+        port=12345,
+        extractor=extractor,
+        profile_dir=tmp_path,
+        profile_on_tmpfs=False,
+        profile_cache_mb=1,
+        launch_profile=LaunchProfile.DEFAULT,
+    )
+    await _launch_browser(t.cast(Opts, opts))
     args = json.dumps(mock_launch.call_args_list[0].kwargs)
     assert "a_bogus_value" in args
-    assert "--proxy-server=127.0.0.1:12345" in args
+    assert ("--proxy-server=127.0.0.1:12345" in args) == has_proxy
+
+
+@pytest.mark.asyncio
+async def test_launch_uses_the_profile(monkeypatch, tmp_path):
+    mock_launch = AsyncMock()
+    monkeypatch.setattr(octotail.browser, "launch", mock_launch)
+    monkeypatch.setattr(octotail.browser, "TMPFS_PROFILE_DIR", tmp_path / "tmpfs")
+    opts = Namespace(
+        headless=True,
+        port=12345,
+        extractor=Extractor.PROXY,
+        profile_dir=None,
+        profile_on_tmpfs=True,
+        profile_cache_mb=1,
+        launch_profile=LaunchProfile.DEFAULT,
+    )
+
+    await _launch_browser(t.cast(Opts, opts))
+    options = mock_launch.call_args.kwargs["options"]
+    assert options["userDataDir"] == str(tmp_path / "tmpfs")
+    assert f"--disk-cache-size={1024 * 1024}" in options["args"]
+
+    # in use by another chromium
+    (tmp_path / "tmpfs" / "SingletonLock").symlink_to(f"somehost-{os.getpid()}")
+    await _launch_browser(t.cast(Opts, opts))
+    assert "userDataDir" not in mock_launch.call_args.kwargs["options"]
+
+
+@pytest.mark.parametrize(
+    ("launch_profile", "headless", "headless_shell", "expected"),
+    [
+        (LaunchProfile.DEFAULT, True, "/opt/chrome-headless-shell", ("/usr/bin/chromium", True)),
+        (
+            LaunchProfile.LOW_MEMORY,
+            True,
+            "/opt/chrome-headless-shell",
+            ("/opt/chrome-headless-shell", True),
+        ),
+        (LaunchProfile.LOW_MEMORY, True, None, ("/usr/bin/chromium", False)),
+        (
+            LaunchProfile.LOW_MEMORY,
+            False,
+            "/opt/chrome-headless-shell",
+            ("/usr/bin/chromium", False),
+        ),
+    ],
+)
+@pytest.mark.asyncio
+async def test_launch_profiles(
+    monkeypatch, tmp_path, launch_profile, headless, headless_shell, expected
+):
+    mock_launch = AsyncMock()
+    monkeypatch.setattr(octotail.browser, "launch", mock_launch)
+    monkeypatch.setattr(octotail.browser.shutil, "which", lambda _: headless_shell)
+    opts = Namespace(
+        headless=headless,
+        port=12345,
+        extractor=Extractor.CDP,
+        profile_dir=tmp_path,
+        profile_on_tmpfs=False,
+        profile_cache_mb=1,
+        launch_profile=launch_profile,
+    )
+
+    await _launch_browser(t.cast(Opts, opts))
+    kwargs = mock_launch.call_args.kwargs
+    args = kwargs["options"]["args"]
+    assert (kwargs["executablePath"], kwargs["headless"]) == expected
+    assert ("--renderer-process-limit=2" in args) == (launch_profile == LaunchProfile.LOW_MEMORY)
+    # a single --disable-features, or chromium would ignore all but the last one
+    assert len([arg for arg in args if arg.startswith("--disable-features=")]) == 1
+    assert ("--headless=new" in args) == (headless and headless_shell is None)
 
 
 def test_cookie_jar(tmp_path):
@@ -136,10 +226,15 @@ async def test_login_flow(opts: Opts, otp_enabled: bool, expected):
 @pytest.mark.parametrize(
     ("opts", "jar_cookies", "page_cookies", "close_called"),
     [
-        (Namespace(gh_user="foo", gh_pass="bar"), [], "##success", False),
-        (Namespace(gh_user="foo", gh_pass="bar"), [], RuntimeError("nope"), True),
+        (Namespace(gh_user="foo", gh_pass="bar", extractor="proxy"), [], "##success", False),
         (
-            Namespace(gh_user="foo", gh_pass="bar"),
+            Namespace(gh_user="foo", gh_pass="bar", extractor="proxy"),
+            [],
+            RuntimeError("nope"),
+            True,
+        ),
+        (
+            Namespace(gh_user="foo", gh_pass="bar", extractor="proxy"),
             [{"look": "a cookie"}],
             RuntimeError("nope"),  # doesn't matter, because we have cookie jars
             False,
@@ -168,7 +263,6 @@ async def test_controller_login_flow(
         opts=opts,
         inbox=inbox,
         cookie_jar=cookie_jar,
-        sleep_time=0.00000001,
     )
 
     async def _exit():
@@ -249,10 +343,385 @@ async def test_controller_visits_pages_one_at_a_time(
 
     sut = _controller(
         browser,
-        opts=t.cast(Opts, None),
+        opts=t.cast(
+            Opts,
+            Namespace(
+                extractor=Extractor.PROXY, max_tabs=1, run_pages=False, block_resources=False
+            ),
+        ),
         inbox=inbox,
         cookie_jar=cookie_jar,
-        sleep_time=0.00000001,
     )
 
     await sut
+
+
+@pytest.mark.asyncio
+async def test_controller_visits_earliest_started_jobs_first_in_parallel(
+    monkeypatch, tmp_path, mock_queue
+):
+    monkeypatch.setattr(octotail.browser, "stealth", AsyncMock())
+    browser = AsyncMock()
+    browser.pages.return_value = [AsyncMock()]
+    inbox = mock_queue(
+        [
+            VisitRequest(url="late", job_id=1, started_at="2024-10-18T12:00:03Z"),
+            VisitRequest(url="later", job_id=2, started_at="2024-10-18T12:00:04Z"),
+            VisitRequest(url="early", job_id=3, started_at="2024-10-18T12:00:01Z"),
+            ProxyLive(),
+        ]
+    )
+    cookie_jar = CookieJar(path=(tmp_path / "cookies"), user="foo")
+    cookie_jar.save([{"yes": "cookies", "expires": int(time.time()) + 100 * 3600}])
+
+    visited: list[str] = []
+
+    async def make_page():
+        page = AsyncMock()
+        page.goto.side_effect = lambda url, **_: visited.append(url)
+        return page
+
+    browser.newPage = make_page
+
+    async def _close_and_exit():
+        await aio.sleep(0.1)
+        assert visited == ["early", "late"]
+        inbox.put_nowait(CloseRequest(job_id=3))
+        await aio.sleep(0.1)
+        assert visited == ["early", "late", "later"]
+        inbox.put_nowait(ExitRequest())
+
+    sut = _controller(
+        browser,
+        opts=t.cast(
+            Opts,
+            Namespace(
+                extractor=Extractor.PROXY, max_tabs=2, run_pages=False, block_resources=False
+            ),
+        ),
+        inbox=inbox,
+        cookie_jar=cookie_jar,
+    )
+    await aio.gather(sut, _close_and_exit())
+
+
+@pytest.mark.asyncio
+async def test_controller_visits_run_pages_once(monkeypatch, tmp_path, mock_queue):
+    monkeypatch.setattr(octotail.browser, "stealth", AsyncMock())
+    monkeypatch.setattr(octotail.browser, "RUN_PAGE_GRACE", 0.1)
+    browser = AsyncMock()
+    browser.pages.return_value = [AsyncMock()]
+    run_url = "https://github.com/foo/bar/actions/runs/7"
+    inbox = mock_queue(
+        [
+            ProxyLive(),
+            VisitRequest(url=f"{run_url}/job/1", job_id=1),
+            VisitRequest(url=f"{run_url}/job/2", job_id=2),
+            # the run page came through for the first job only
+            CloseRequest(job_id=1),
+        ]
+    )
+    cookie_jar = CookieJar(path=(tmp_path / "cookies"), user="foo")
+    cookie_jar.save([{"yes": "cookies", "expires": int(time.time()) + 100 * 3600}])
+
+    visited: list[str] = []
+
+    async def make_page():
+        page = AsyncMock()
+        page.goto.side_effect = lambda url, **_: visited.append(url)
+        return page
+
+    browser.newPage = make_page
+
+    async def _exit():
+        await aio.sleep(0.05)
+        assert visited == [run_url]
+        await aio.sleep(0.2)
+        assert visited == [run_url, f"{run_url}/job/2"]
+        inbox.put_nowait(ExitRequest())
+
+    sut = _controller(
+        browser,
+        opts=t.cast(
+            Opts,
+            Namespace(extractor=Extractor.PROXY, max_tabs=1, run_pages=True, block_resources=False),
+        ),
+        inbox=inbox,
+        cookie_jar=cookie_jar,
+    )
+    await aio.gather(sut, _exit())
+
+
+@pytest.mark.parametrize(
+    ("resource_type", "url", "expected"),
+    [
+        ("document", "https://github.com/foo/bar/actions/runs/7/job/1", True),
+        ("script", "https://github.githubassets.com/assets/app.js", True),
+        ("xhr", "https://github.com/foo/bar/actions/runs/7/job/1/steps", True),
+        ("script", "data:text/javascript,1", True),
+        ("image", "https://avatars.githubusercontent.com/u/1", False),
+        ("stylesheet", "https://github.githubassets.com/assets/app.css", False),
+        ("font", "https://github.githubassets.com/assets/mona.woff2", False),
+        ("ping", "https://github.com/beacon", False),
+        ("xhr", "https://collector.github.com/github/collect", False),
+        ("script", "https://www.googletagmanager.com/gtm.js", False),
+        ("script", "https://evilgithub.com/x.js", False),
+        ("script", "https://cdn.example.com/x.js", False),
+    ],
+)
+def test_is_essential(resource_type, url, expected):
+    assert is_essential(resource_type, url, ALLOWED_HOSTS) == expected
+
+
+@pytest.mark.asyncio
+async def test_controller_blocks_heavy_subresources(monkeypatch, tmp_path, mock_queue):
+    monkeypatch.setattr(octotail.browser, "stealth", AsyncMock())
+    browser = AsyncMock()
+    browser.pages.return_value = [AsyncMock()]
+    inbox = mock_queue([ProxyLive(), VisitRequest(url="foo", job_id=1)])
+    cookie_jar = CookieJar(path=(tmp_path / "cookies"), user="foo")
+    cookie_jar.save([{"yes": "cookies", "expires": int(time.time()) + 100 * 3600}])
+
+    page = AsyncMock()
+    page.on = MagicMock()
+    browser.newPage.return_value = page
+    requests = {
+        url: AsyncMock(url=url, resourceType=resource_type)
+        for url, resource_type in [
+            ("https://github.com/foo", "document"),
+            ("https://github.githubassets.com/app.css", "stylesheet"),
+            ("https://cdn.example.com/x.js", "script"),
+        ]
+    }
+
+    async def _exit():
+        await aio.sleep(0.05)
+        page.setRequestInterception.assert_called_once_with(True)
+        page.setCacheEnabled.assert_called_once_with(True)
+        on_request = page.on.call_args.args[1]
+        for request in requests.values():
+            on_request(request)
+        await aio.sleep(0.05)
+        inbox.put_nowait(ExitRequest())
+
+    opts = Namespace(
+        extractor=Extractor.PROXY,
+        max_tabs=1,
+        run_pages=False,
+        block_resources=True,
+        allow_hosts=["example.com"],
+    )
+    await aio.gather(_controller(browser, t.cast(Opts, opts), inbox, cookie_jar), _exit())
+
+    assert [r.continue_.called for r in requests.values()] == [True, False, True]
+    assert [r.abort.called for r in requests.values()] == [False, True, False]
+
+
+@pytest.mark.asyncio
+async def test_controller_exits_before_proxy_goes_live(monkeypatch, tmp_path, mock_queue):
+    async def _noop(*_, **__):
+        pass
+
+    monkeypatch.setattr(octotail.browser, "stealth", _noop)
+    browser = AsyncMock()
+    start_page = AsyncMock()
+    browser.pages.return_value = [start_page]
+    inbox = mock_queue([VisitRequest(url="foo", job_id=1), ExitRequest(), ProxyLive()])
+
+    await _controller(
+        browser,
+        opts=t.cast(Opts, Namespace(extractor=Extractor.PROXY)),
+        inbox=inbox,
+        cookie_jar=CookieJar(path=(tmp_path / "cookies"), user="foo"),
+    )
+
+    browser.close.assert_called_once()
+    browser.newPage.assert_not_called()
+    start_page.goto.assert_not_called()
+    assert inbox.report() == [ProxyLive()]
+
+
+@pytest.mark.parametrize(("rss_budget_mb", "recycled"), [(1, True), (1024 * 1024, False)])
+@pytest.mark.asyncio
+async def test_controller_recycles_the_browser_between_visits(
+    monkeypatch, tmp_path, mock_queue, rss_budget_mb, recycled
+):
+    monkeypatch.setattr(octotail.browser, "stealth", AsyncMock())
+    logged = MagicMock()
+    monkeypatch.setattr(octotail.browser, "log", logged)
+
+    def _browser() -> AsyncMock:
+        browser = AsyncMock()
+        browser.pages.return_value = [AsyncMock()]
+        # the test process itself is large enough to go over a 1MB budget
+        browser.process = MagicMock(pid=os.getpid())
+        return browser
+
+    browser, new_browser = _browser(), _browser()
+    relaunch = AsyncMock(return_value=new_browser)
+    inbox = mock_queue([ProxyLive(), VisitRequest(url="foo", job_id=1)])
+    cookie_jar = CookieJar(path=(tmp_path / "cookies"), user="foo")
+    cookie_jar.save([{"yes": "cookies", "expires": int(time.time()) + 100 * 3600}])
+    opts = Namespace(
+        extractor=Extractor.PROXY,
+        max_tabs=1,
+        run_pages=False,
+        block_resources=False,
+        rss_budget_mb=rss_budget_mb,
+    )
+
+    async def _close_and_exit():
+        # give the watchdog time for a sample
+        await aio.sleep(0.2)
+        inbox.put_nowait(CloseRequest(job_id=1))
+        inbox.put_nowait(ExitRequest())
+
+    await aio.gather(
+        _controller(browser, t.cast(Opts, opts), inbox, cookie_jar, relaunch), _close_and_exit()
+    )
+
+    browser.close.assert_called_once()
+    assert relaunch.await_count == int(recycled)
+    assert new_browser.close.await_count == int(recycled)
+    if recycled:
+        new_browser.pages.return_value[0].setCookie.assert_called()
+    assert "browser memory: peak" in logged.call_args.args[0]
+
+
+@pytest.mark.parametrize("debug", [True, False])
+@pytest.mark.asyncio
+async def test_controller_only_watches_memory_when_asked_to(
+    monkeypatch, tmp_path, mock_queue, debug
+):
+    monkeypatch.setattr(octotail.browser, "stealth", AsyncMock())
+    monkeypatch.setattr(octotail.browser, "DEBUG", debug)
+    logged, debugged = MagicMock(), MagicMock()
+    monkeypatch.setattr(octotail.browser, "log", logged)
+    monkeypatch.setattr(octotail.browser, "debug", debugged)
+    browser = AsyncMock()
+    browser.pages.return_value = [AsyncMock()]
+    browser.process = MagicMock(pid=os.getpid())
+    inbox = mock_queue([ProxyLive()])
+    cookie_jar = CookieJar(path=(tmp_path / "cookies"), user="foo")
+    cookie_jar.save([{"yes": "cookies", "expires": int(time.time()) + 100 * 3600}])
+    opts = Namespace(
+        extractor=Extractor.PROXY,
+        max_tabs=1,
+        run_pages=False,
+        block_resources=False,
+        rss_budget_mb=None,
+        launch_profile=LaunchProfile.DEFAULT,
+    )
+
+    async def _exit():
+        await aio.sleep(0.2)
+        inbox.put_nowait(ExitRequest())
+
+    await aio.gather(
+        _controller(browser, t.cast(Opts, opts), inbox, cookie_jar, AsyncMock()), _exit()
+    )
+
+    logged.assert_not_called()
+    reports = [c.args[0] for c in debugged.call_args_list if "browser memory" in c.args[0]]
+    assert len(reports) == int(debug)
+
+
+def test_forwards_extracted_subscriptions(monkeypatch):
+    monkeypatch.setattr(octotail.browser, "mp", multiprocessing.dummy)
+    mgr = MagicMock()
+    ws_sub = WsSub(url="alive.github.com/foo", subs="bar", job_id=123)
+
+    def _target(_opts, _inbox, outbox):
+        outbox.put(ws_sub)
+        time.sleep(0.5)
+
+    sut = BrowserWatcher.start(mgr, "mock_opts", "mock_inbox")
+    try:
+        sut.proxy().watch(target=_target).get()
+    finally:
+        sut.stop()
+
+    assert mgr.tell.call_args_list == [call(ws_sub)]
+    mgr.stop.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_controller_does_not_wait_for_proxy_with_cdp(monkeypatch, tmp_path, mock_queue):
+    monkeypatch.setattr(octotail.browser, "stealth", AsyncMock())
+    browser = AsyncMock()
+    browser.pages.return_value = [AsyncMock()]
+    inbox = mock_queue([VisitRequest(url="foo", job_id=1), ExitRequest()])
+    cookie_jar = CookieJar(path=(tmp_path / "cookies"), user="foo")
+    cookie_jar.save([{"yes": "cookies", "expires": int(time.time()) + 100 * 3600}])
+
+    await _controller(
+        browser,
+        opts=t.cast(
+            Opts,
+            Namespace(extractor=Extractor.CDP, max_tabs=1, run_pages=False, block_resources=False),
+        ),
+        inbox=inbox,
+        cookie_jar=cookie_jar,
+    )
+
+    browser.newPage.assert_called_once()
+    browser.close.assert_called_once()
+
+
+SUBS = '{"subscribe":{"eyJjIjoiY2hlY2tfcnVuczozMTczNzQ5NDIwMyIsInQiOjE3MjkyNjIyMDV9":""}}'
+
+
+@pytest.mark.parametrize(
+    ("ws_url", "payload", "expected"),
+    [
+        (
+            "wss://alive.github.com/_sockets/u/1/ws?session=foo",
+            SUBS,
+            [
+                WsSub(
+                    url="alive.github.com/_sockets/u/1/ws?session=foo",
+                    subs=SUBS,
+                    job_id=31737494203,
+                )
+            ],
+        ),
+        ("wss://example.com/ws", SUBS, []),
+        ("wss://alive.github.com/_sockets/u/1/ws", '{"unsubscribe":{}}', []),
+        (None, SUBS, []),
+    ],
+)
+@pytest.mark.asyncio
+async def test_sniff_target(mock_queue, ws_url, payload, expected):
+    session = EventEmitter()
+    session.send = AsyncMock()
+    target = MagicMock()
+    target.createCDPSession = AsyncMock(return_value=session)
+    outbox = mock_queue()
+
+    await _sniff_target(target, outbox)
+    session.send.assert_called_once_with("Network.enable")
+
+    if ws_url is not None:
+        session.emit("Network.webSocketCreated", {"requestId": "1", "url": ws_url})
+    session.emit(
+        "Network.webSocketFrameSent", {"requestId": "1", "response": {"payloadData": payload}}
+    )
+    assert outbox.report() == expected
+
+
+@pytest.mark.parametrize(
+    ("inbox_items", "expected", "left_in_inbox"),
+    [
+        ([ExitRequest()], False, []),
+        ([ProxyLive(), CloseRequest(job_id=1), ExitRequest()], False, []),
+        (
+            [ProxyLive(), VisitRequest(url="foo", job_id=1), VisitRequest(url="bar", job_id=2)],
+            True,
+            [VisitRequest(url="bar", job_id=2), ProxyLive(), VisitRequest(url="foo", job_id=1)],
+        ),
+    ],
+)
+def test_await_fallback(mock_queue, inbox_items, expected, left_in_inbox):
+    inbox = mock_queue(inbox_items)
+    assert _await_fallback(inbox) == expected
+    assert inbox.report() == left_in_inbox
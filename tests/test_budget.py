@@ -0,0 +1,94 @@
+import multiprocessing as mp
+
+import pytest
+
+from octotail.budget import BURST, RateBudget
+
+NOW = 1000.0
+
+
+class FakeClock:
+    def __init__(self, now: float = NOW):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _frozen() -> float:
+    return NOW
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def budget(tmp_path, clock):
+    _budget = RateBudget(tmp_path, clock)
+    # 100 requests left for the next 100 seconds: one per second
+    _budget.observe("pat", remaining=100, reset=NOW + 100)
+    return _budget
+
+
+def test_bursts_then_waits(budget, clock):
+    waits = [budget.reserve("pat") for _ in range(int(BURST) + 3)]
+
+    assert waits == [0.0] * int(BURST) + [1.0, 2.0, 3.0]
+
+    clock.now += 2.5
+    assert budget.reserve("pat") == 1.5
+
+
+def test_refund(budget):
+    for _ in range(int(BURST)):
+        budget.reserve("pat")
+    budget.refund("pat")
+
+    assert budget.reserve("pat") == 0.0
+    assert budget.reserve("pat") == 1.0
+
+
+def test_stretches_as_headroom_runs_out(budget, clock):
+    budget.observe("pat", remaining=10, reset=NOW + 100)
+
+    waits = [budget.reserve("pat") for _ in range(12)]
+
+    assert waits[:10] == [0.0] * 10
+    assert waits[10:] == [10.0, 20.0]
+    # separate tokens, separate budgets
+    assert budget.reserve("other-pat") == 0.0
+
+
+def test_exhausted(budget, clock):
+    budget.observe("pat", remaining=0, reset=NOW + 60)
+
+    assert budget.reserve("pat") == 60.0
+
+
+def test_ignores_garbage(tmp_path, clock):
+    (tmp_path / "pat").write_text("{nope")
+
+    assert RateBudget(tmp_path, clock).reserve("pat") == 0.0
+
+
+def _reserve_many(budget: RateBudget, n: int, out: "mp.Queue[float]") -> None:
+    for _ in range(n):
+        out.put(budget.reserve("pat"))
+
+
+def test_shared_between_processes(tmp_path):
+    budget = RateBudget(tmp_path, _frozen)
+    budget.observe("pat", remaining=100, reset=NOW + 100)
+    out: "mp.Queue[float]" = mp.Queue()
+
+    workers = [mp.Process(target=_reserve_many, args=(budget, 10, out)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    waits = sorted(out.get(timeout=10) for _ in range(40))
+    for worker in workers:
+        worker.join()
+
+    # every reservation got its own slot: nobody double-spent a token
+    assert waits == [0.0] * int(BURST) + [float(i) for i in range(1, 21)]
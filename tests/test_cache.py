@@ -0,0 +1,135 @@
+import json
+import os
+import time
+
+import httpx
+import pytest
+
+from octotail.budget import BURST, RateBudget
+from octotail.cache import CachingTransport, Entry, ResponseCache, _budget_key
+
+REPO = {"id": 1, "full_name": "foo/bar", "name": "bar"}
+URL = "https://api.github.com/repos/foo/bar"
+
+
+class FakeGitHub:
+    """Stands in for the network: answers with 304 whenever the etag matches."""
+
+    def __init__(self, body: dict, etag: str = '"v1"'):
+        self.body = body
+        self.etag = etag
+        self.requests: list[httpx.Request] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        headers = {"X-RateLimit-Remaining": str(5000 - len(self.requests))}
+        if request.headers.get("If-None-Match") == self.etag:
+            return httpx.Response(304, headers=headers)
+        headers |= {"ETag": self.etag}
+        return httpx.Response(200, headers=headers, json=self.body)
+
+    def etags(self) -> list[str | None]:
+        return [r.headers.get("If-None-Match") for r in self.requests]
+
+
+@pytest.fixture
+def fake_github():
+    return FakeGitHub(REPO)
+
+
+def _client(fake_github, tmp_path, budget=None) -> httpx.AsyncClient:
+    transport = CachingTransport(ResponseCache(tmp_path), budget, httpx.MockTransport(fake_github))
+    return httpx.AsyncClient(transport=transport)
+
+
+@pytest.mark.asyncio
+async def test_revalidates_and_serves_304s_from_cache(fake_github, tmp_path):
+    async with _client(fake_github, tmp_path) as client:
+        first, second = await client.get(URL), await client.get(URL)
+
+    assert fake_github.etags() == [None, '"v1"']
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json() == REPO
+    # fresh headers from the 304 win over the cached ones
+    assert second.headers["X-RateLimit-Remaining"] == "4998"
+    assert second.headers["ETag"] == '"v1"'
+
+
+@pytest.mark.asyncio
+async def test_cache_survives_restarts(fake_github, tmp_path):
+    async with _client(fake_github, tmp_path) as client:
+        await client.get(URL)
+    async with _client(fake_github, tmp_path) as client:
+        assert (await client.get(URL)).json() == REPO
+
+    assert fake_github.etags() == [None, '"v1"']
+
+
+@pytest.mark.asyncio
+async def test_changed_resources_replace_the_cache(fake_github, tmp_path):
+    async with _client(fake_github, tmp_path) as client:
+        await client.get(URL)
+        fake_github.body, fake_github.etag = {**REPO, "name": "baz"}, '"v2"'
+
+        assert (await client.get(URL)).json()["name"] == "baz"
+        assert (await client.get(URL)).json()["name"] == "baz"
+
+    assert fake_github.etags() == [None, '"v1"', '"v2"']
+
+
+@pytest.mark.asyncio
+async def test_keys_on_credentials(fake_github, tmp_path):
+    async with _client(fake_github, tmp_path) as client:
+        await client.get(URL, headers={"Authorization": "token a"})
+        await client.get(URL, headers={"Authorization": "token b"})
+
+    assert fake_github.etags() == [None, None]
+
+
+@pytest.mark.asyncio
+async def test_leaves_conditional_requests_alone(fake_github, tmp_path):
+    async with _client(fake_github, tmp_path) as client:
+        await client.get(URL)
+        response = await client.get(URL, headers={"If-None-Match": '"v1"'})
+
+        assert response.status_code == 304
+        assert (await client.post(URL)).status_code == 200
+        assert fake_github.requests[-1].headers.get("If-None-Match") is None
+
+
+def test_ignores_broken_entries(tmp_path):
+    cache = ResponseCache(tmp_path)
+    (tmp_path / "garbage").write_text("{not json")
+    (tmp_path / "wrong").write_text(json.dumps({"etag": "x"}))
+    cache.put("good", Entry(etag="x", headers={}, body="{}"))
+
+    assert cache.get("garbage") is None
+    assert cache.get("wrong") is None
+    assert cache.get("missing") is None
+    assert cache.get("good") == Entry(etag="x", headers={}, body="{}")
+
+
+def test_prune(tmp_path):
+    cache = ResponseCache(tmp_path)
+    cache.put("old", Entry(etag="x", headers={}, body=""))
+    cache.put("new", Entry(etag="y", headers={}, body=""))
+    stale = time.time() - 3600
+    os.utime(tmp_path / "old", (stale, stale))
+
+    cache.prune(ttl=60)
+
+    assert cache.get("old") is None
+    assert cache.get("new") is not None
+
+
+@pytest.mark.asyncio
+async def test_spends_the_budget(fake_github, tmp_path):
+    budget = RateBudget(tmp_path / "budget", lambda: 1000.0)
+
+    async with _client(fake_github, tmp_path / "cache", budget) as client:
+        for _ in range(3):
+            await client.get(URL, headers={"Authorization": "token a"})
+
+    # one 200 and two free 304s: a single token spent
+    waits = [budget.reserve(_budget_key(fake_github.requests[0])) for _ in range(int(BURST))]
+    assert waits[-2:] == [0.0, pytest.approx(3600 / 5000)]
@@ -0,0 +1,167 @@
+import socket
+import threading
+import time
+from unittest.mock import MagicMock, call
+
+import pytest
+
+from octotail.daemon import DaemonLink, Router, _Handler, _Server, connect, decode, encode
+from octotail.msg import CloseRequest, ExitRequest, ProxyLive, VisitRequest, WsSub
+
+
+@pytest.mark.parametrize(
+    "msg",
+    [
+        VisitRequest(url="https://github.com/foo/bar/actions/runs/1/job/2", job_id=2),
+        WsSub(url="alive.github.com:443/foobar", subs='{"subscribe":{}}', job_id=2),
+        CloseRequest(job_id=2),
+    ],
+)
+def test_wire_roundtrip(msg):
+    line = encode(msg)
+    assert line.endswith(b"\n")
+    assert decode(line) == msg
+
+
+@pytest.mark.parametrize("line", [b"", b"not json", b"{}", b'{"visit": {"nope": 1}}'])
+def test_decode_garbage(line):
+    assert decode(line) is None
+
+
+def test_connect_without_daemon(tmp_path):
+    assert connect(tmp_path / "nobody-home.sock") is None
+
+
+def test_router(mock_queue):
+    browse_queue = mock_queue()
+    stop = threading.Event()
+    sut = Router.start(browse_queue, stop)
+    conn_a, conn_b = MagicMock(), MagicMock()
+    ws_sub = WsSub(url="alive.github.com:443/foobar", subs="", job_id=1)
+
+    try:
+        proxy = sut.proxy()
+        proxy.on_receive(ProxyLive()).get()
+        proxy.visit(VisitRequest(url="foo", job_id=1), conn_a).get()
+        proxy.visit(VisitRequest(url="bar", job_id=2), conn_b).get()
+        proxy.on_receive(ws_sub).get()
+        proxy.on_receive(ws_sub).get()  # nobody is waiting for it anymore
+        proxy.disconnect(conn_b).get()
+        proxy.disconnect(conn_a).get()
+    finally:
+        sut.stop()
+
+    conn_a.sendall.assert_called_once_with(encode(ws_sub))
+    conn_b.sendall.assert_not_called()
+    assert stop.is_set()
+    assert browse_queue.report() == [
+        ProxyLive(),
+        VisitRequest(url="foo", job_id=1),
+        VisitRequest(url="bar", job_id=2),
+        CloseRequest(job_id=1),
+        CloseRequest(job_id=1),
+        CloseRequest(job_id=2),
+        ExitRequest(),
+    ]
+
+
+def test_router_close(mock_queue):
+    browse_queue = mock_queue()
+    sut = Router.start(browse_queue, threading.Event())
+    conn_a, conn_b = MagicMock(), MagicMock()
+
+    try:
+        proxy = sut.proxy()
+        proxy.visit(VisitRequest(url="foo", job_id=1), conn_a).get()
+        proxy.visit(VisitRequest(url="foo", job_id=1), conn_b).get()
+        proxy.close(1, conn_a).get()
+        # still wanted by the other client
+        assert CloseRequest(job_id=1) not in browse_queue.report()
+        proxy.close(1, conn_b).get()
+        proxy.close(1, conn_b).get()
+        proxy.disconnect(conn_a).get()
+    finally:
+        sut.stop()
+
+    assert browse_queue.report() == [
+        VisitRequest(url="foo", job_id=1),
+        VisitRequest(url="foo", job_id=1),
+        CloseRequest(job_id=1),
+        ExitRequest(),
+    ]
+
+
+def test_close_requests_over_the_socket(mock_queue, tmp_path):
+    browse_queue = mock_queue()
+    router = Router.start(browse_queue, threading.Event())
+    path = tmp_path / "d.sock"
+
+    with _Server(str(path), _Handler) as server:
+        server.router = router
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            sock = connect(path)
+            assert sock is not None
+            sock.sendall(encode(VisitRequest(url="foo", job_id=1)))
+            sock.sendall(encode(CloseRequest(job_id=1)))
+            while len(browse_queue.report()) < 2:
+                time.sleep(0.001)
+            # the job's page got closed before the client detached
+            assert browse_queue.report() == [
+                VisitRequest(url="foo", job_id=1),
+                CloseRequest(job_id=1),
+            ]
+            sock.close()
+        finally:
+            server.shutdown()
+            router.stop()
+
+
+def test_daemon_link(mock_queue):
+    mgr = MagicMock()
+    mgr.is_alive.return_value = True
+    stop_mock = MagicMock()
+    stop_event = threading.Event()
+    stop_mock.stop_event.get.return_value = stop_event
+    mgr.proxy.return_value = stop_mock
+
+    ours, theirs = socket.socketpair()
+    visit_req = VisitRequest(url="foo", job_id=1)
+    ws_sub = WsSub(url="alive.github.com:443/foobar", subs="", job_id=1)
+    inbox = mock_queue([ProxyLive(), visit_req, CloseRequest(job_id=1)])
+
+    sut = DaemonLink.start(mgr, inbox, ours)
+    try:
+        thread = threading.Thread(target=lambda: sut.proxy().watch().get())
+        thread.start()
+
+        with theirs.makefile("rb") as lines:
+            assert decode(lines.readline()) == visit_req
+            assert decode(lines.readline()) == CloseRequest(job_id=1)
+        theirs.sendall(encode(ws_sub))
+        while not mgr.tell.call_args_list:
+            time.sleep(0.001)
+
+        inbox.put(ExitRequest())
+        thread.join()
+    finally:
+        sut.stop()
+        theirs.close()
+
+    assert mgr.tell.call_args_list == [call(ws_sub)]
+    mgr.stop.assert_not_called()
+
+
+def test_daemon_link_lost_connection(mock_queue):
+    mgr = MagicMock()
+    stop_mock = MagicMock()
+    stop_mock.stop_event.get.return_value = threading.Event()
+    mgr.proxy.return_value = stop_mock
+
+    ours, theirs = socket.socketpair()
+    sut = DaemonLink(mgr, mock_queue(), ours)
+    theirs.close()
+    sut._read()
+    ours.close()
+
+    mgr.stop.assert_called_once()
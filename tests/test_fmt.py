@@ -5,7 +5,7 @@ import threading
 from unittest.mock import MagicMock
 
 import pytest
-from termcolor import COLORS
+from termcolor import COLORS, colored
 
 from octotail.fmt import WHEEL, Formatter
 from octotail.msg import OutputItem, WebsocketClosed
@@ -100,3 +100,48 @@ def test_print_lines(items, output, called_stop):
         thread.join()
     finally:
         sut.stop()
+
+
+def test_render_matches_termcolor():
+    sut = Formatter(mgr=MagicMock(), queue=MagicMock())
+    color = sut._get_color("foo")
+    prefix = colored("[foo]:", color, force_color=True)
+    item = OutputItem(
+        job_name="foo",
+        lines=["bar", "[command]ls", "##[error]nope", "##[conclusion]success", "##[group]baz"],
+    )
+
+    assert sut._render(item).split("\n") == [
+        f"{prefix} {colored('bar', color, force_color=True)}",
+        f"{prefix} {colored('$ ls', 'white', force_color=True)}",
+        f"{prefix} ",
+        f"{prefix} {colored('Error: nope', 'red', attrs=['bold'], force_color=True)}",
+        f"{prefix} ",
+        f"{prefix} {colored('Conclusion: SUCCESS', 'green', attrs=['bold'], force_color=True)}",
+        f"{prefix} ",
+        f"{prefix} {colored('--', color, force_color=True)}"
+        f"  {colored('baz', color, attrs=['bold'], force_color=True)}"
+        f"  {colored('-' * 56, color, force_color=True)}",
+    ]
+
+
+class _CountingIO(io.StringIO):
+    writes: int = 0
+
+    def write(self, s):
+        self.writes += 1
+        return super().write(s)
+
+
+@pytest.mark.parametrize(("max_latency", "expected_writes"), [(10.0, 1), (0.0, 3)])
+def test_print_lines_coalesces_writes(mock_queue, max_latency, expected_writes):
+    queue = mock_queue([OutputItem(job_name="foo", lines=[str(i)]) for i in range(3)] + [None])
+    queue.task_done = MagicMock()
+    sut = Formatter(mgr=MagicMock(), queue=queue, max_latency=max_latency)
+    sut.file = _CountingIO()
+
+    sut.print_lines()
+
+    assert _bleach(sut.file.getvalue()) == "[foo]: 0\n[foo]: 1\n[foo]: 2\n"
+    assert sut.file.writes == expected_writes
+    assert queue.task_done.call_count == 4
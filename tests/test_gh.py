@@ -1,22 +1,33 @@
 import threading
+import time
 import typing as t
 from collections import deque
 from unittest.mock import MagicMock, PropertyMock, call
 
+import httpx
 import pytest
 from returns.io import IOFailure, IOResult, IOResultE, IOSuccess
 from returns.result import Failure, Success
 
 from octotail import gh
+from octotail.api import RunQuery, WorkflowJob
 from octotail.cli import Opts
+from octotail.manager import Manager
 from octotail.msg import JobDone, WorkflowDone
+from octotail.utils import Backoff
+
+
+RUN_ID = 7
 
 
 class MockOpts(t.NamedTuple):
     workflow_name: str | None = None
     ref_name: str | None = None
+    all_runs: bool = False
+    event: str | None = None
     gh_pat: str = ""
     commit_sha: str = ""
+    discovery_timeout: float = 0.05
 
 
 class MockRun(t.NamedTuple):
@@ -24,11 +35,13 @@ class MockRun(t.NamedTuple):
     name: str = ""
     head_branch: str = ""
     html_url: str = ""
+    event: str = "push"
 
 
 class MockJob(t.NamedTuple):
     id: int = -1
     conclusion: str = ""
+    status: str = "in_progress"
 
     @property
     def name(self) -> str:
@@ -62,6 +75,11 @@ class MockJob(t.NamedTuple):
                 MockRun(status="in_progress", head_branch="tags/v1.0.0"),
             ],
         ),
+        (
+            MockOpts(event="push"),
+            [MockRun(status="queued"), MockRun(status="queued", event="pull_request")],
+            [MockRun(status="queued")],
+        ),
     ],
 )
 def test_filter_runs(opts: Opts, input_runs, output_runs):
@@ -80,7 +98,7 @@ def test_filter_runs(opts: Opts, input_runs, output_runs):
         (
             [IOSuccess([MockRun(status="fried")])] * 5
             + [IOSuccess([MockRun(status="in_progress")])],
-            Success(MockRun(status="in_progress")),
+            Success([MockRun(status="in_progress")]),
         ),
         (
             [
@@ -95,17 +113,19 @@ def test_filter_runs(opts: Opts, input_runs, output_runs):
         ),
     ],
 )
-def test_get_active_run(list_results, expected):
+def test_get_active_runs(list_results, expected):
     deq = deque(list_results)
 
     def _run_lister(*_, **__):
-        return deq.popleft()
+        # the last result sticks around until the deadline
+        return deq.popleft() if len(deq) > 1 else deq[0]
 
     client = MagicMock()
     client.get_repo.return_value = IOSuccess("repo-id")
     client.get_workflow_runs = _run_lister
 
-    got = gh.get_active_run("repo-id", t.cast(Opts, MockOpts()), client=client, retry_delay=0)
+    backoff = Backoff(delay=0.001, jitter=0)
+    got = gh.get_active_runs("repo-id", t.cast(Opts, MockOpts()), client=client, backoff=backoff)
     if isinstance(expected, Failure):
         assert isinstance(got.failure(), type(expected.failure()))
         assert str(got.failure()).startswith(str(expected.failure()))
@@ -113,6 +133,59 @@ def test_get_active_run(list_results, expected):
         assert got == expected
 
 
+def test_get_active_runs_takes_them_all():
+    runs = [MockRun(status="in_progress", name="foo"), MockRun(status="queued", name="bar")]
+    client = MagicMock()
+    client.get_repo.return_value = IOSuccess("repo-id")
+    client.get_workflow_runs.return_value = IOSuccess(runs)
+
+    opts = t.cast(Opts, MockOpts(all_runs=True))
+    assert gh.get_active_runs("repo-id", opts, client=client) == Success(runs)
+    # no point stopping at the second match
+    assert client.get_workflow_runs.call_args.args[-1] is None
+
+
+@pytest.mark.asyncio
+async def test_take_stops_early():
+    pulled: list[int] = []
+
+    async def _items():
+        for i in range(100):
+            pulled.append(i)
+            yield i
+
+    assert await gh._take(_items(), lambda i: i % 2 == 1, 2) == [1, 3]
+    assert pulled == [0, 1, 2, 3]
+
+
+@pytest.mark.parametrize(
+    ("opts", "workflow_id", "expected"),
+    [
+        (MockOpts(commit_sha="abc"), None, RunQuery(head_sha="abc")),
+        (
+            MockOpts(commit_sha="abc", ref_name="refs/heads/main", event="push"),
+            None,
+            RunQuery(head_sha="abc", branch="main", event="push"),
+        ),
+        (
+            MockOpts(commit_sha="abc", ref_name="refs/tags/v1.0.0", workflow_name="test"),
+            42,
+            RunQuery(head_sha="abc", branch="v1.0.0", workflow_id=42),
+        ),
+        (
+            MockOpts(commit_sha="abc", workflow_name="nope"),
+            None,
+            RunQuery(head_sha="abc"),
+        ),
+    ],
+)
+def test_run_query(opts, workflow_id, expected):
+    client = MagicMock()
+    client.get_workflow_id.return_value = IOSuccess(workflow_id)
+
+    assert gh._run_query(client, "repo", t.cast(Opts, opts)) == IOSuccess(expected)
+
+
 @pytest.mark.parametrize(
     ("batches", "result_batches"),
     [
@@ -163,7 +236,7 @@ def test_job_state(batches, result_batches):
             True,
             [
                 call(JobDone(job_id=123, job_name="123", conclusion="yes")),
-                call(WorkflowDone(conclusion="wf-success!")),
+                call(WorkflowDone(conclusion="wf-success!", run_id=RUN_ID)),
             ],
         ),
         (
@@ -173,12 +246,31 @@ def test_job_state(batches, result_batches):
             False,
             [],
         ),
+        (
+            False,
+            [
+                IOResult.from_failure(
+                    httpx.HTTPStatusError(
+                        "slow down",
+                        request=httpx.Request("GET", "https://api.github.com"),
+                        response=httpx.Response(429, headers={"retry-after": "0"}),
+                    )
+                ),
+                IOSuccess([MockJob(conclusion="yes", id=123)]),
+            ],
+            ["wf-success!"],
+            True,
+            [
+                call(JobDone(job_id=123, job_name="123", conclusion="yes")),
+                call(WorkflowDone(conclusion="wf-success!", run_id=RUN_ID)),
+            ],
+        ),
         (True, None, None, True, []),
     ],
 )
 def test_run_watcher(
     stop_is_set: bool,
-    jobs_res: IOResultE,
+    jobs_res: IOResultE | list[IOResultE],
     wf_conclusions: list[str],
     mgr_is_alive: bool,
     tell_calls: list[call],
@@ -193,12 +285,17 @@ def test_run_watcher(
     mgr.proxy.return_value = stop_mock
 
     client = MagicMock()
-    client.get_workflow_jobs.return_value = jobs_res
-    client.poll_interval.return_value = 0
+    if isinstance(jobs_res, list):
+        client.get_workflow_jobs.side_effect = jobs_res
+    else:
+        client.get_workflow_jobs.return_value = jobs_res
+    client.response_headers.return_value = {}
 
-    wf_run = MagicMock()
+    wf_run = MagicMock(id=RUN_ID)
+    client.get_workflow_run.return_value = IOSuccess(wf_run)
     type(wf_run).conclusion = PropertyMock(side_effect=wf_conclusions)
-    sut = gh.RunWatcher.start(mgr=mgr, wf_run=wf_run, client=client)
+    schedule = gh.PollSchedule(min_interval=0, max_interval=0)
+    sut = gh.RunWatcher.start(mgr=mgr, wf_run=wf_run, client=client, schedule=schedule)
 
     try:
         thread = threading.Thread(target=lambda: sut.proxy().watch().get())
@@ -208,3 +305,140 @@ def test_run_watcher(
         sut.stop()
 
     assert mgr.tell.call_args_list == tell_calls
+
+
+def test_run_watcher_refreshes_the_run_only_when_jobs_are_done():
+    mgr = MagicMock()
+    mgr.proxy.return_value.stop_event.get.return_value = threading.Event()
+
+    wf_run = MagicMock(id=RUN_ID)
+    type(wf_run).conclusion = PropertyMock(side_effect=["", "wf-success!"])
+    client = MagicMock()
+    client.response_headers.return_value = {}
+    client.get_workflow_run.return_value = IOSuccess(wf_run)
+    client.get_workflow_jobs.side_effect = [
+        IOSuccess([MockJob(id=123, status="queued")]),
+        IOSuccess([MockJob(id=123)]),
+        IOSuccess([MockJob(id=123, conclusion="yes"), MockJob(id=456)]),
+        IOSuccess([MockJob(id=123, conclusion="yes"), MockJob(id=456, conclusion="yes")]),
+        IOSuccess([MockJob(id=123, conclusion="yes"), MockJob(id=456, conclusion="yes")]),
+    ]
+    schedule = gh.PollSchedule(min_interval=0, max_interval=0)
+    sut = gh.RunWatcher.start(mgr=mgr, wf_run=wf_run, client=client, schedule=schedule)
+
+    try:
+        sut.proxy().watch().get()
+    finally:
+        sut.stop()
+
+    assert client.get_workflow_jobs.call_count == 5
+    assert client.get_workflow_run.call_count == 2
+    assert mgr.tell.call_args_list[-1] == call(
+        WorkflowDone(conclusion="wf-success!", run_id=RUN_ID)
+    )
+
+
+@pytest.mark.parametrize(
+    ("headers", "expected"),
+    [
+        ({}, 0.0),
+        ({"Retry-After": "30"}, 30.0),
+        ({"x-ratelimit-remaining": "0", "x-ratelimit-reset": "1060"}, 60.0),
+        ({"x-ratelimit-remaining": "100", "x-ratelimit-reset": "1600"}, 6.0),
+        ({"x-ratelimit-remaining": "100", "x-ratelimit-reset": "900"}, 0.0),
+        ({"x-ratelimit-remaining": "lots"}, 0.0),
+    ],
+)
+def test_rate_limit_floor(headers, expected):
+    assert gh.rate_limit_floor(headers, now=1000) == expected
+
+
+def test_rate_limit_floor_counts_every_request():
+    headers = {"x-ratelimit-remaining": "100", "x-ratelimit-reset": "1600"}
+    # say two pages of jobs and a run refresh
+    assert gh.rate_limit_floor(headers, now=1000, requests=3) == 18.0
+
+
+@pytest.mark.parametrize(
+    ("conclusions", "expected"),
+    [([], False), ([None], False), (["success", None], False), (["success", "skipped"], True)],
+)
+def test_may_be_done(conclusions, expected):
+    jobs = [t.cast(WorkflowJob, MagicMock(conclusion=c)) for c in conclusions]
+    assert gh._may_be_done(jobs) == expected
+
+
+def test_poll_schedule():
+    sut = gh.PollSchedule(min_interval=1, max_interval=3)
+
+    idle = [sut.next(busy=False, headers={}) for _ in range(4)]
+    busy = sut.next(busy=True, headers={})
+    limited = sut.next(busy=True, headers={"retry-after": "10"})
+
+    assert idle == [1.5, 2.25, 3, 3]
+    assert busy == 1
+    assert limited == 10
+    assert sut.next(busy=True, headers={}) == 1
+
+
+def test_live_schedule():
+    live = threading.Event()
+    sut = gh.LiveSchedule(live, live_min_interval=5, live_max_interval=30)
+
+    # not confirmed yet: polls like the default schedule
+    assert sut.next(busy=True, headers={}) == gh.MIN_POLL_INTERVAL
+
+    live.set()
+    assert sut.next(busy=True, headers={}) == 5
+    assert sut.next(busy=False, headers={}) == 7.5
+
+    live.clear()
+    assert sut.next(busy=True, headers={}) == gh.MIN_POLL_INTERVAL
+
+
+def test_run_watcher_wakes_up_early():
+    mgr = MagicMock()
+    mgr.proxy.return_value.stop_event.get.return_value = threading.Event()
+    client = MagicMock()
+    client.response_headers.return_value = {}
+    client.get_workflow_jobs.return_value = IOSuccess([MockJob(id=123)])
+    schedule = gh.PollSchedule(min_interval=60, max_interval=60)
+    sut = gh.RunWatcher.start(mgr=mgr, wf_run=MagicMock(), client=client, schedule=schedule)
+    wake = sut.proxy().wake.get()
+
+    try:
+        thread = threading.Thread(target=lambda: sut.proxy().watch().get())
+        thread.start()
+        time.sleep(0.1)
+        wake.set()
+        time.sleep(0.1)
+    finally:
+        mgr.proxy.return_value.stop_event.get.return_value.set()
+        wake.set()
+        thread.join()
+        sut.stop()
+
+    assert client.get_workflow_jobs.call_count == 2
+    mgr.proxy.return_value.wake_on_stop.assert_called_once_with(wake)
+
+
+def test_stopping_the_manager_wakes_run_watchers(mock_queue):
+    streamer = MagicMock(output_queue=mock_queue())
+    mgr = Manager.start(mock_queue(), streamer, threading.Event())
+    client = MagicMock()
+    client.response_headers.return_value = {}
+    client.get_workflow_jobs.return_value = IOSuccess([MockJob(id=123)])
+    schedule = gh.PollSchedule(min_interval=60, max_interval=60)
+    sut = gh.RunWatcher.start(mgr=mgr, wf_run=MagicMock(), client=client, schedule=schedule)
+
+    try:
+        thread = threading.Thread(target=lambda: sut.proxy().watch().get())
+        thread.start()
+        time.sleep(0.1)
+        mgr.stop()
+        thread.join(timeout=1)
+        assert not thread.is_alive()
+    finally:
+        sut.stop()
+
+    assert client.get_workflow_jobs.call_count == 1
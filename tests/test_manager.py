@@ -3,11 +3,10 @@ import threading
 import typing as t
 from unittest.mock import MagicMock
 
-import github
 import pytest
 
+import octotail.api
 import octotail.manager
-import octotail.streamer
 from octotail.msg import (
     CloseRequest,
     ExitRequest,
@@ -15,6 +14,7 @@ from octotail.msg import (
     OutputItem,
     ProxyLive,
     VisitRequest,
+    WatchRun,
     WorkflowDone,
     WsSub,
 )
@@ -23,6 +23,8 @@ from octotail.msg import (
 class WorkflowJob(t.NamedTuple):
     html_url: str
     id: int
+    run_id: int = 0
+    started_at: str | None = None
 
     @property
     def name(self) -> str:
@@ -68,18 +70,42 @@ class WorkflowJob(t.NamedTuple):
                 None,
             ],
         ),
+        (
+            [
+                WatchRun(run_id=1, name="ci"),
+                WatchRun(run_id=2, name="lint"),
+                WorkflowJob(html_url="https://foo.bar", id=123, run_id=1),
+                JobDone(job_id=123, conclusion="yes", job_name="123"),
+                WorkflowDone(conclusion="very good", run_id=1),
+                WorkflowDone(conclusion="very good", run_id=1),
+                WorkflowDone(conclusion="meh", run_id=2),
+            ],
+            [
+                VisitRequest(url="https://foo.bar", job_id=123),
+                CloseRequest(job_id=123),
+                ExitRequest(),
+            ],
+            [
+                OutputItem("ci / 123", ["##[conclusion]yes"]),
+                OutputItem("ci", ["##[conclusion]very good"]),
+                OutputItem("lint", ["##[conclusion]meh"]),
+                None,
+            ],
+        ),
     ],
 )
 def test_message_to_queues(
     monkeypatch, mock_queue, messages, expected_browse_queue, expected_output_queue
 ):
-    monkeypatch.setattr(github.WorkflowJob, "WorkflowJob", WorkflowJob)
-    monkeypatch.setattr(octotail.streamer, "run_streamer", MagicMock())
+    monkeypatch.setattr(octotail.api, "WorkflowJob", WorkflowJob)
     importlib.reload(octotail.manager)
 
     browse_queue = mock_queue()
     output_queue = mock_queue()
-    manager = octotail.manager.Manager.start(browse_queue, output_queue, threading.Event())
+    streamer = MagicMock(output_queue=output_queue)
+    # streams are done as soon as they get cancelled
+    streamer.cancel.side_effect = lambda _job_id, then: output_queue.put(then)
+    manager = octotail.manager.Manager.start(browse_queue, streamer, threading.Event())
 
     try:
         for msg in messages:
@@ -89,3 +115,134 @@ def test_message_to_queues(
         assert output_queue.report() == expected_output_queue
     finally:
         manager.stop()
+
+
+def test_scraped_jobs_skip_the_browser(monkeypatch, mock_queue):
+    monkeypatch.setattr(octotail.api, "WorkflowJob", WorkflowJob)
+    importlib.reload(octotail.manager)
+
+    browse_queue = mock_queue()
+    scraper = MagicMock()
+    manager = octotail.manager.Manager.start(browse_queue, MagicMock(), threading.Event(), scraper)
+
+    try:
+        proxy = manager.proxy()
+        proxy.on_receive(WorkflowJob(html_url="https://foo.bar", id=123)).get()
+        proxy.on_receive(WorkflowJob(html_url="https://foo.baz", id=345)).get()
+        proxy.on_receive(WsSub(url="https://ws.bar", subs="", job_id=123)).get()
+        proxy.on_receive(VisitRequest(url="https://foo.baz", job_id=345)).get()
+        proxy.on_receive(WsSub(url="https://ws.baz", subs="", job_id=345)).get()
+
+        assert [c.args[0] for c in scraper.proxy().scrape.call_args_list] == [
+            VisitRequest(url="https://foo.bar", job_id=123),
+            VisitRequest(url="https://foo.baz", job_id=345),
+        ]
+        assert browse_queue.report() == [
+            VisitRequest(url="https://foo.baz", job_id=345),
+            CloseRequest(job_id=345),
+        ]
+    finally:
+        manager.stop()
+
+    scraper.stop.assert_called_once()
+
+
+def test_streams_follow_jobs(monkeypatch, mock_queue):
+    monkeypatch.setattr(octotail.api, "WorkflowJob", WorkflowJob)
+    importlib.reload(octotail.manager)
+
+    worker = MagicMock(output_queue=mock_queue())
+    ws_sub = WsSub(url="https://ws.bar", subs="", job_id=123)
+    manager = octotail.manager.Manager.start(mock_queue(), worker, threading.Event())
+
+    try:
+        proxy = manager.proxy()
+        proxy.on_receive(WorkflowJob(html_url="https://foo.bar", id=123)).get()
+        proxy.on_receive(ws_sub).get()
+        proxy.on_receive(JobDone(job_id=123, conclusion="yes", job_name="foo")).get()
+    finally:
+        manager.stop()
+
+    worker.add.assert_called_once_with(
+        WsSub(url="https://ws.bar", subs="", job_id=123, job_name="123")
+    )
+    worker.cancel.assert_called_once_with(123, OutputItem("foo", ["##[conclusion]yes"]))
+    worker.stop.assert_called_once()
+
+
+def test_jobs_concluding_before_their_subscription_free_their_tab(monkeypatch, mock_queue):
+    monkeypatch.setattr(octotail.api, "WorkflowJob", WorkflowJob)
+    importlib.reload(octotail.manager)
+
+    browse_queue = mock_queue()
+    worker = MagicMock(output_queue=mock_queue())
+    manager = octotail.manager.Manager.start(browse_queue, worker, threading.Event())
+
+    try:
+        proxy = manager.proxy()
+        proxy.on_receive(WorkflowJob(html_url="https://foo.bar", id=123)).get()
+        proxy.on_receive(JobDone(job_id=123, conclusion="failure", job_name="foo")).get()
+        proxy.on_receive(JobDone(job_id=123, conclusion="failure", job_name="foo")).get()
+        # too late to be of any use
+        proxy.on_receive(WsSub(url="https://ws.bar", subs="", job_id=123)).get()
+    finally:
+        manager.stop()
+
+    worker.add.assert_not_called()
+    assert browse_queue.report() == [
+        VisitRequest(url="https://foo.bar", job_id=123),
+        CloseRequest(job_id=123),
+        ExitRequest(),
+    ]
+
+
+def test_scraped_jobs_concluding_early_stay_out_of_the_browser(monkeypatch, mock_queue):
+    monkeypatch.setattr(octotail.api, "WorkflowJob", WorkflowJob)
+    importlib.reload(octotail.manager)
+
+    browse_queue = mock_queue()
+    manager = octotail.manager.Manager.start(
+        browse_queue, MagicMock(), threading.Event(), MagicMock()
+    )
+
+    try:
+        proxy = manager.proxy()
+        proxy.on_receive(WorkflowJob(html_url="https://foo.bar", id=123)).get()
+        proxy.on_receive(JobDone(job_id=123, conclusion="skipped", job_name="foo")).get()
+        # the scraper giving up afterwards
+        proxy.on_receive(VisitRequest(url="https://foo.bar", job_id=123)).get()
+    finally:
+        manager.stop()
+
+    assert browse_queue.report() == [ExitRequest()]
+
+
+def test_harvested_subscriptions_wait_for_their_job(monkeypatch, mock_queue):
+    monkeypatch.setattr(octotail.api, "WorkflowJob", WorkflowJob)
+    importlib.reload(octotail.manager)
+
+    browse_queue = mock_queue()
+    worker = MagicMock(output_queue=mock_queue())
+    ws_sub = WsSub(url="https://ws.bar", subs="", job_id=123)
+    manager = octotail.manager.Manager.start(browse_queue, worker, threading.Event())
+
+    try:
+        proxy = manager.proxy()
+        proxy.on_receive(ws_sub).get()
+        worker.add.assert_not_called()
+
+        proxy.on_receive(WorkflowJob(html_url="https://foo.bar", id=123)).get()
+        # subscribing over again, as run pages do, changes nothing
+        proxy.on_receive(ws_sub).get()
+    finally:
+        manager.stop()
+
+    worker.add.assert_called_once_with(
+        WsSub(url="https://ws.bar", subs="", job_id=123, job_name="123")
+    )
+    # no need to visit the job's page
+    assert browse_queue.report() == [
+        CloseRequest(job_id=123),
+        CloseRequest(job_id=123),
+        ExitRequest(),
+    ]
@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from octotail.memory import MB, RssWatchdog, tree_rss
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def _process(proc, pid: int, ppid: int, comm: str, pages: int) -> None:
+    (proc / str(pid)).mkdir()
+    (proc / str(pid) / "stat").write_text(f"{pid} ({comm}) S {ppid} 1 1 0 -1\n")
+    (proc / str(pid) / "statm").write_text(f"1000 {pages} 10 1 0 100 0\n")
+
+
+def test_tree_rss(tmp_path):
+    _process(tmp_path, 10, 1, "chromium", 100)
+    _process(tmp_path, 11, 10, "chromium --type=renderer", 20)
+    _process(tmp_path, 12, 11, "weird ) name", 3)
+    _process(tmp_path, 13, 1, "unrelated", 1000)
+    (tmp_path / "self").mkdir()
+
+    assert tree_rss(10, tmp_path) == 123 * PAGE_SIZE
+    assert tree_rss(11, tmp_path) == 23 * PAGE_SIZE
+    assert tree_rss(99, tmp_path) == 0
+
+
+def test_tree_rss_of_the_current_process():
+    assert tree_rss(os.getpid()) > 0
+
+
+def test_watchdog():
+    watchdog = RssWatchdog(budget_mb=100)
+    assert not watchdog.over_budget()
+    assert watchdog.report() is None
+
+    for rss in [50, 300, 0, 80, 90, 110]:
+        watchdog.sample(123, lambda _, rss=rss: rss * MB)
+
+    # gone processes aren't sampled
+    assert watchdog.samples == [mb * MB for mb in [50, 300, 80, 90, 110]]
+    assert watchdog.over_budget()
+    assert watchdog.report() == "browser memory: peak 300MB, steady 90MB over 5 samples"
+
+    watchdog.sample(123, lambda _: 10 * MB)
+    assert not watchdog.over_budget()
+
+
+@pytest.mark.parametrize("rss_mb", [1, 1024 * 1024])
+def test_watchdog_without_a_budget(rss_mb):
+    watchdog = RssWatchdog()
+    watchdog.sample(123, lambda _: rss_mb * MB)
+    assert not watchdog.over_budget()
@@ -3,67 +3,72 @@ import time
 from unittest.mock import MagicMock, call
 
 import pytest
-from returns.maybe import Nothing
+from mitmproxy.test import tflow
+from mitmproxy.websocket import WebSocketMessage
 from returns.result import Success
+from wsproto.frame_protocol import Opcode
 
 import octotail.mitm
 import octotail.utils
 from octotail.msg import ProxyLive, WsSub
 
 
+SUBS = '{"subscribe":{"eyJjIjoiY2hlY2tfcnVuczozMTczNzQ5NDIwMyIsInQiOjE3MjkyNjIyMDV9":""}}'
+
+
+def _ws_flow(host: str, message: str | bytes, from_client: bool = True):
+    http_flow = tflow.twebsocketflow()
+    http_flow.request.host = host
+    http_flow.request.port = 443
+    http_flow.request.path = "/foobar"
+    opcode = Opcode.TEXT if isinstance(message, str) else Opcode.BINARY
+    content = message.encode() if isinstance(message, str) else message
+    http_flow.websocket.messages.append(WebSocketMessage(opcode, from_client, content))
+    return http_flow
+
+
 @pytest.mark.parametrize(
-    ("lines", "subs"),
+    ("http_flow", "subs"),
     [
-        ([], []),
-        (["", " "], []),
+        (_ws_flow("example.com", SUBS), []),
+        (_ws_flow("alive.github.com", "not a subscription"), []),
+        (_ws_flow("alive.github.com", SUBS, from_client=False), []),
+        (_ws_flow("alive.github.com", SUBS.encode()), []),
+        (_ws_flow("alive.github.com", '{"subscribe":{"bm9wZQ==":""}}'), []),
         (
-            [
-                "127.0.0.1:55350 -> WebSocket text message -> alive.github.com:443/foobar",
-                "",
-                "",
-                '{"subscribe":{"eyJjIjoiY2hlY2tfcnVuczozMTczNzQ5NDIwMyIsInQiOjE3MjkyNjIyMDV9":""}}',
-                "",
-                "",
-            ],
-            [
-                WsSub(
-                    url="alive.github.com:443/foobar",
-                    subs='{"subscribe":{"eyJjIjoiY2hlY2tfcnVuczozMTczNzQ5NDIwMyIsInQiOjE3MjkyNjIyMDV9":""}}',
-                    job_id=31737494203,
-                )
-            ],
+            _ws_flow("alive.github.com", SUBS),
+            [WsSub(url="alive.github.com:443/foobar", subs=SUBS, job_id=31737494203)],
         ),
     ],
 )
-def test_buffer_state(monkeypatch, lines, subs):
-    sut = octotail.mitm.BufferState()
-    not_nothings = [
-        res.unwrap() for line in lines if (res := sut.process_line(line)) is not Nothing
-    ]
-    assert not_nothings == subs
+def test_ws_sub_addon(mock_queue, http_flow, subs):
+    queue = mock_queue()
+    octotail.mitm.WsSubAddon(queue).websocket_message(http_flow)
+    assert queue.report() == subs
+
+
+def test_ws_sub_addon_ignores_plain_http(mock_queue):
+    queue = mock_queue()
+    http_flow = tflow.tflow()
+    http_flow.request.host = "alive.github.com"
+    octotail.mitm.WsSubAddon(queue).websocket_message(http_flow)
+    assert queue.report() == []
 
 
 @pytest.mark.parametrize(
-    ("lines", "check_liveness_return", "tell_calls"),
+    ("ws_subs", "check_liveness_return", "tell_calls"),
     [
-        ([""], Success(True), [call(ProxyLive())]),
-        ([""], Success(False), [call("fatal: proxy didn't go live")]),
+        ([], Success(True), [call(ProxyLive())]),
+        ([], Success(False), [call("fatal: proxy didn't go live")]),
         (
-            [
-                "127.0.0.1:55350 -> WebSocket text message -> alive.github.com:443/foobar",
-                "",
-                "",
-                '{"subscribe":{"eyJjIjoiY2hlY2tfcnVuczozMTczNzQ5NDIwMyIsInQiOjE3MjkyNjIyMDV9":""}}',
-                "",
-                "",
-            ],
+            [WsSub(url="alive.github.com:443/foobar", subs=SUBS, job_id=31737494203)],
             Success(True),
             [
                 call(ProxyLive()),
                 call(
                     WsSub(
                         url="alive.github.com:443/foobar",
-                        subs='{"subscribe":{"eyJjIjoiY2hlY2tfcnVuczozMTczNzQ5NDIwMyIsInQiOjE3MjkyNjIyMDV9":""}}',
+                        subs=SUBS,
                         job_id=31737494203,
                         job_name=None,
                     )
@@ -72,7 +77,7 @@ def test_buffer_state(monkeypatch, lines, subs):
         ),
     ],
 )
-def test_proxy_watcher(monkeypatch, lines, check_liveness_return, tell_calls):
+def test_proxy_watcher(monkeypatch, ws_subs, check_liveness_return, tell_calls):
     mgr = MagicMock()
     mgr.is_alive.return_value = True
     stop_mock = MagicMock()
@@ -85,8 +90,8 @@ def test_proxy_watcher(monkeypatch, lines, check_liveness_return, tell_calls):
 
     sut = octotail.mitm.ProxyWatcher.start(mgr=mgr, port=9182)
     queue = sut.proxy().queue
-    for line in lines:
-        queue.put(line)
+    for ws_sub in ws_subs:
+        queue.put(ws_sub)
 
     try:
         thread = threading.Thread(target=lambda: sut.proxy().watch().get())
@@ -105,3 +110,36 @@ def test_proxy_watcher_no_manager():
     sut = octotail.mitm.ProxyWatcher(mgr=None, port=9182)
     assert sut.port == 9182
     assert not hasattr(sut, "mgr")
+
+
+RUN_1 = "eyJjIjoiY2hlY2tfcnVuczoxIiwidCI6MTcyOTI2MjIwNX0=--sig"
+RUN_2 = "eyJjIjoiY2hlY2tfcnVuczoyIiwidCI6MTcyOTI2MjIwNX0=--sig"
+SUITE = "eyJjIjoiY2hlY2tfc3VpdGVzOjkiLCJ0IjoxNzI5MjYyMjA1fQ==--sig"
+
+
+@pytest.mark.parametrize(
+    ("message", "expected"),
+    [
+        ("nope", []),
+        ('{"subscribe":{"bm9wZQ==":""}}', []),
+        (f'{{"subscribe":{{"{SUITE}":""}}}}', []),
+        (SUBS, [WsSub(url="alive", subs=SUBS, job_id=31737494203)]),
+        (
+            f'{{"subscribe":{{"{SUITE}":"","{RUN_1}":"","bm9wZQ==":"","{RUN_2}":"x"}}}}',
+            [
+                WsSub(
+                    url="alive",
+                    subs=f'{{"subscribe":{{"{SUITE}":"","bm9wZQ==":"","{RUN_1}":""}}}}',
+                    job_id=1,
+                ),
+                WsSub(
+                    url="alive",
+                    subs=f'{{"subscribe":{{"{SUITE}":"","bm9wZQ==":"","{RUN_2}":"x"}}}}',
+                    job_id=2,
+                ),
+            ],
+        ),
+    ],
+)
+def test_extract_ws_subs(message, expected):
+    assert octotail.mitm.extract_ws_subs("alive", message) == expected
@@ -0,0 +1,45 @@
+import os
+import subprocess
+
+from octotail.profile import LOCK_FILE, Profile
+
+
+def test_prepare_creates_the_profile(tmp_path):
+    profile = Profile(tmp_path / "chromium", cache_bytes=1024)
+
+    assert profile.prepare() == tmp_path / "chromium"
+    assert (tmp_path / "chromium").is_dir()
+    assert profile.chrome_args() == ["--disk-cache-size=1024"]
+
+
+def test_prepare_clears_caches_of_overgrown_profiles(tmp_path):
+    profile = Profile(tmp_path, cache_bytes=1024)
+    (tmp_path / "Default" / "Cache").mkdir(parents=True)
+    (tmp_path / "Default" / "Cache" / "data_1").write_bytes(b"x" * 1024)
+    (tmp_path / "Default" / "Cookies").write_bytes(b"x" * 512)
+
+    profile.prepare()
+    assert (tmp_path / "Default" / "Cache" / "data_1").exists()
+
+    (tmp_path / "Default" / "Cache" / "data_2").write_bytes(b"x" * 1024)
+    profile.prepare()
+    assert not (tmp_path / "Default" / "Cache").exists()
+    assert (tmp_path / "Default" / "Cookies").exists()
+
+
+def test_prepare_skips_profiles_in_use(tmp_path):
+    profile = Profile(tmp_path)
+
+    os.symlink(f"somehost-{os.getpid()}", tmp_path / LOCK_FILE)
+    assert profile.prepare() is None
+
+    # left behind by a chromium that's gone
+    dead = subprocess.Popen(["true"])
+    dead.wait()
+    (tmp_path / LOCK_FILE).unlink()
+    os.symlink(f"somehost-{dead.pid}", tmp_path / LOCK_FILE)
+    assert profile.prepare() == tmp_path
+
+    (tmp_path / LOCK_FILE).unlink()
+    os.symlink("garbage", tmp_path / LOCK_FILE)
+    assert profile.prepare() == tmp_path
@@ -0,0 +1,190 @@
+import threading
+import time
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import httpx
+import pytest
+import websockets.client
+from returns.maybe import Nothing, Some
+from websockets.exceptions import ConnectionClosedError
+
+from octotail.msg import VisitRequest, WsSub
+from octotail.scraper import (
+    LiveSub,
+    Scraper,
+    fetch_ws_sub,
+    parse_job_page,
+    parse_run_page,
+    watch_run,
+)
+
+FIXTURES = Path(__file__).parent / "fixtures"
+JOB_PAGE = (FIXTURES / "job-page.html").read_text()
+RUN_PAGE = (FIXTURES / "run-page.html").read_text()
+LOGIN_PAGE = (FIXTURES / "login-page.html").read_text()
+
+JOB_ID = 31737494203
+JOB_URL = f"https://github.com/getbettr/octotail/actions/runs/11400958391/job/{JOB_ID}"
+WS_SUB = WsSub(
+    url=(
+        "alive.github.com/_sockets/u/583231/ws?session=eyJ2IjoiVjMiLCJ1Ijo1ODMyMzF9--0f1e2d3c4b5a"
+        "&shared=true&p=2146817932_1729262205"
+    ),
+    subs=(
+        '{"subscribe":{"eyJjIjoiY2hlY2tfcnVuczozMTczNzQ5NDIwMyIsInQiOjE3MjkyNjIyMDV9'
+        '--c3d4e5f6a1b2":""}}'
+    ),
+    job_id=JOB_ID,
+)
+RUN_URL = "https://github.com/getbettr/octotail/actions/runs/11400958391"
+RUN_CHANNEL = "eyJjIjoid29ya2Zsb3dfcnVuczoxMTQwMDk1ODM5MSIsInQiOjE3MjkyNjIyMDV9--d4e5f6a1b2c3"
+SUITE_CHANNEL = "eyJjIjoiY2hlY2tfc3VpdGVzOjI5ODc2NTQzMjEwIiwidCI6MTcyOTI2MjIwNX0=--b2c3d4e5f6a1"
+LIVE_URL = f"wss://{WS_SUB.url}"
+LIVE_SUB = LiveSub(
+    url=LIVE_URL, subs=f'{{"subscribe":{{"{RUN_CHANNEL}":"","{SUITE_CHANNEL}":""}}}}'
+)
+COOKIES = [{"name": "user_session", "value": "s3cr3t", "domain": "github.com", "path": "/"}]
+
+
+@pytest.mark.parametrize(
+    ("html", "job_id", "expected"),
+    [
+        (JOB_PAGE, JOB_ID, Some(WS_SUB)),
+        (JOB_PAGE, 42, Nothing),
+        (LOGIN_PAGE, JOB_ID, Nothing),
+        ("", JOB_ID, Nothing),
+    ],
+)
+def test_parse_job_page(html, job_id, expected):
+    assert parse_job_page(html, job_id) == expected
+
+
+@pytest.mark.parametrize(
+    ("html", "expected"),
+    [
+        (RUN_PAGE, Some(LIVE_SUB)),
+        # the job page only carries its own run's check suite
+        (JOB_PAGE, Some(LiveSub(url=LIVE_URL, subs=f'{{"subscribe":{{"{SUITE_CHANNEL}":""}}}}'))),
+        (LOGIN_PAGE, Nothing),
+        ("", Nothing),
+    ],
+)
+def test_parse_run_page(html, expected):
+    assert parse_run_page(html) == expected
+
+
+def _handler(request: httpx.Request) -> httpx.Response:
+    if request.url.path.endswith("/runs/11400958391"):
+        return httpx.Response(200, text=RUN_PAGE)
+    if request.url.path.endswith(f"/job/{JOB_ID}"):
+        if request.headers.get("cookie") != "user_session=s3cr3t":
+            return httpx.Response(200, text=LOGIN_PAGE)
+        return httpx.Response(200, text=JOB_PAGE)
+    return httpx.Response(404)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("url", "cookies", "expected"),
+    [
+        (JOB_URL, {"user_session": "s3cr3t"}, Some(WS_SUB)),
+        (JOB_URL, {}, Nothing),
+        ("https://github.com/nope", {"user_session": "s3cr3t"}, Nothing),
+    ],
+)
+async def test_fetch_ws_sub(url, cookies, expected):
+    transport = httpx.MockTransport(_handler)
+    async with httpx.AsyncClient(transport=transport, cookies=cookies) as client:
+        assert await fetch_ws_sub(client, VisitRequest(url=url, job_id=JOB_ID)) == expected
+
+
+@pytest.mark.parametrize(
+    ("url", "expected"),
+    [
+        (JOB_URL, WS_SUB),
+        ("https://github.com/nope", VisitRequest(url="https://github.com/nope", job_id=JOB_ID)),
+    ],
+)
+def test_scraper(url, expected):
+    reply_to = MagicMock()
+    sut = Scraper.start(COOKIES, transport=httpx.MockTransport(_handler))
+
+    try:
+        sut.proxy().scrape(VisitRequest(url=url, job_id=JOB_ID), reply_to).get()
+        deadline = time.monotonic() + 5
+        while not reply_to.tell.called and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        sut.stop()
+
+    reply_to.tell.assert_called_once_with(expected)
+
+
+class _FakeSocket:
+    def __init__(self, messages):
+        self.messages = messages
+        self.sent = []
+
+    async def __aiter__(self):
+        for message in self.messages:
+            if isinstance(message, Exception):
+                raise message
+            yield message
+
+    async def send(self, what):
+        self.sent.append(what)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("url", "expected_wake", "expected_connects"),
+    [(RUN_URL, True, 1), (JOB_URL, False, 0), ("https://github.com/nope", False, 0)],
+)
+async def test_watch_run(monkeypatch, url, expected_wake, expected_connects):
+    push = '{"e":"msg","ch":"workflow_runs:1","off":"1","data":{"reason":"job queued"}}'
+    dropped = _FakeSocket(['{"e":"ack","off":"1"}', ConnectionClosedError(None, None)])
+    connected = _FakeSocket([push])
+    connect = MagicMock(return_value=_FakeSocket([dropped, connected]))
+    monkeypatch.setattr(websockets.client, "connect", connect)
+    wake, live = threading.Event(), threading.Event()
+
+    transport = httpx.MockTransport(_handler)
+    async with httpx.AsyncClient(transport=transport) as client:
+        await watch_run(client, url, wake, live)
+
+    assert wake.is_set() == live.is_set() == expected_wake
+    assert connect.call_count == expected_connects
+    if expected_connects:
+        assert connect.call_args.args == (LIVE_SUB.url,)
+        # subscriptions get sent again after reconnecting
+        assert dropped.sent == connected.sent == [LIVE_SUB.subs]
+
+
+@pytest.mark.asyncio
+async def test_watch_run_only_wakes_up_on_pushes(monkeypatch):
+    acks = _FakeSocket(['{"e":"ack","off":"1","health":true}', "ping", b"\x00"])
+    monkeypatch.setattr(websockets.client, "connect", MagicMock(return_value=_FakeSocket([acks])))
+    wake, live = threading.Event(), threading.Event()
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(_handler)) as client:
+        await watch_run(client, RUN_URL, wake, live)
+
+    # the subscription went through, nothing got pushed yet
+    assert live.is_set()
+    assert not wake.is_set()
+
+
+@pytest.mark.asyncio
+async def test_watch_run_stays_unconfirmed_when_dropped(monkeypatch):
+    dropped = _FakeSocket([ConnectionClosedError(None, None)])
+    monkeypatch.setattr(
+        websockets.client, "connect", MagicMock(return_value=_FakeSocket([dropped]))
+    )
+    wake, live = threading.Event(), threading.Event()
+    live.set()
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(_handler)) as client:
+        await watch_run(client, RUN_URL, wake, live)
+
+    assert not live.is_set()
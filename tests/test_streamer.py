@@ -8,7 +8,7 @@ import websockets.client
 from websockets.exceptions import ConnectionClosedError
 
 import octotail.streamer
-from octotail.msg import OutputItem, WebsocketClosed, WsSub
+from octotail.msg import CancelStream, OutputItem, WebsocketClosed, WsSub
 
 
 class MockAiter:
@@ -95,8 +95,132 @@ def test_streamer(
 
     q = mock_queue()
 
-    octotail.streamer._streamer(ws, q)
+    aio.run(octotail.streamer._stream_it(ws, q, 0))
 
     assert q.report() == expected_queue
     assert a_iter_factory.call_args_list[0].args == (expected_url,)
     assert a_iter.report() == expected_a_iter_report
+
+
+@pytest.mark.asyncio
+async def test_serve(monkeypatch, mock_queue):
+    started, cancelled = [], []
+
+    async def _stream_it(ws_sub, *_):
+        started.append(ws_sub.subs)
+        try:
+            await aio.Event().wait()
+        except aio.CancelledError:
+            cancelled.append(ws_sub.subs)
+            raise
+
+    monkeypatch.setattr(octotail.streamer, "_stream_it", _stream_it)
+    commands = mock_queue(
+        [
+            WsSub(url="", subs="first", job_id=1),
+            WsSub(url="", subs="second", job_id=2),
+            WsSub(url="", subs="first-again", job_id=1),
+            CancelStream(job_id=2),
+            CancelStream(job_id=3),
+        ]
+    )
+
+    sut = aio.create_task(octotail.streamer._serve(commands, mock_queue(), 0))
+    await aio.sleep(0.1)
+    assert started == ["first", "second", "first-again"]
+    assert cancelled == ["first", "second"]
+
+    commands.put(None)
+    await aio.wait_for(sut, timeout=1)
+    assert cancelled == ["first", "second", "first-again"]
+
+
+@pytest.mark.asyncio
+async def test_conclusions_follow_the_last_lines(monkeypatch, mock_queue):
+    async def _stream_it(ws_sub, queue, _):
+        try:
+            await aio.Event().wait()
+        finally:
+            # what a stream has buffered still goes out once cancelled
+            queue.put(OutputItem(ws_sub.job_name, ["last line"]))
+
+    monkeypatch.setattr(octotail.streamer, "_stream_it", _stream_it)
+    conclusion = OutputItem("foo", ["##[conclusion]success"])
+    commands = mock_queue([WsSub(url="", subs="", job_id=1, job_name="foo")])
+    queue = mock_queue()
+
+    sut = aio.create_task(octotail.streamer._serve(commands, queue, 0))
+    await aio.sleep(0.05)
+    commands.put(CancelStream(job_id=1, then=conclusion))
+    commands.put(CancelStream(job_id=2, then=OutputItem("bar", ["##[conclusion]skipped"])))
+    commands.put(None)
+    await aio.wait_for(sut, timeout=1)
+
+    assert queue.report() == [
+        OutputItem("foo", ["last line"]),
+        conclusion,
+        OutputItem("bar", ["##[conclusion]skipped"]),
+    ]
+
+
+def test_worker_starts_lazily(monkeypatch, mock_queue):
+    process = MagicMock()
+    process.is_alive.return_value = False
+    monkeypatch.setattr(octotail.streamer.mp, "Process", MagicMock(return_value=process))
+
+    output_queue = mock_queue()
+    sut = octotail.streamer.StreamerWorker(output_queue)
+    sut.commands = mock_queue()
+    sut.cancel(1)
+    sut.cancel(1, OutputItem("foo", ["##[conclusion]failure"]))
+    sut.stop()
+    assert sut.commands.report() == []
+    # never streamed, so concluded right away
+    assert output_queue.report() == [OutputItem("foo", ["##[conclusion]failure"])]
+    process.start.assert_not_called()
+
+    sut.add(WsSub(url="", subs="", job_id=1))
+    sut.add(WsSub(url="", subs="", job_id=2))
+    sut.cancel(1)
+    sut.stop()
+    process.start.assert_called_once()
+    process.join.assert_called_once()
+    assert sut.commands.report() == [
+        WsSub(url="", subs="", job_id=1),
+        WsSub(url="", subs="", job_id=2),
+        CancelStream(job_id=1),
+        None,
+    ]
+
+
+def test_stream_batches_lines(monkeypatch, mock_queue):
+    lines = [_pack_lines([f"line {i}", ""]) for i in range(300)]
+    a_iter = MockAiter([MockAiter(lines)])
+    monkeypatch.setattr(websockets.client, "connect", MagicMock(return_value=a_iter))
+
+    q = mock_queue()
+    aio.run(octotail.streamer._stream_it(WsSub(url="", subs="", job_id=1), q, 0.005))
+
+    batched = [item.lines for item in q.report()]
+    assert [len(lines) for lines in batched] == [256, 256, 88]
+    assert [line for lines in batched for line in lines] == [
+        line for i in range(300) for line in (f"line {i}", "")
+    ]
+
+
+@pytest.mark.asyncio
+async def test_batch_flushes_after_window(mock_queue):
+    q = mock_queue()
+    sut = octotail.streamer._Batch("job", q, 0.01)
+
+    sut.add(["foo"])
+    sut.add(["bar"])
+    assert q.report() == []
+
+    await aio.sleep(0.05)
+    assert q.report() == [OutputItem(job_name="job", lines=["foo", "bar"])]
+
+    sut.add(["baz"])
+    sut.flush()
+    sut.flush()
+    assert q.report()[1:] == [OutputItem(job_name="job", lines=["baz"])]
@@ -1,5 +1,9 @@
+import asyncio as aio
 import importlib
 import io
+import itertools
+import multiprocessing as mp
+import threading
 from collections import deque
 from unittest.mock import patch
 
@@ -11,19 +15,6 @@ from octotail import utils
 from octotail.utils import Retry, perform_io
 
 
-@pytest.mark.parametrize(
-    ("f", "xs", "res"),
-    [
-        (lambda a: [a, a + 1], [1, 2, 3], [1, 2, 2, 3, 3, 4]),
-        (lambda a: [a], [1, 2, 3], [1, 2, 3]),
-        (lambda a: [a], [], []),
-        (lambda a: [], [1, 2], []),
-    ],
-)
-def test_flatmap(f, xs, res):
-    assert list(utils.flatmap(f, xs)) == res
-
-
 @pytest.mark.parametrize(
     ("line", "skip_prefix", "res"),
     [
@@ -110,6 +101,43 @@ def test_retries(num_tries: int, values: list, res):
         assert got == res
 
 
+def test_backoff():
+    backoff = utils.Backoff(delay=1, max_delay=5, jitter=0, fast_tries=2, fast_delay=0.1)
+
+    assert list(itertools.islice(backoff.delays(), 7)) == [0.1, 0.1, 1, 2, 4, 5, 5]
+    assert all(
+        0.8 <= delay <= 1.2
+        for delay in itertools.islice(utils.Backoff(delay=1, factor=1).delays(), 100)
+    )
+
+
+def test_retries_deadline():
+    class FakeClock:
+        now = 0.0
+
+        def __call__(self) -> float:
+            return self.now
+
+        def sleep(self, delay: float) -> None:
+            self.now += delay
+
+    clock = FakeClock()
+    tries: list[float] = []
+
+    @utils.retries(
+        None, utils.Backoff(delay=1, jitter=0), deadline=10, clock=clock, sleep=clock.sleep
+    )
+    def _inner():
+        tries.append(clock.now)
+        return Retry()
+
+    got = _inner()
+
+    assert str(got.failure()) == "retries exceeded in '_inner' after 10.0s"
+    # 1, 2, 4 and then whatever is left until the deadline
+    assert tries == [0, 1, 3, 7, 10]
+
+
 def test_find_free_port():
     port = utils.find_free_port(max_port=65000)
     assert utils.is_port_open(port)
@@ -122,16 +150,20 @@ def test_cannot_find_free_port(bound_socket):
     assert utils.is_port_open(port)
 
 
-@pytest.mark.parametrize(
-    ("xs", "res"),
-    [
-        ([], []),
-        (["", ""], [""]),
-        (["", "", "foo"], ["", "foo"]),
-        (["foo", ""], ["foo", ""]),
-        (["foo", "", False, "bar"], ["foo", "", "bar"]),
-        (["foo", *([""] * 100), "bar"], ["foo", "", "bar"]),
-    ],
-)
-def test_remove_consecutive_falsy(xs, res):
-    assert list(utils.remove_consecutive_falsy(xs)) == res
+@pytest.mark.asyncio
+async def test_queue_get():
+    queue = mp.Queue()
+    threading.Timer(0.05, lambda: queue.put("late item")).start()
+    heartbeats = 0
+
+    async def _heartbeat():
+        nonlocal heartbeats
+        while True:
+            heartbeats += 1
+            await aio.sleep(0.001)
+
+    heartbeat = aio.create_task(_heartbeat())
+    assert await utils.queue_get(queue) == "late item"
+    heartbeat.cancel()
+    # the loop kept running while we were waiting
+    assert heartbeats > 1
@@ -0,0 +1,156 @@
+import hashlib
+import hmac
+import json
+import threading
+import typing as t
+from pathlib import Path
+from unittest.mock import MagicMock, call
+
+import httpx
+import pytest
+
+from octotail.api import WorkflowJob
+from octotail.gh import JobState
+from octotail.msg import JobDone
+from octotail.webhook import WebhookListener
+
+PAYLOADS = Path(__file__).parent / "fixtures" / "webhooks"
+RUN_ID = 11400958391
+OTHER_RUN_ID = 11400958000
+JOB_ID = 31737494203
+
+
+class MockOpts(t.NamedTuple):
+    webhook_port: int | None = 0
+    webhook_secret: str | None = None
+
+
+class MockRun(t.NamedTuple):
+    id: int = RUN_ID
+
+
+def _payload(name: str) -> bytes:
+    return (PAYLOADS / f"{name}.json").read_bytes()
+
+
+@pytest.fixture
+def listener():
+    def _start(
+        secret: str | None = None, state: JobState | None = None, run_ids: tuple = (RUN_ID,)
+    ):
+        mgr = MagicMock()
+        run_watchers, wakes = [], {}
+        for run_id in run_ids:
+            run_watcher = MagicMock()
+            run_watcher.proxy().wf_run.get.return_value = MockRun(run_id)
+            run_watcher.proxy().state.get.return_value = state or JobState.default()
+            run_watcher.proxy().wake.get.return_value = wakes[run_id] = threading.Event()
+            run_watchers.append(run_watcher)
+        sut = WebhookListener.start(mgr, run_watchers, MockOpts(webhook_secret=secret))
+        started.append(sut)
+        return mgr, f"http://127.0.0.1:{sut.proxy().port.get()}/", wakes
+
+    started: list[t.Any] = []
+    yield _start
+    for sut in started:
+        sut.stop()
+
+
+def _post(url: str, event: str, body: bytes, **headers: str) -> httpx.Response:
+    return httpx.post(url, content=body, headers={"X-GitHub-Event": event, **headers})
+
+
+def test_delivers_job_changes(listener):
+    mgr, url, wakes = listener()
+
+    for name in [
+        "workflow_job.queued",
+        "workflow_job.in_progress",
+        "workflow_job.other_run",
+        "workflow_job.completed",
+        "workflow_job.completed",
+    ]:
+        assert _post(url, "workflow_job", _payload(name)).status_code == 204
+    assert _post(url, "workflow_run", _payload("workflow_run.completed")).status_code == 204
+
+    job = WorkflowJob.from_json(json.loads(_payload("workflow_job.queued"))["workflow_job"])
+    assert mgr.tell.call_args_list == [
+        call(job),
+        call(JobDone(job_id=JOB_ID, job_name="tests (3.12)", conclusion="success")),
+    ]
+    # the run watcher gets to confirm the run's conclusion
+    assert wakes[RUN_ID].is_set()
+
+
+def test_run_completion_does_not_overtake_its_jobs(listener):
+    mgr, url, wakes = listener()
+
+    _post(url, "workflow_job", _payload("workflow_job.in_progress"))
+    _post(url, "workflow_run", _payload("workflow_run.completed"))
+
+    assert wakes[RUN_ID].is_set()
+    assert all(c.args[0].conclusion is None for c in mgr.tell.call_args_list)
+    mgr.stop.assert_not_called()
+
+
+def test_shares_state_with_the_run_watcher(listener):
+    state = JobState.default()
+    state.seen_jobs.add(JOB_ID)
+    mgr, url, _ = listener(state=state)
+
+    _post(url, "workflow_job", _payload("workflow_job.in_progress"))
+    _post(url, "workflow_job", _payload("workflow_job.completed"))
+
+    assert mgr.tell.call_args_list == [
+        call(JobDone(job_id=JOB_ID, job_name="tests (3.12)", conclusion="success"))
+    ]
+    assert state.concluded_jobs == {JOB_ID}
+
+
+def test_ignores_unfinished_runs_and_other_events(listener):
+    mgr, url, wakes = listener()
+    in_progress = json.loads(_payload("workflow_run.completed"))
+    in_progress["workflow_run"] |= {"status": "in_progress", "conclusion": None}
+
+    _post(url, "workflow_run", json.dumps(in_progress).encode())
+    _post(url, "push", _payload("workflow_job.queued"))
+    assert _post(url, "workflow_job", b"{nope").status_code == 400
+
+    mgr.tell.assert_not_called()
+    assert not wakes[RUN_ID].is_set()
+
+
+def test_rejects_malformed_payloads(listener):
+    mgr, url, _ = listener()
+
+    assert _post(url, "workflow_job", _payload("workflow_job.malformed")).status_code == 400
+    assert _post(url, "workflow_job", b"[]").status_code == 400
+    mgr.tell.assert_not_called()
+
+    # the listener keeps going
+    assert _post(url, "workflow_job", _payload("workflow_job.queued")).status_code == 204
+    assert mgr.tell.call_count == 1
+
+
+def test_verifies_signatures(listener):
+    mgr, url, wakes = listener(secret="s3cr3t")
+    body = _payload("workflow_run.completed")
+    signature = "sha256=" + hmac.new(b"s3cr3t", body, hashlib.sha256).hexdigest()
+
+    assert _post(url, "workflow_run", body).status_code == 401
+    assert (
+        _post(url, "workflow_run", body, **{"X-Hub-Signature-256": "sha256=0"}).status_code == 401
+    )
+    assert not wakes[RUN_ID].is_set()
+
+    assert _post(url, "workflow_run", body, **{"X-Hub-Signature-256": signature}).status_code == 204
+    assert wakes[RUN_ID].is_set()
+
+
+def test_serves_several_runs(listener):
+    mgr, url, _ = listener(run_ids=(RUN_ID, OTHER_RUN_ID))
+
+    _post(url, "workflow_job", _payload("workflow_job.queued"))
+    _post(url, "workflow_job", _payload("workflow_job.other_run"))
+
+    assert [c.args[0].run_id for c in mgr.tell.call_args_list] == [RUN_ID, OTHER_RUN_ID]